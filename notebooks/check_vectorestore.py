@@ -1,17 +1,18 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+import json
+import sqlite3
+from pathlib import Path
 
-from src.core.config import EMBEDDING_MODEL, VECTOR_DB_PATH 
+import faiss
 
-vectorstore = FAISS.load_local(
-    VECTOR_DB_PATH,
-    OpenAIEmbeddings(model=EMBEDDING_MODEL),
-    allow_dangerous_deserialization=True
-)
+from src.core.config import VECTOR_DB_PATH
+
+path = Path(VECTOR_DB_PATH)
+index = faiss.read_index(str(path / "index.faiss"))
 
 # Number of vectors
-print(vectorstore.index.ntotal)
+print(index.ntotal)
 
 # Peek at stored documents
-docs = vectorstore.docstore._dict
-print(list(docs.values())[:2])
+conn = sqlite3.connect(f"file:{path / 'chunks.sqlite'}?mode=ro", uri=True)
+for text, metadata in conn.execute("SELECT text, metadata FROM chunks ORDER BY id LIMIT 2"):
+    print(json.loads(metadata), text[:200])
@@ -0,0 +1,20 @@
+from typing import Dict, List, Sequence, Tuple
+
+from core.config import RRF_K
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]],
+    k: int = RRF_K,
+) -> List[Tuple[int, float]]:
+    """
+    Fuse several ranked row-id lists: score(d) = sum over lists of 1 / (k + rank).
+    Returns (id, score) sorted by fused score; ties keep first-seen order.
+    """
+    scores: Dict[int, float] = {}
+
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,11 +1,303 @@
 
-from typing import List
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
 from langchain_core.documents import Document
-from unstructured.partition.auto import partition
-from sentence_transformers import CrossEncoder
 
-# Initialize the cross-encoder model ONCE (at module level)
-cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+from core.config import (
+    MICRO_BATCH_ENABLED,
+    MICRO_BATCH_MAX_RERANK_QUERIES,
+    MICRO_BATCH_MAX_WAIT_MS,
+    RERANK_BACKEND,
+    RERANK_BATCH_SIZE,
+    RERANK_CACHE_SIZE,
+    RERANK_MODEL,
+    RERANK_ONNX_INT8_FILE,
+)
+from core.exception import RerankingError
+from ingestion.rerank_tokens import PASSAGE_TOKENS_KEY, passage_text, tokenize_passages
+from utils.micro_batch import MicroBatcher
+from utils.telemetry import count
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+
+def load_cross_encoder(backend: str = RERANK_BACKEND) -> "CrossEncoder":
+    """
+    torch      : fp32 PyTorch (default)
+    torch-int8 : PyTorch with dynamic int8 quantization of the Linear layers
+    onnx       : ONNX Runtime, fp32 export from the model repo
+    onnx-int8  : ONNX Runtime, int8-quantized export from the model repo
+    """
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    if backend == "torch":
+        return CrossEncoder(RERANK_MODEL)
+
+    if backend == "torch-int8":
+        model = CrossEncoder(RERANK_MODEL)
+        torch.quantization.quantize_dynamic(
+            model.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+        return model
+
+    if backend == "onnx":
+        return CrossEncoder(RERANK_MODEL, backend="onnx")
+
+    if backend == "onnx-int8":
+        return CrossEncoder(
+            RERANK_MODEL,
+            backend="onnx",
+            model_kwargs={"file_name": RERANK_ONNX_INT8_FILE},
+        )
+
+    raise RerankingError(f"Unknown reranker backend: {backend}")
+
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder() -> "CrossEncoder":
+    """Cross-encoder model (loaded ONCE, on first call)."""
+    global _cross_encoder
+
+    if _cross_encoder is None:
+        with _cross_encoder_lock:
+            if _cross_encoder is None:
+                _cross_encoder = load_cross_encoder()
+
+    return _cross_encoder
+
+
+class RerankScoreCache:
+    """
+    Bounded LRU of (query hash, passage hash) -> cross-encoder score.
+
+    Keyed by what the model scored, not by chunk id: chunk ids are
+    positions within a file version, so after a re-chunk or a rebuild the
+    same id can name different text.
+    """
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE):
+        self.max_size = max_size
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._scores.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key: Tuple[str, str], score: float) -> None:
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores.clear()
+
+
+score_cache = RerankScoreCache()
+
+
+def _max_length(model: "CrossEncoder") -> int:
+    return getattr(model, "max_seq_length", None) or model.max_length or 512
+
+
+def _activation(model: "CrossEncoder"):
+    import torch
+
+    fn = getattr(model, "activation_fn", None)
+    if fn is None:
+        fn = getattr(model, "default_activation_function", None)
+    return fn or torch.nn.Identity()
+
+
+def _pair_features(tokenizer, q: List[int], p: List[int]) -> dict:
+    # BERT-style pair layout used by the ms-marco MiniLM cross-encoders:
+    # [CLS] query [SEP] passage [SEP]
+    return {
+        "input_ids": [tokenizer.cls_token_id, *q, tokenizer.sep_token_id, *p, tokenizer.sep_token_id],
+        "token_type_ids": [0] * (len(q) + 2) + [1] * (len(p) + 1),
+    }
+
+
+def _truncate_pair(q: List[int], p: List[int], budget: int) -> Tuple[List[int], List[int]]:
+    # Same result as the tokenizer's "longest_first" strategy
+    q_len, p_len = len(q), len(p)
+    while q_len + p_len > budget:
+        if p_len >= q_len:
+            p_len -= 1
+        else:
+            q_len -= 1
+    return q[:q_len], p[:p_len]
+
+
+def score_pairs(
+    query: str,
+    docs: List[Document],
+    model: "CrossEncoder" = None,
+    cache: Optional[RerankScoreCache] = score_cache,
+    batch_size: int = RERANK_BATCH_SIZE,
+) -> List[float]:
+    """
+    Cross-encoder scores for (query, doc) pairs.
+
+    Passages use the token IDs stored at ingestion when present, so only the
+    query is tokenized here; scores already seen for (query, passage) come
+    from the LRU cache.
+    """
+    return score_pairs_batch([query], [docs], model, cache, batch_size)[0]
+
+
+def _query_key(query: str) -> str:
+    return hashlib.sha1(query.encode()).hexdigest()
+
+
+def _cache_key(query_key: str, doc: Document) -> Tuple[str, str]:
+    return query_key, hashlib.sha1(passage_text(doc).encode()).hexdigest()
+
+
+def _cached_scores(
+    query_keys: List[str],
+    docs_per_query: List[List[Document]],
+    cache: Optional[RerankScoreCache],
+) -> Tuple[List[List[Optional[float]]], List[Tuple[int, int]]]:
+    """Scores found in the cache, and the (query position, doc position) pairs still to score."""
+    scores: List[List[Optional[float]]] = [[None] * len(docs) for docs in docs_per_query]
+    todo: List[Tuple[int, int]] = []
+
+    for qi, docs in enumerate(docs_per_query):
+        for i, doc in enumerate(docs):
+            if cache is not None:
+                scores[qi][i] = cache.get(_cache_key(query_keys[qi], doc))
+            if scores[qi][i] is None:
+                todo.append((qi, i))
+
+    total = sum(len(docs) for docs in docs_per_query)
+    count("rerank_cache_hits", total - len(todo))
+    count("rerank_scored", len(todo))
+    return scores, todo
+
+
+def score_pairs_batch(
+    queries: List[str],
+    docs_per_query: List[List[Document]],
+    model: "CrossEncoder" = None,
+    cache: Optional[RerankScoreCache] = score_cache,
+    batch_size: int = RERANK_BATCH_SIZE,
+) -> List[List[float]]:
+    """
+    `score_pairs` for many queries at once: the (query, doc) pairs of all
+    queries are flattened, length-sorted and scored in shared batches.
+    """
+    import torch
+
+    model = model or get_cross_encoder()
+    tokenizer = model.tokenizer
+
+    query_keys = [_query_key(q) for q in queries]
+    scores, todo = _cached_scores(query_keys, docs_per_query, cache)
+
+    if todo:
+        passages: List[Optional[List[int]]] = [
+            docs_per_query[qi][i].metadata.get(PASSAGE_TOKENS_KEY) for qi, i in todo
+        ]
+        missing = [j for j, ids in enumerate(passages) if ids is None]
+        if missing:
+            fresh = tokenize_passages(
+                [passage_text(docs_per_query[todo[j][0]][todo[j][1]]) for j in missing],
+                tokenizer,
+            )
+            for j, ids in zip(missing, fresh):
+                passages[j] = ids
+
+        asked = sorted({qi for qi, _ in todo})
+        encoded = tokenizer([queries[qi] for qi in asked], add_special_tokens=False)["input_ids"]
+        query_ids = dict(zip(asked, encoded))
+        budget = _max_length(model) - 3
+
+        features = [
+            _pair_features(tokenizer, *_truncate_pair(query_ids[qi], list(ids), budget))
+            for (qi, _), ids in zip(todo, passages)
+        ]
+
+        # Similar lengths in one batch -> less padding
+        order = sorted(range(len(features)), key=lambda j: len(features[j]["input_ids"]))
+        activation = _activation(model)
+        device = getattr(model, "device", "cpu")
+
+        with torch.inference_mode():
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                padded = tokenizer.pad(
+                    [features[j] for j in batch], return_tensors="pt"
+                )
+                padded = {name: t.to(device) for name, t in padded.items()}
+                logits = activation(model.model(**padded).logits)
+                if logits.dim() > 1 and logits.shape[-1] == 1:
+                    logits = logits.squeeze(-1)
+
+                for j, score in zip(batch, logits.float().cpu().tolist()):
+                    qi, i = todo[j]
+                    scores[qi][i] = float(score)
+                    if cache is not None:
+                        cache.put(_cache_key(query_keys[qi], docs_per_query[qi][i]), scores[qi][i])
+
+    return scores
+
+
+def _score_requests(requests: List[Tuple[str, List[Document]]]) -> List[List[float]]:
+    queries = [query for query, _ in requests]
+    return score_pairs_batch(queries, [docs for _, docs in requests], cache=None)
+
+
+# (query, passage) pairs of concurrent requests share cross-encoder batches
+pair_scorer = MicroBatcher(
+    _score_requests,
+    max_batch=MICRO_BATCH_MAX_RERANK_QUERIES,
+    max_wait=MICRO_BATCH_MAX_WAIT_MS / 1000,
+    name="rerank",
+)
+
+
+def score_pairs_coalesced(
+    query: str,
+    docs: List[Document],
+    cache: Optional[RerankScoreCache] = score_cache,
+) -> List[float]:
+    """
+    `score_pairs`, with the uncached pairs scored in one batch together
+    with those of concurrent callers. Cache lookups stay in the caller so
+    hits and misses are counted in its own trace.
+    """
+    query_key = _query_key(query)
+    (scores,), todo = _cached_scores([query_key], [docs], cache)
+
+    if todo:
+        fresh = pair_scorer.submit((query, [docs[i] for _, i in todo]))
+        for (_, i), score in zip(todo, fresh):
+            scores[i] = score
+            if cache is not None:
+                cache.put(_cache_key(query_key, docs[i]), score)
+
+    return scores
+
 
 def cross_encoder_rerank(
     query: str,
@@ -17,17 +309,45 @@ def cross_encoder_rerank(
     if not docs:
         return []
 
-    pairs = []
-    for doc in docs:
-        section = doc.metadata.get("semantic_section", "Unknown")
-        pairs.append(
-            (query, f"[{section}]\n{doc.page_content}")
-        )
+    try:
+        if MICRO_BATCH_ENABLED:
+            rerank_scores = score_pairs_coalesced(query, docs)
+        else:
+            rerank_scores = score_pairs(query, docs)
+    except Exception as e:
+        raise RerankingError(f"Cross-encoder scoring failed: {e}") from e
+
+    return _keep_best(docs, rerank_scores, top_n, max_score_gap)
+
+
+def cross_encoder_rerank_batch(
+    queries: List[str],
+    docs_per_query: List[List[Document]],
+    top_n: int = 10,
+    max_score_gap: float = 2.0
+) -> List[List[Document]]:
+    """`cross_encoder_rerank` of many queries with one flattened scoring pass."""
+    try:
+        all_scores = score_pairs_batch(queries, docs_per_query)
+    except Exception as e:
+        raise RerankingError(f"Cross-encoder scoring failed: {e}") from e
+
+    return [
+        _keep_best(docs, scores, top_n, max_score_gap) if docs else []
+        for docs, scores in zip(docs_per_query, all_scores)
+    ]
 
-    rerank_scores = cross_encoder.predict(pairs)
 
+def _keep_best(
+    docs: List[Document],
+    rerank_scores: List[float],
+    top_n: int,
+    max_score_gap: float,
+) -> List[Document]:
     for doc, score in zip(docs, rerank_scores):
         doc.metadata["rerank_score"] = float(score)
+        # Only needed for scoring; keeps answers, caches and UI payloads small
+        doc.metadata.pop(PASSAGE_TOKENS_KEY, None)
 
     # 1. Sort ONLY by cross-encoder
     docs.sort(
@@ -1,37 +1,530 @@
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from core.config import VECTOR_DB_PATH, EMBEDDING_MODEL
-from query.rerankers import cross_encoder_rerank
-
-# Load ONCE
-embeddings = HuggingFaceEmbeddings(
-    model_name=EMBEDDING_MODEL,
-    encode_kwargs={"normalize_embeddings": True}
-)
+import contextvars
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
-def run_query(user_query: str, k: int = 30):
-    
-    vectorstore = FAISS.load_local(
+import numpy as np
+from langchain_core.documents import Document
+from core.config import (
+    EMBEDDING_MODEL,
+    HYBRID_RETRIEVAL,
+    MICRO_BATCH_ENABLED,
+    MICRO_BATCH_MAX_QUERIES,
+    MICRO_BATCH_MAX_WAIT_MS,
+    SHARD_SEARCH_WORKERS,
     VECTOR_DB_PATH,
-    embeddings,
-    allow_dangerous_deserialization=True
 )
-    results = vectorstore.similarity_search_with_score(user_query, k=k)
+from core.exception import RetrievalError
+from ingestion.ann_index import search_parameters
+from ingestion.metadata_index import Filters, RowSelection, normalize_filters
+from query.fusion import reciprocal_rank_fusion
+from query.rerankers import cross_encoder_rerank, cross_encoder_rerank_batch
+from query.vectorstore_manager import LoadedIndex, ShardedIndexManager, ShardSet
+from utils.micro_batch import MicroBatcher
+from utils.telemetry import count, span, traced
+
+# Both built on first use, not at import
+_embeddings = None
+_manager = None
+
+# Vector and lexical search of one query run side by side
+_search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+# Shards of one query are searched side by side (a separate pool: shard
+# tasks wait on _search_pool tasks)
+_shard_pool = ThreadPoolExecutor(max_workers=SHARD_SEARCH_WORKERS, thread_name_prefix="shard-search")
+
+
+def get_embeddings():
+    """Query-side embedding model (loaded ONCE, on first call)."""
+    global _embeddings
+
+    if _embeddings is None:
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        _embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            encode_kwargs={"normalize_embeddings": True}
+        )
+
+    return _embeddings
+
+
+def _encode_queries(queries: List[str]) -> List[List[float]]:
+    # Same vectors as embed_query (no query-specific encode kwargs are set)
+    return get_embeddings().embed_documents(queries)
+
+
+# Query encodes of concurrent requests share one forward pass
+query_encoder = MicroBatcher(
+    _encode_queries,
+    max_batch=MICRO_BATCH_MAX_QUERIES,
+    max_wait=MICRO_BATCH_MAX_WAIT_MS / 1000,
+    name="embed",
+)
+
+
+def embed_query(text: str) -> List[float]:
+    """Query vector, micro-batched with concurrent callers when enabled."""
+    if not MICRO_BATCH_ENABLED:
+        return get_embeddings().embed_query(text)
+    return query_encoder.submit(text)
+
+
+def get_vectorstore_manager() -> ShardedIndexManager:
+    global _manager
+
+    if _manager is None:
+        _manager = ShardedIndexManager(VECTOR_DB_PATH)
+
+    return _manager
+
+
+def select_rows(index: LoadedIndex, filters: Optional[Filters]) -> Optional[RowSelection]:
+    """Row ids admitted by `filters` (None = no filter, search everything)."""
+    if not normalize_filters(filters):
+        return None
+
+    if index.metadata is None:
+        raise RetrievalError(
+            "This index has no metadata filter index (written by an older "
+            "version). Re-run ingestion to enable filtered search."
+        )
+    return index.metadata.select(filters)
 
+
+def vector_search(
+    index: LoadedIndex,
+    user_query: str,
+    k: int,
+    query_vector: Optional[List[float]] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selection: Optional[RowSelection] = None,
+) -> List[Tuple[int, float]]:
+    """
+    (chunk row id, L2 distance) of the k nearest chunks.
+    `nprobe` / `ef_search` tune IVF / HNSW indexes (config defaults when None).
+    With a `selection`, FAISS only considers the selected row ids.
+    """
+    if query_vector is None:
+        with span("embed_query"):
+            query_vector = embed_query(user_query)
+
+    # `selection` owns the bitmap the selector points into; it stays
+    # referenced here until the search returns
+    selector = selection.selector() if selection is not None else None
+    with span("faiss_search"):
+        distances, row_ids = index.index.search(
+            np.asarray([query_vector], dtype=np.float32),
+            k,
+            params=search_parameters(index.index, nprobe, ef_search, selector),
+        )
+
+    return [
+        (int(row_id), float(dist))
+        for dist, row_id in zip(distances[0], row_ids[0])
+        if row_id != -1
+    ]
+
+
+def hybrid_search(
+    index: LoadedIndex,
+    user_query: str,
+    k: int,
+    query_vector: Optional[List[float]] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Filters] = None,
+) -> List[Document]:
+    """
+    Vector + BM25 search run concurrently, fused with reciprocal rank fusion.
+    Falls back to vector-only when no lexical index is available. Child
+    chunk hits are collapsed to their unique parents before reranking.
+
+    `filters` (e.g. {"corpus_id": "ISO27001-2022"}) restrict both searches
+    to matching chunks before scoring, not by post-filtering their hits.
+    """
+    selection = select_rows(index, filters)
+    if selection is not None:
+        count("filter_rows", selection.count)
+        if selection.count == 0:
+            return []
+
+    search_args = (index, user_query, k, query_vector, nprobe, ef_search, selection)
+
+    if HYBRID_RETRIEVAL and index.bm25 is not None:
+        # Each task runs in a copy of this context, so its spans join the request trace
+        vector_future = _search_pool.submit(
+            contextvars.copy_context().run, vector_search, *search_args
+        )
+        lexical_future = _search_pool.submit(
+            contextvars.copy_context().run, _bm25_search, index, user_query, k, selection
+        )
+        vector_hits, lexical_hits = vector_future.result(), lexical_future.result()
+    else:
+        vector_hits, lexical_hits = vector_search(*search_args), []
+
+    count("vector_hits", len(vector_hits))
+    count("bm25_hits", len(lexical_hits))
+
+    # Only the fused hits are read from the chunk store (one query)
+    fused = _fuse(vector_hits, lexical_hits, k)
+    count("fused", len(fused))
+    with span("fetch_chunks"):
+        stored = index.chunks.get(hit[0] for hit in fused)
+
+    return collapse_to_parents(index, [_fused_documents(fused, stored)])[0]
+
+
+def _fuse(
+    vector_hits: List[Tuple[int, float]],
+    lexical_hits: List[Tuple[int, float]],
+    k: int,
+) -> List[Tuple[int, float, Optional[float], Optional[float]]]:
+    """Top-k (row id, rrf score, faiss score, bm25 score) by reciprocal rank fusion."""
+    faiss_scores = dict(vector_hits)
+    bm25_scores = dict(lexical_hits)
+    fused = reciprocal_rank_fusion(
+        [[doc_id for doc_id, _ in vector_hits], [doc_id for doc_id, _ in lexical_hits]]
+    )
+    return [
+        (doc_id, rrf_score, faiss_scores.get(doc_id), bm25_scores.get(doc_id))
+        for doc_id, rrf_score in fused[:k]
+    ]
+
+
+def _fused_documents(fused, stored: Dict[int, Document], copy: bool = False) -> List[Document]:
     docs = []
-    for doc, score in results:
-        doc.metadata["faiss_score"] = float(score)
+    for doc_id, rrf_score, faiss_score, bm25_score in fused:
+        doc = stored.get(doc_id)
+        if doc is None:
+            continue
+        if copy:
+            # Several queries of a batch may hit the same chunk; scores are per query
+            doc = Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+
+        if faiss_score is not None:
+            doc.metadata["faiss_score"] = faiss_score
+        if bm25_score is not None:
+            doc.metadata["bm25_score"] = bm25_score
+        doc.metadata["rrf_score"] = rrf_score
         docs.append(doc)
 
-    reranked_docs = cross_encoder_rerank(
-        query=user_query,
-        docs=docs,
-        top_n=10
+    return docs
+
+
+def collapse_to_parents(
+    index: LoadedIndex, docs_per_query: List[List[Document]]
+) -> List[List[Document]]:
+    """
+    Replace child-chunk hits by their parents (parent-child chunking).
+
+    Each parent appears once, at the rank of its best child, and carries
+    that child's scores; "matched_children" counts the children that hit.
+    Provenance that dedup merged into the hit children (`sources`, `pages`,
+    `duplicates`) is merged into the parent as well. Parents of all queries are read in one go. Chunks without a parent
+    (indexes built without parent-child chunking) pass through unchanged.
+    """
+    parent_ids = {
+        doc.metadata["parent_id"]
+        for docs in docs_per_query for doc in docs
+        if doc.metadata.get("parent_id")
+    }
+    if not parent_ids:
+        return docs_per_query
+
+    with span("fetch_parents"):
+        parents = index.chunks.get_parents(parent_ids)
+
+    collapsed = []
+    for docs in docs_per_query:
+        kept: Dict[str, Document] = {}
+        for doc in docs:
+            parent_id = doc.metadata.get("parent_id")
+            parent = parents.get(parent_id) if parent_id else None
+            if parent is None:
+                kept[doc.metadata.get("chunk_id") or str(id(doc))] = doc
+                continue
+
+            if parent_id in kept:
+                kept[parent_id].metadata["matched_children"] += 1
+                _merge_duplicates(kept[parent_id].metadata, doc.metadata)
+                continue
+
+            metadata = dict(parent.metadata)
+            for key in ("faiss_score", "bm25_score", "rrf_score"):
+                if key in doc.metadata:
+                    metadata[key] = doc.metadata[key]
+            # A collapsed hit is identified by its parent's id from here on
+            metadata["chunk_id"] = parent_id
+            metadata["matched_children"] = 1
+            _merge_duplicates(metadata, doc.metadata)
+            kept[parent_id] = Document(page_content=parent.page_content, metadata=metadata)
+
+        collapsed.append(list(kept.values()))
+
+    count("parents", sum(len(docs) for docs in collapsed))
+    return collapsed
+
+
+def _merge_duplicates(parent: dict, child: dict) -> None:
+    # Same merge as ingestion.dedup, from a canonical child into its parent
+    if not child.get("duplicates"):
+        return
+
+    sources = list(parent.get("sources") or [parent.get("source")])
+    for source in child.get("sources") or ():
+        if source not in sources:
+            sources.append(source)
+    parent["sources"] = sources
+
+    # A child's merged pages are all within its own (= the parent's) file
+    pages, child_pages = parent.get("pages"), child.get("pages")
+    if isinstance(pages, list) and isinstance(child_pages, list):
+        parent["pages"] = sorted(set(pages) | set(child_pages))
+
+    parent["duplicates"] = parent.get("duplicates", 0) + child["duplicates"]
+
+
+def _bm25_search(index: LoadedIndex, user_query: str, k: int, selection):
+    with span("bm25_search"):
+        return index.bm25.search(user_query, k, selection)
+
+
+# =========================
+# SHARDS
+# =========================
+def _shard_filters(index: LoadedIndex, filters: Optional[Filters]) -> Optional[Filters]:
+    # Shards were picked by corpus_id already; within a corpus shard it admits every row
+    if index.corpus_id is None:
+        if index.corpora is None:
+            return filters
+        # Unsharded index next to shards: only the corpora not yet sharded
+        return {**(filters or {}), "corpus_id": index.corpora}
+    if not filters:
+        return filters
+    return {field: values for field, values in filters.items() if field != "corpus_id"}
+
+
+def _fan_out(shards: ShardSet, search: Callable[[LoadedIndex], list]) -> list:
+    """`search(shard)` of every shard in parallel; a single shard runs inline."""
+    if len(shards.shards) == 1:
+        return [search(shards.shards[0])]
+
+    futures = [
+        _shard_pool.submit(contextvars.copy_context().run, search, shard)
+        for shard in shards.shards
+    ]
+    return [future.result() for future in futures]
+
+
+def merge_shard_hits(docs_per_shard: List[List[Document]], k: int) -> List[Document]:
+    """
+    Top k of the per-shard results. RRF scores only depend on ranks, so
+    they compare across shards of any size (unlike BM25 scores, whose IDF
+    is per shard); ties go to the smaller vector distance.
+    """
+    merged = [doc for docs in docs_per_shard for doc in docs]
+    merged.sort(key=lambda doc: (
+        -doc.metadata.get("rrf_score", 0.0),
+        doc.metadata.get("faiss_score", math.inf),
+    ))
+    return merged[:k]
+
+
+def sharded_search(
+    shards: ShardSet,
+    user_query: str,
+    k: int,
+    query_vector: Optional[List[float]] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Filters] = None,
+) -> List[Document]:
+    """`hybrid_search` of every selected shard in parallel, merged to the top k."""
+    if query_vector is None and len(shards.shards) > 1:
+        # Once for all shards
+        with span("embed_query"):
+            query_vector = embed_query(user_query)
+
+    count("shards", len(shards.shards))
+    return merge_shard_hits(
+        _fan_out(shards, lambda shard: hybrid_search(
+            shard, user_query, k, query_vector, nprobe, ef_search,
+            _shard_filters(shard, filters),
+        )),
+        k,
     )
 
+
+def sharded_search_batch(
+    shards: ShardSet,
+    queries: Sequence[str],
+    k: int,
+    query_vectors: Optional[List[List[float]]] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Filters] = None,
+) -> List[List[Document]]:
+    """`hybrid_search_batch` of every selected shard in parallel, merged per query."""
+    if query_vectors is None and len(shards.shards) > 1:
+        with span("embed_query"):
+            query_vectors = _encode_queries(list(queries))
+
+    count("shards", len(shards.shards))
+    per_shard = _fan_out(shards, lambda shard: hybrid_search_batch(
+        shard, queries, k, query_vectors, nprobe, ef_search,
+        _shard_filters(shard, filters),
+    ))
+    return [
+        merge_shard_hits([docs[qi] for docs in per_shard], k)
+        for qi in range(len(queries))
+    ]
+
+
+def run_query(
+    user_query: str,
+    k: int = 30,
+    query_vector: Optional[List[float]] = None,
+    index: Optional[ShardSet] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Filters] = None,
+    top_n: int = 10,
+):
+    with traced("run_query", k=k, filtered=bool(filters)):
+        # Callers that already embedded the query / resolved the shards pass them in
+        if index is None:
+            with span("load_index"):
+                index = get_vectorstore_manager().get(filters)
+        with span("hybrid_search"):
+            docs = sharded_search(index, user_query, k, query_vector, nprobe, ef_search, filters)
+
+        with span("rerank"):
+            reranked_docs = cross_encoder_rerank(
+                query=user_query,
+                docs=docs,
+                top_n=top_n
+            )
+        count("reranked", len(reranked_docs))
+
     return reranked_docs
 
 
+# =========================
+# BATCHED QUERIES
+# =========================
+def vector_search_batch(
+    index: LoadedIndex,
+    queries: Sequence[str],
+    k: int,
+    query_vectors: Optional[List[List[float]]] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selection: Optional[RowSelection] = None,
+) -> List[List[Tuple[int, float]]]:
+    """`vector_search` of many queries: one encode call, one FAISS search."""
+    if query_vectors is None:
+        with span("embed_query"):
+            query_vectors = _encode_queries(list(queries))
+
+    selector = selection.selector() if selection is not None else None
+    with span("faiss_search"):
+        distances, row_ids = index.index.search(
+            np.asarray(query_vectors, dtype=np.float32).reshape(len(queries), -1),
+            k,
+            params=search_parameters(index.index, nprobe, ef_search, selector),
+        )
+
+    return [
+        [(int(row_id), float(dist)) for dist, row_id in zip(dists, ids) if row_id != -1]
+        for dists, ids in zip(distances, row_ids)
+    ]
+
+
+def _bm25_search_batch(index: LoadedIndex, queries: Sequence[str], k: int, selection):
+    with span("bm25_search"):
+        return [index.bm25.search(query, k, selection) for query in queries]
+
+
+def hybrid_search_batch(
+    index: LoadedIndex,
+    queries: Sequence[str],
+    k: int,
+    query_vectors: Optional[List[List[float]]] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Filters] = None,
+) -> List[List[Document]]:
+    """
+    `hybrid_search` of many queries. BM25 runs alongside the batched
+    vector search, and the chunks of all fused hits are read in one go.
+    """
+    selection = select_rows(index, filters)
+    if selection is not None:
+        count("filter_rows", selection.count)
+        if selection.count == 0:
+            return [[] for _ in queries]
+
+    if HYBRID_RETRIEVAL and index.bm25 is not None:
+        lexical_future = _search_pool.submit(
+            contextvars.copy_context().run, _bm25_search_batch, index, queries, k, selection
+        )
+        vector_hits = vector_search_batch(
+            index, queries, k, query_vectors, nprobe, ef_search, selection
+        )
+        lexical_hits = lexical_future.result()
+    else:
+        vector_hits = vector_search_batch(
+            index, queries, k, query_vectors, nprobe, ef_search, selection
+        )
+        lexical_hits = [[] for _ in queries]
+
+    fused = [_fuse(v, l, k) for v, l in zip(vector_hits, lexical_hits)]
+    count("fused", sum(len(f) for f in fused))
+    with span("fetch_chunks"):
+        stored = index.chunks.get({hit[0] for hits in fused for hit in hits})
+
+    return collapse_to_parents(
+        index, [_fused_documents(hits, stored, copy=True) for hits in fused]
+    )
+
+
+def run_query_batch(
+    queries: Sequence[str],
+    k: int = 30,
+    query_vectors: Optional[List[List[float]]] = None,
+    index: Optional[ShardSet] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Filters] = None,
+    top_n: int = 10,
+) -> List[List[Document]]:
+    """
+    `run_query` for many queries at once (evaluation, bulk QA): all queries
+    are encoded in one call and searched with one FAISS call per shard,
+    and every (query, candidate) pair is scored in shared cross-encoder
+    batches. Returns the reranked chunks of each query, in input order.
+    """
+    queries = list(queries)
+    if not queries:
+        return []
+
+    with traced("run_query_batch", k=k, queries=len(queries), filtered=bool(filters)):
+        if index is None:
+            with span("load_index"):
+                index = get_vectorstore_manager().get(filters)
+        with span("hybrid_search"):
+            docs = sharded_search_batch(
+                index, queries, k, query_vectors, nprobe, ef_search, filters
+            )
+
+        with span("rerank"):
+            reranked = cross_encoder_rerank_batch(queries, docs, top_n=top_n)
+        count("reranked", sum(len(d) for d in reranked))
+
+    return reranked
+
 
 if __name__ == "__main__":
     user_query = input("Enter your query: ")
@@ -0,0 +1,215 @@
+"""
+Recall@k / latency / size sweep of compressed and approximate FAISS indexes
+against exact search.
+
+Every candidate factory string is built over the stored vectors and
+searched with a range of nprobe (IVF) / efSearch (HNSW) values; the exact
+top-k of a flat index is the ground truth.
+
+    cd src
+    python -m query.tune_index                                # held-out vectors of all shards
+    python -m query.tune_index --queries ../user_querys.txt   # real questions
+    python -m query.tune_index --factory HNSW32 "IVF{nlist},Flat" --k 10 --json out.json
+    python -m query.tune_index --path vectorstore/shards/ISO27001-2022   # one corpus shard
+
+Pick the cheapest setting whose recall is acceptable, then set
+FAISS_INDEX_FACTORY / FAISS_NPROBE / FAISS_EF_SEARCH accordingly.
+"""
+import argparse
+import json
+import re
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from core.config import VECTOR_DB_PATH
+from ingestion.ann_index import (
+    EXACT_INDEX_FILE,
+    build_ann_index,
+    exact_vectors,
+    resolve_factory,
+    search_parameters,
+)
+from ingestion.index import list_shards, shard_path
+
+DEFAULT_FACTORIES = ("SQfp16", "HNSW32", "IVF{nlist},Flat", "IVF{nlist},SQfp16")
+NPROBE_SWEEP = (1, 2, 4, 8, 16, 32, 64, 128)
+EF_SEARCH_SWEEP = (16, 32, 64, 128, 256)
+
+# "12. What is ...?" lines of user_querys.txt
+_NUMBERED_QUESTION = re.compile(r"^\s*\d+\.\s+(.+\S)\s*$")
+
+
+@dataclass
+class TuningResult:
+    factory: str
+    setting: str
+    recall: float
+    mean_ms: float
+    p95_ms: float
+    build_seconds: float
+    index_bytes: int
+
+
+# =========================
+# QUERY SETS
+# =========================
+def load_stored_vectors(path: Optional[str] = None) -> np.ndarray:
+    """
+    All vectors of the exact index written by ingestion under `path`;
+    by default those of every corpus shard (or of an unsharded index).
+    """
+    if path is not None:
+        roots = [Path(path)]
+    else:
+        roots = [Path(shard_path(c)) for c in list_shards()] or [Path(VECTOR_DB_PATH)]
+
+    files = [root / EXACT_INDEX_FILE for root in roots]
+    missing = [str(f) for f in files if not f.exists()]
+    if missing:
+        raise FileNotFoundError(
+            f"No exact index at {', '.join(missing)}. Run ingestion first, "
+            "or pass --path <index dir> (e.g. vectorstore/shards/<corpus_id>)."
+        )
+    return np.concatenate([exact_vectors(faiss.read_index(str(f)))[0] for f in files])
+
+
+def holdout_split(
+    vectors: np.ndarray, n_queries: int, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(base, queries): a random sample of stored vectors held out as queries."""
+    rng = np.random.default_rng(seed)
+    n_queries = min(n_queries, len(vectors) // 2)
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[rng.choice(len(vectors), n_queries, replace=False)] = True
+    return vectors[~mask], vectors[mask]
+
+
+def embed_question_file(path: str) -> np.ndarray:
+    """Embed the numbered questions of a file like user_querys.txt."""
+    from query.retriever import get_embeddings
+
+    with open(path, encoding="utf-8") as f:
+        questions = [m.group(1) for m in map(_NUMBERED_QUESTION.match, f) if m]
+    if not questions:
+        raise ValueError(f"No numbered questions found in {path}")
+
+    return np.asarray(get_embeddings().embed_documents(questions), dtype=np.float32)
+
+
+# =========================
+# MEASUREMENT
+# =========================
+def _knob_sweep(index: faiss.Index, k: int) -> List[Tuple[str, dict]]:
+    if isinstance(index, faiss.IndexIVF):
+        return [(f"nprobe={n}", {"nprobe": n}) for n in NPROBE_SWEEP if n <= index.nlist]
+    if isinstance(index, faiss.IndexHNSW):
+        return [(f"efSearch={ef}", {"ef_search": ef}) for ef in EF_SEARCH_SWEEP if ef >= k]
+    return [("-", {})]
+
+
+def _search_one_by_one(index, queries, k, params) -> Tuple[np.ndarray, np.ndarray]:
+    # One query per call, as run_query issues them
+    found = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k, params=params)
+        latencies[i] = time.perf_counter() - start
+        found[i] = ids[0]
+    return found, latencies * 1000.0
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(
+        len(set(t[t != -1]) & set(f[f != -1]))
+        for t, f in zip(truth, found)
+    )
+    expected = int((truth != -1).sum())
+    return hits / expected if expected else 1.0
+
+
+def tune(
+    base: np.ndarray,
+    queries: np.ndarray,
+    factories: Sequence[str] = DEFAULT_FACTORIES,
+    k: int = 10,
+) -> List[TuningResult]:
+    k = min(k, len(base))
+
+    start = time.perf_counter()
+    flat = faiss.IndexFlatL2(base.shape[1])
+    flat.add(base)
+    flat_build = time.perf_counter() - start
+
+    truth, flat_ms = _search_one_by_one(flat, queries, k, None)
+    results = [TuningResult(
+        "Flat", "exact", 1.0, float(flat_ms.mean()), float(np.percentile(flat_ms, 95)),
+        flat_build, len(faiss.serialize_index(flat)),
+    )]
+
+    for factory in factories:
+        start = time.perf_counter()
+        index = build_ann_index(base, factory)
+        build_seconds = time.perf_counter() - start
+        if index is None:
+            continue
+
+        index_bytes = len(faiss.serialize_index(index))
+        resolved = resolve_factory(factory, len(base))
+
+        for setting, knobs in _knob_sweep(index, k):
+            params = search_parameters(index, **knobs)
+            found, ms = _search_one_by_one(index, queries, k, params)
+            results.append(TuningResult(
+                resolved, setting, recall_at_k(truth, found),
+                float(ms.mean()), float(np.percentile(ms, 95)),
+                build_seconds, index_bytes,
+            ))
+
+    return results
+
+
+def print_results(results: List[TuningResult], k: int, n_base: int, n_queries: int) -> None:
+    print(f"{n_base} vectors, {n_queries} queries, recall@{k} vs exact search\n")
+    print(f"{'factory':<22}{'setting':<16}{'recall':>8}{'mean ms':>10}{'p95 ms':>10}{'build s':>10}{'MB':>9}")
+    for r in results:
+        print(
+            f"{r.factory:<22}{r.setting:<16}{r.recall:>8.3f}{r.mean_ms:>10.3f}"
+            f"{r.p95_ms:>10.3f}{r.build_seconds:>10.2f}{r.index_bytes / 2**20:>9.2f}"
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> List[TuningResult]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--factory", nargs="+", default=list(DEFAULT_FACTORIES),
+                        help="FAISS factory strings to evaluate ({nlist} = sized from corpus)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", help="question file to embed (default: held-out chunk vectors)")
+    parser.add_argument("--holdout", type=int, default=200, help="held-out vectors used as queries")
+    parser.add_argument("--path", help="index dir (default: every corpus shard)")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    vectors = load_stored_vectors(args.path)
+    if args.queries:
+        base, queries = vectors, embed_question_file(args.queries)
+    else:
+        base, queries = holdout_split(vectors, args.holdout)
+
+    results = tune(base, queries, args.factory, args.k)
+    print_results(results, min(args.k, len(base)), len(base), len(queries))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
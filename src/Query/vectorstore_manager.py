@@ -0,0 +1,445 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+
+from core.config import FAISS_MMAP, SHARD_MAX_LOADED, VECTOR_DB_PATH, VECTOR_DB_VERSION_FILE
+from core.exception import RetrievalError
+from ingestion.ann_index import read_serving_index
+from ingestion.bm25_index import BM25Index
+from ingestion.chunk_store import CHUNK_STORE_FILE, ChunkStore
+from ingestion.index import list_shards, shard_path
+from ingestion.metadata_index import Filters, MetadataIndex, normalize_filters
+from utils.startup import memory_usage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LoadedIndex:
+    """Everything one index version consists of, swapped in as a unit."""
+
+    index: faiss.Index          # ids are chunk-store row ids
+    chunks: ChunkStore
+    bm25: Optional[BM25Index]
+    version: Optional[str]
+    metadata: Optional[MetadataIndex] = None   # filterable fields -> row ids
+    corpus_id: Optional[str] = None            # None: unsharded index (any corpus)
+    # Unsharded index searched next to the shards: the corpora it still serves
+    corpora: Optional[Tuple[str, ...]] = None
+
+
+@dataclass(frozen=True)
+class ShardSet:
+    """
+    The loaded shards one request searches. Row ids are per shard, so
+    every hit has to be resolved against the shard it came from.
+    """
+
+    shards: Tuple[LoadedIndex, ...]
+    version: Optional[str]     # of every published shard, not only these
+
+    def values(self, field: str) -> List[str]:
+        """Distinct stored values of a filterable field across the shards."""
+        return sorted({
+            value
+            for shard in self.shards if shard.metadata is not None
+            for value in shard.metadata.values(field)
+        })
+
+
+class VectorStoreManager:
+    """
+    Process-wide holder of the loaded vector index + chunk store.
+
+    The index is loaded once and reused across queries. Every `get()` does a
+    cheap version check (the VERSION stamp written by ingestion, falling back
+    to the mtime of index.faiss) and swaps in the new index when it changed.
+    Readers always receive a fully loaded index; the swap is a single
+    reference assignment.
+    """
+
+    def __init__(
+        self,
+        path: str = VECTOR_DB_PATH,
+        mmap: bool = FAISS_MMAP,
+        corpus_id: Optional[str] = None,
+    ):
+        self.path = Path(path)
+        self.mmap = mmap
+        self.corpus_id = corpus_id
+
+        self._lock = threading.Lock()
+        self._state: Optional[LoadedIndex] = None
+        self._load_seconds: Optional[float] = None
+        self._loaded_at: Optional[float] = None
+        self._cold_start_seconds: Optional[float] = None
+        self._load_memory: Optional[dict] = None
+
+    # -----------------------------
+    # Version detection
+    # -----------------------------
+    def current_disk_version(self) -> Optional[str]:
+        stamp = self.path / VECTOR_DB_VERSION_FILE
+        try:
+            return stamp.read_text().strip()
+        except FileNotFoundError:
+            pass
+
+        # Index written without a stamp (older ingestion) -> use its mtime
+        try:
+            return f"mtime:{(self.path / 'index.faiss').stat().st_mtime_ns}"
+        except FileNotFoundError:
+            return None
+
+    # -----------------------------
+    # Access
+    # -----------------------------
+    def get(self) -> LoadedIndex:
+        state = self._state
+        disk_version = self.current_disk_version()
+
+        if state is not None and (
+            disk_version is None or disk_version == state.version
+        ):
+            # Index unchanged (or mid-rebuild) -> keep serving what we have
+            return state
+
+        return self.reload()
+
+    def reload(self, force: bool = False) -> LoadedIndex:
+        with self._lock:
+            state = self._state
+            disk_version = self.current_disk_version()
+
+            # Another thread may have reloaded while we waited for the lock
+            if not force and state is not None and disk_version == state.version:
+                return state
+
+            if disk_version is None:
+                if state is not None:
+                    return state
+                raise RetrievalError(
+                    f"No vectorstore found at '{self.path}'. Run ingestion first."
+                )
+
+            memory_before = memory_usage()
+            start = time.perf_counter()
+            try:
+                index = read_serving_index(str(self.path), mmap=self.mmap)
+                chunks = self._open_chunks()
+                bm25 = BM25Index.load(str(self.path))
+                metadata = MetadataIndex.load(str(self.path))
+            except RetrievalError as e:
+                if state is not None:
+                    # e.g. files caught mid-publish: serve what we have, retry on the next get()
+                    logger.warning("Keeping index version %s: %s", state.version, e)
+                    return state
+                raise
+            except Exception as e:
+                raise RetrievalError(f"Vectorstore loading failed: {e}") from e
+            elapsed = time.perf_counter() - start
+            memory_after = memory_usage()
+
+            # Ingestion published again while we were reading -> the files we
+            # read may be a mix of two versions, so leave the stamp unmatched
+            # and let the next get() reload.
+            if self.current_disk_version() != disk_version:
+                disk_version = None
+
+            self._state = LoadedIndex(
+                index, chunks, bm25, disk_version, metadata, self.corpus_id
+            )
+            self._load_seconds = elapsed
+            self._loaded_at = time.time()
+            if self._cold_start_seconds is None:
+                self._cold_start_seconds = elapsed
+            if memory_before and memory_after:
+                self._load_memory = {
+                    f"{key}_delta": memory_after[key] - memory_before[key]
+                    for key in memory_before
+                }
+
+            logger.info(
+                "Loaded index %s version %s (%s, %d vectors%s) in %.3fs; memory delta %s",
+                self.corpus_id or self.path, disk_version, type(index).__name__,
+                index.ntotal, ", mmap" if self.mmap else "", elapsed, self._load_memory,
+            )
+            return self._state
+
+    def unload(self) -> bool:
+        """
+        Drop the loaded index; the next `get()` loads it again. Requests
+        still holding it keep a working reference until they finish.
+        """
+        with self._lock:
+            unloaded, self._state = self._state is not None, None
+        if unloaded:
+            logger.info("Unloaded index %s", self.corpus_id or self.path)
+        return unloaded
+
+    def _open_chunks(self) -> ChunkStore:
+        # Opening reads no chunk data; queries fetch only their hits
+        path = self.path / CHUNK_STORE_FILE
+        if not path.exists():
+            raise RetrievalError(
+                f"No chunk store at '{path}' (index written by an older version). "
+                "Re-run ingestion."
+            )
+        return ChunkStore.open_readonly(str(path))
+
+    # -----------------------------
+    # Introspection
+    # -----------------------------
+    @property
+    def version(self) -> Optional[str]:
+        return self._state.version if self._state is not None else None
+
+    @property
+    def loaded(self) -> bool:
+        return self._state is not None
+
+    @property
+    def load_seconds(self) -> Optional[float]:
+        return self._load_seconds
+
+    @property
+    def loaded_at(self) -> Optional[float]:
+        return self._loaded_at
+
+    @property
+    def cold_start_seconds(self) -> Optional[float]:
+        """Duration of the first load in this process."""
+        return self._cold_start_seconds
+
+    def stats(self) -> dict:
+        state = self._state
+        return {
+            "path": str(self.path),
+            "corpus_id": self.corpus_id,
+            "version": self.version,
+            "load_seconds": self._load_seconds,
+            "cold_start_seconds": self._cold_start_seconds,
+            "loaded_at": self._loaded_at,
+            "mmap": self.mmap,
+            "load_memory": self._load_memory,
+            "memory": memory_usage(),
+            "ntotal": state.index.ntotal if state is not None else 0,
+            "index_type": type(state.index).__name__ if state is not None else None,
+            "bm25_docs": len(state.bm25) if state is not None and state.bm25 is not None else 0,
+        }
+
+
+class ShardedIndexManager:
+    """
+    One `VectorStoreManager` per corpus shard (VECTOR_DB_PATH/shards/<corpus_id>).
+
+    Shards load on the first request that searches them and can be
+    loaded / unloaded one by one, so memory follows what is actually
+    queried. With `max_loaded` set, the least recently searched shards
+    are unloaded once more than that many are loaded.
+
+    An index written before sharding (directly under VECTOR_DB_PATH) is
+    served on its own until the first corpus shard is published, then
+    searched next to the shards for the corpora that have none yet (so a
+    re-ingested corpus is not served twice), until all are migrated.
+    """
+
+    def __init__(
+        self,
+        path: str = VECTOR_DB_PATH,
+        mmap: bool = FAISS_MMAP,
+        max_loaded: int = SHARD_MAX_LOADED,
+    ):
+        self.path = Path(path)
+        self.mmap = mmap
+        self.max_loaded = max_loaded
+
+        self._lock = threading.Lock()
+        # Least recently searched first
+        self._shards: "OrderedDict[str, VectorStoreManager]" = OrderedDict()
+        self._unsharded = VectorStoreManager(str(self.path), mmap)
+        # ((unsharded version, shards), corpora it still serves), see _unsharded_corpora
+        self._unsharded_scope: Optional[Tuple[tuple, Tuple[str, ...]]] = None
+
+    def available(self) -> List[str]:
+        """Corpus ids with a published shard."""
+        return list_shards(str(self.path))
+
+    def shard(self, corpus_id: str) -> VectorStoreManager:
+        with self._lock:
+            manager = self._shards.get(corpus_id)
+            if manager is None:
+                manager = VectorStoreManager(
+                    shard_path(corpus_id, str(self.path)), self.mmap, corpus_id
+                )
+                self._shards[corpus_id] = manager
+            self._shards.move_to_end(corpus_id)
+        return manager
+
+    # -----------------------------
+    # Access
+    # -----------------------------
+    def get(self, filters: Optional[Filters] = None) -> ShardSet:
+        """
+        The shards a request with these `filters` has to search: the ones
+        named by a "corpus_id" filter, or all of them.
+        """
+        available = self.available()
+        if not available:
+            # Nothing sharded yet -> the unsharded index (or RetrievalError)
+            index = self._unsharded.get()
+            return ShardSet((index,), index.version)
+
+        wanted = normalize_filters(filters).get("corpus_id")
+        corpora = [c for c in available if wanted is None or c in wanted]
+        shards = tuple(self.shard(corpus_id).get() for corpus_id in corpora)
+        self._evict(keep=corpora)
+
+        unsharded = self._unsharded_corpora(available)
+        if not unsharded:
+            self._unsharded.unload()
+        else:
+            scope = tuple(c for c in unsharded if wanted is None or c in wanted)
+            if scope:
+                shards += (replace(self._unsharded.get(), corpora=scope),)
+
+        return ShardSet(shards, self._version(available, shards, bool(unsharded)))
+
+    def _unsharded_corpora(self, available: Sequence[str]) -> Tuple[str, ...]:
+        """
+        Corpora of the pre-sharding index that have no shard yet (read from
+        its metadata file, so without loading it); warns once per change.
+        """
+        version = self._unsharded.current_disk_version()
+        if version is None:
+            return ()
+
+        key = (version, tuple(available))
+        cached = self._unsharded_scope
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        stored = MetadataIndex.stored_values(str(self.path), "corpus_id")
+        corpora = tuple(c for c in stored if c not in available)
+        if not stored:
+            logger.warning(
+                "Index under '%s' predates sharding and has no metadata index, so it "
+                "can't be searched next to the corpus shards; re-run ingestion for "
+                "its corpora", self.path,
+            )
+        elif corpora:
+            logger.warning(
+                "Index under '%s' predates sharding; still searching it for %s "
+                "until they are ingested into shards", self.path, ", ".join(corpora),
+            )
+        else:
+            logger.warning(
+                "Index under '%s' predates sharding and all its corpora have shards "
+                "now; it is no longer searched and can be deleted", self.path,
+            )
+
+        self._unsharded_scope = (key, corpora)
+        return corpora
+
+    def _version(
+        self,
+        available: Sequence[str],
+        shards: Sequence[LoadedIndex],
+        unsharded: bool = False,
+    ) -> Optional[str]:
+        # Same key whichever shards a request selects, so scoped and
+        # unscoped requests don't invalidate each other's cached answers
+        versions: Dict[str, Optional[str]] = {
+            s.corpus_id: s.version for s in shards if s.corpus_id is not None
+        }
+        for corpus_id in available:
+            if corpus_id not in versions:
+                versions[corpus_id] = self.shard_version(corpus_id)
+        if unsharded:
+            # "" can't be a corpus id
+            versions[""] = self._unsharded.current_disk_version()
+        if any(v is None for v in versions.values()):
+            return None
+        return ",".join(f"{c}:{versions[c]}" for c in sorted(versions))
+
+    def shard_version(self, corpus_id: str) -> Optional[str]:
+        """Published version of a shard, loaded or not."""
+        return VectorStoreManager(
+            shard_path(corpus_id, str(self.path)), self.mmap, corpus_id
+        ).current_disk_version()
+
+    def values(self, field: str, corpora: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Distinct values of a filterable field in the given shards (default:
+        all). Loaded shards answer from memory, the others from their
+        metadata file, so listing values never loads a shard.
+        """
+        available = self.available()
+        if not available:
+            roots = [(self._unsharded._state, self.path)]
+        else:
+            with self._lock:
+                managers = {c: self._shards.get(c) for c in available}
+            roots = [
+                (m._state if m is not None else None, Path(shard_path(c, str(self.path))))
+                for c, m in managers.items() if corpora is None or c in corpora
+            ]
+            # Values of the unsharded index aren't split by corpus; list them unscoped
+            if corpora is None and self._unsharded_corpora(available):
+                roots.append((self._unsharded._state, self.path))
+
+        values = set()
+        for state, root in roots:
+            if state is not None and state.metadata is not None:
+                values.update(state.metadata.values(field))
+            else:
+                values.update(MetadataIndex.stored_values(str(root), field))
+        return sorted(values)
+
+    def load(self, corpus_id: str) -> LoadedIndex:
+        if corpus_id not in self.available():
+            raise RetrievalError(f"No shard for corpus '{corpus_id}'. Run ingestion first.")
+        index = self.shard(corpus_id).get()
+        self._evict(keep=[corpus_id])
+        return index
+
+    def unload(self, corpus_id: str) -> bool:
+        with self._lock:
+            manager = self._shards.get(corpus_id)
+        return manager.unload() if manager is not None else False
+
+    def _evict(self, keep: Sequence[str]) -> None:
+        if self.max_loaded <= 0:
+            return
+        with self._lock:
+            loaded = [c for c, manager in self._shards.items() if manager.loaded]
+            victims = [c for c in loaded if c not in keep][: max(0, len(loaded) - self.max_loaded)]
+            managers = [self._shards[c] for c in victims]
+        for manager in managers:
+            manager.unload()
+
+    # -----------------------------
+    # Introspection
+    # -----------------------------
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return [c for c, manager in self._shards.items() if manager.loaded]
+
+    def stats(self) -> dict:
+        with self._lock:
+            managers = list(self._shards.values())
+        return {
+            "path": str(self.path),
+            "available": self.available(),
+            "loaded": self.loaded(),
+            "max_loaded": self.max_loaded,
+            "shards": {m.corpus_id: m.stats() for m in managers if m.loaded},
+            "unsharded": self._unsharded.stats() if self._unsharded.loaded else None,
+            "memory": memory_usage(),
+        }
@@ -0,0 +1,324 @@
+"""
+Async HTTP query service.
+
+One process serves many concurrent users: the event loop only parses
+requests and awaits. Embedding, FAISS search and reranking run on a
+bounded thread pool (torch / FAISS release the GIL), LLM calls are
+awaited so any number of answers can wait on the LLM at once, and
+ingestion runs on its own single thread so it never starves queries.
+
+Admission control: at most API_MAX_INFLIGHT requests are served at a
+time and up to API_MAX_QUEUE more wait for a slot (for at most
+API_QUEUE_TIMEOUT seconds); everything beyond that gets an immediate
+503 with Retry-After, so overload shows up as fast rejections instead
+of an ever-growing queue.
+
+    cd src
+    uvicorn api.app:app --host 0.0.0.0 --port 8000
+    python -m api.app --port 8000
+
+    POST /retrieve  {"query": "...", "k": 30, "top_n": 10, "filters": {...}}
+    POST /answer    {"query": "...", "use_cache": true, "filters": {...}}
+    POST /ingest    {"document_type": "iso_structured"}   (UPLOAD_DIRECTORY/<corpus_id>)
+    POST /shards/{corpus_id}/load, /shards/{corpus_id}/unload
+    GET  /health, /metrics, /traces
+
+Needs the "api" extra (fastapi, uvicorn).
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Union
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+
+from core.config import (
+    ANSWER_CACHE_ENABLED,
+    API_CPU_WORKERS,
+    API_MAX_INFLIGHT,
+    API_MAX_QUEUE,
+    API_QUEUE_TIMEOUT,
+    API_WARMUP,
+    UPLOAD_DIRECTORY,
+)
+from core.constants import DocumentType
+from core.exception import PipelineError, RAGError, RetrievalError
+from ingestion.loader.registry import CORPUS_IDS
+from utils.telemetry import REQUESTS, recent_traces, render_metrics, span, traced
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# ADMISSION CONTROL
+# =========================
+class Overloaded(Exception):
+    """No slot became free in time (or the wait queue is full)."""
+
+
+class Admission:
+    """
+    At most `max_inflight` requests run at once; up to `max_queue` more
+    wait (at most `timeout` seconds each) and the rest are turned away.
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int, timeout: float):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self._slots.locked():
+            await self._slots.acquire()   # a slot is free: returns at once
+        else:
+            if self.waiting >= self.max_queue:
+                raise Overloaded(f"{self.waiting} requests already waiting")
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                raise Overloaded(f"no free slot within {self.timeout:g}s") from None
+            finally:
+                self.waiting -= 1
+
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+        }
+
+
+# =========================
+# WORKER POOLS
+# =========================
+class Workers:
+    """The CPU pool for query work and the single ingestion thread."""
+
+    def __init__(self, cpu_workers: int):
+        self.cpu = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="api-cpu")
+        self.ingest = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-ingest")
+        self.ingest_lock = asyncio.Lock()
+
+    async def run_cpu(self, fn, *args, **kwargs):
+        return await self._run(self.cpu, fn, *args, **kwargs)
+
+    async def run_ingest(self, fn, *args, **kwargs):
+        return await self._run(self.ingest, fn, *args, **kwargs)
+
+    @staticmethod
+    async def _run(pool: ThreadPoolExecutor, fn, *args, **kwargs):
+        # Copy the context so spans in the worker join the request trace
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(pool, call)
+
+    def shutdown(self) -> None:
+        self.cpu.shutdown(wait=False, cancel_futures=True)
+        self.ingest.shutdown(wait=False, cancel_futures=True)
+
+
+# =========================
+# SCHEMAS
+# =========================
+Filters = Dict[str, Union[str, List[str]]]
+
+
+class RetrieveRequest(BaseModel):
+    query: str = Field(min_length=1)
+    k: int = Field(30, ge=1, le=500)
+    top_n: int = Field(10, ge=1, le=100)
+    filters: Optional[Filters] = None
+
+
+class AnswerRequest(BaseModel):
+    query: str = Field(min_length=1)
+    use_cache: bool = ANSWER_CACHE_ENABLED
+    filters: Optional[Filters] = None
+
+
+class IngestRequest(BaseModel):
+    # Ingests the corpus' upload dir (where the UI stores it); clients
+    # never name a server-side path
+    document_type: DocumentType
+    reset_index: bool = False
+    streaming: bool = False
+
+
+def _chunk_json(doc) -> dict:
+    return {
+        "text": doc.page_content,
+        "metadata": doc.metadata,
+    }
+
+
+# =========================
+# APP
+# =========================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.admission = Admission(API_MAX_INFLIGHT, API_MAX_QUEUE, API_QUEUE_TIMEOUT)
+    app.state.workers = Workers(API_CPU_WORKERS)
+
+    if API_WARMUP:
+        from utils.startup import warmup
+
+        timings = await app.state.workers.run_cpu(warmup)
+        logger.info("Warmup: %s", {k: round(v, 3) for k, v in timings.items()})
+
+    try:
+        yield
+    finally:
+        app.state.workers.shutdown()
+
+
+app = FastAPI(title="RAG query service", lifespan=lifespan)
+
+
+@app.exception_handler(Overloaded)
+async def _overloaded(request: Request, exc: Overloaded):
+    REQUESTS.inc(request=request.url.path.strip("/"), status="rejected")
+    return JSONResponse(
+        {"detail": f"Server busy: {exc}"}, status_code=503, headers={"Retry-After": "1"}
+    )
+
+
+@app.exception_handler(RAGError)
+async def _rag_error(request: Request, exc: RAGError):
+    # No index yet / index unreadable is the server's state, not a bad request
+    status = 503 if isinstance(exc, RetrievalError) else 500
+    return JSONResponse({"detail": str(exc), "error": type(exc).__name__}, status_code=status)
+
+
+@app.post("/retrieve")
+async def retrieve(body: RetrieveRequest, request: Request):
+    from query.retriever import run_query
+
+    state = request.app.state
+    async with state.admission.slot():
+        with traced("api_retrieve", filtered=bool(body.filters)):
+            with span("cpu_pool"):   # includes the wait for a free worker
+                docs = await state.workers.run_cpu(
+                    run_query, body.query, k=body.k, filters=body.filters, top_n=body.top_n
+                )
+
+    return {"chunks": [_chunk_json(doc) for doc in docs]}
+
+
+@app.post("/answer")
+async def answer(body: AnswerRequest, request: Request):
+    from llm.llm_answer import aanswer_query
+
+    state = request.app.state
+    async with state.admission.slot():
+        result = await aanswer_query(
+            body.query,
+            use_cache=body.use_cache,
+            filters=body.filters,
+            run_cpu=state.workers.run_cpu,
+        )
+
+    return {
+        "answer": result["answer"],
+        "chunks": [_chunk_json(doc) for doc in result["chunks"]],
+    }
+
+
+@app.post("/ingest")
+async def ingest(body: IngestRequest, request: Request):
+    from ingestion.ingestion_pipeline import run_ingestion, run_streaming_ingestion
+
+    workers: Workers = request.app.state.workers
+    if workers.ingest_lock.locked():
+        raise HTTPException(409, "An ingestion run is already in progress")
+
+    upload_dir = os.path.join(UPLOAD_DIRECTORY, CORPUS_IDS[body.document_type])
+
+    async with workers.ingest_lock:
+        try:
+            if body.streaming:
+                stats = await workers.run_ingest(
+                    run_streaming_ingestion, upload_dir, body.document_type, body.reset_index
+                )
+                return {"stages": {name: s.as_dict() for name, s in stats.items()}}
+
+            chunks = await workers.run_ingest(
+                run_ingestion, upload_dir, body.document_type, body.reset_index
+            )
+        except PipelineError as e:
+            raise HTTPException(400, str(e)) from e
+
+    # Queries pick the new index version up on their next request
+    return {"chunks": len(chunks)}
+
+
+@app.get("/health")
+async def health(request: Request):
+    from query.rerankers import pair_scorer
+    from query.retriever import get_vectorstore_manager, query_encoder
+
+    return {
+        "status": "ok",
+        "admission": request.app.state.admission.stats(),
+        "ingesting": request.app.state.workers.ingest_lock.locked(),
+        "index": get_vectorstore_manager().stats(),
+        "micro_batching": {"embed": query_encoder.stats(), "rerank": pair_scorer.stats()},
+    }
+
+
+@app.post("/shards/{corpus_id}/load")
+async def load_shard(corpus_id: str, request: Request):
+    from query.retriever import get_vectorstore_manager
+
+    index = await request.app.state.workers.run_cpu(get_vectorstore_manager().load, corpus_id)
+    return {"corpus_id": corpus_id, "version": index.version, "vectors": index.index.ntotal}
+
+
+@app.post("/shards/{corpus_id}/unload")
+async def unload_shard(corpus_id: str):
+    from query.retriever import get_vectorstore_manager
+
+    return {"corpus_id": corpus_id, "unloaded": get_vectorstore_manager().unload(corpus_id)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/traces")
+async def traces():
+    return recent_traces()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the RAG query API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -4,18 +4,89 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from sentence_transformers import SentenceTransformer
-
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 100
+# Token-sized chunks: the embedding model truncates at 256 tokens
+CHUNK_MAX_TOKENS = 256       # incl. the model's special tokens
+CHUNK_OVERLAP_TOKENS = 48
+# Parent-child retrieval: small children are embedded and searched, hits
+# are collapsed to their parent (a section, or a section window) before rerank
+PARENT_CHILD_RETRIEVAL = os.getenv("PARENT_CHILD_RETRIEVAL", "1") == "1"
+PARENT_MAX_TOKENS = 384     # fits next to a query in the cross-encoder
+CHILD_MAX_TOKENS = 128
+CHILD_OVERLAP_TOKENS = 32
+# Near-duplicate chunks (boilerplate, repeated headers) are collapsed at
+# ingestion: MinHash over word shingles, LSH banding for candidates
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+DEDUP_THRESHOLD = 0.85      # estimated Jaccard similarity
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 16            # 4 rows per band -> candidates from ~0.5 similarity
+DEDUP_SHINGLE_WORDS = 3
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 VECTOR_DB_PATH = "vectorstore"
+VECTOR_DB_VERSION_FILE = "VERSION"
+VECTOR_DB_MANIFEST_FILE = "manifest.json"
+# One shard (a complete index) per corpus: VECTOR_DB_PATH/shards/<corpus_id>
+VECTOR_DB_SHARDS_DIR = "shards"
+SHARD_MAX_LOADED = int(os.getenv("SHARD_MAX_LOADED", "0"))   # 0 -> no limit; else LRU-unload the rest
+SHARD_SEARCH_WORKERS = 4     # shards searched in parallel per query
+# FAISS index_factory string for the serving index: "SQfp16" (exhaustive,
+# half the size of "Flat"), "IVF{nlist},PQ48", "HNSW32",
+# "IVF{nlist},Flat" ({nlist} sized from the corpus), ...
+FAISS_INDEX_FACTORY = os.getenv("FAISS_INDEX_FACTORY", "SQfp16")
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"   # map the serving index instead of reading it
+FAISS_NPROBE = 16       # IVF lists probed per query
+FAISS_EF_SEARCH = 64    # HNSW candidate list size per query
+HYBRID_RETRIEVAL = True      # vector + BM25, fused with reciprocal rank fusion
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+# Chunk metadata fields queries can be filtered on (row-id bitmap index)
+METADATA_FILTER_FIELDS = ("corpus_id", "doc_id", "doc_family", "file_name")
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch")   # torch | torch-int8 | onnx | onnx-int8
+RERANK_ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+RERANK_PRETOKENIZE = True      # store passage token IDs at ingestion
+RERANK_CACHE_SIZE = 20000      # (query, chunk) -> score entries
+RERANK_BATCH_SIZE = 32
 LLM_MODEL = "gpt-4.1-mini"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")   # None -> api.openai.com
+LLM_BATCH_CONCURRENCY = 8      # parallel LLM requests of answer_query_batch
 TOP_K = 5       
 TEMPERATURE = 0.7
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_THRESHOLD = 0.92   # min cosine between query embeddings for a hit
+ANSWER_CACHE_SIZE = 512         # cached answers (LRU)
+ANSWER_CACHE_TTL = 24 * 3600    # seconds
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "1") == "1"   # per-request traces + metrics
+TELEMETRY_RECENT_TRACES = 200   # traces kept for /traces
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))   # 0 -> no metrics endpoint
+# HTTP query service (api/app.py)
+API_CPU_WORKERS = int(os.getenv("API_CPU_WORKERS", "4"))     # embed / FAISS / rerank threads
+API_MAX_INFLIGHT = int(os.getenv("API_MAX_INFLIGHT", "32"))  # requests being served at once
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "128"))       # requests waiting for a slot
+API_QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "10"))   # seconds before a 503
+API_WARMUP = os.getenv("API_WARMUP", "1") == "1"   # load models / index at startup
+# Concurrent query encodes / rerank calls share one forward pass
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "1") == "1"
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))   # window to fill a batch
+MICRO_BATCH_MAX_QUERIES = 32         # query encodes per forward pass
+MICRO_BATCH_MAX_RERANK_QUERIES = 8   # queries whose (query, passage) pairs are scored together
 SOURCE_DIRECTORY = "data"
 PERSIST_DIRECTORY = "vectorstore"
+UPLOAD_DIRECTORY = "uploads"   # one dir per corpus, ingested by the UI / API (kept: re-ingested as a whole)
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", "1"))
+CLEAN_WORKERS = int(os.getenv("CLEAN_WORKERS", "1"))
+CLEAN_PARALLEL_MIN_CHARS = 2_000_000   # smaller inputs are cleaned in-process
+EMBED_BATCH_SIZE = 64        # max chunks per forward pass
+EMBED_BATCH_TOKENS = 8192    # max padded tokens per forward pass
+EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", "1"))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_DIR = "cache/embeddings"   # outside VECTOR_DB_PATH: survives index resets
+EMBEDDING_CACHE_MAX_BYTES = 512 * 1024 * 1024
+STREAM_BATCH_SIZE = 256   # chunks embedded + indexed per streaming batch
+STREAM_QUEUE_SIZE = 4     # batches buffered between streaming stages
 MAX_INPUT_SIZE = 4096
 MAX_TOTAL_TOKENS = 8192
 
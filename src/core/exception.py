@@ -12,7 +12,10 @@ class RAGError(Exception):
 
 class DocumentLoadError(RAGError):
     """Raised when a document cannot be loaded or parsed."""
-    pass
+
+    def __init__(self, message: str, source: str = None):
+        super().__init__(message)
+        self.source = source
 
 
 class CleaningError(RAGError):
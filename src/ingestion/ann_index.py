@@ -0,0 +1,162 @@
+import logging
+import math
+from pathlib import Path
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+from core.config import (
+    FAISS_EF_SEARCH,
+    FAISS_INDEX_FACTORY,
+    FAISS_MMAP,
+    FAISS_NPROBE,
+)
+from core.exception import IndexingError
+
+logger = logging.getLogger(__name__)
+
+# Serving index written next to the exact index.faiss
+ANN_INDEX_FILE = "ann.faiss"
+EXACT_INDEX_FILE = "index.faiss"
+
+# Zero-copy mapping of flat / SQ code arrays (newer FAISS); IO_FLAG_MMAP
+# alone only maps IVF inverted lists.
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+# FAISS warns below ~39 training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def is_flat(factory: str) -> bool:
+    return factory.strip() in ("", "Flat")
+
+
+def auto_nlist(n_vectors: int) -> int:
+    """~4*sqrt(n) IVF lists, capped so every centroid gets enough training points."""
+    nlist = int(4 * math.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def resolve_factory(factory: str, n_vectors: int) -> str:
+    """Fill the `{nlist}` placeholder (e.g. "IVF{nlist},Flat") for this corpus size."""
+    return factory.format(nlist=auto_nlist(n_vectors))
+
+
+def new_exact_index(dim: int) -> faiss.IndexIDMap2:
+    """
+    Exact L2 index keyed by chunk-store row id. IDMap2 keeps ids stable
+    under remove_ids and can hand its vectors back for rebuilding.
+    """
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+
+def exact_vectors(index: faiss.IndexIDMap2) -> Tuple[np.ndarray, np.ndarray]:
+    """(vectors, row ids) stored in an exact index."""
+    inner = faiss.downcast_index(index.index)
+    return inner.reconstruct_n(0, inner.ntotal), faiss.vector_to_array(index.id_map)
+
+
+def build_ann_index(
+    vectors: np.ndarray,
+    factory: str = FAISS_INDEX_FACTORY,
+    ids: Optional[np.ndarray] = None,
+) -> Optional[faiss.Index]:
+    """
+    Build the serving index described by a FAISS factory string
+    ("SQfp16", "HNSW32", "IVF{nlist},Flat", "IVF1024,PQ48", ...) over `vectors`.
+
+    Vectors are stored under `ids` (row ids) when given, else under their
+    position. IVF / PQ indexes are trained on the vectors themselves.
+    Returns None when the factory is flat or the corpus is too small to
+    train it; the exact index is served instead.
+    """
+    if is_flat(factory) or len(vectors) == 0:
+        return None
+
+    n, dim = vectors.shape
+    resolved = resolve_factory(factory, n)
+
+    try:
+        index = faiss.index_factory(dim, resolved, faiss.METRIC_L2)
+    except RuntimeError as e:
+        raise IndexingError(f"Invalid FAISS index factory '{resolved}': {e}") from e
+
+    if not index.is_trained:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and n < ivf.nlist:
+            logger.warning(
+                "Only %d vectors for %d IVF lists; serving the flat index", n, ivf.nlist
+            )
+            return None
+        try:
+            index.train(vectors)
+        except RuntimeError as e:
+            # e.g. PQ codebooks need more points than this corpus has
+            logger.warning("Cannot train '%s' (%s); serving the flat index", resolved, e)
+            return None
+
+    if ids is None:
+        index.add(vectors)
+    elif isinstance(index, faiss.IndexIVF):
+        index.add_with_ids(vectors, ids)  # IVF lists store ids natively
+    else:
+        index = faiss.IndexIDMap(index)
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def write_ann_index(index: Optional[faiss.Index], root: str) -> None:
+    """Persist the serving index, or remove a stale one when serving flat."""
+    path = Path(root) / ANN_INDEX_FILE
+    if index is None:
+        path.unlink(missing_ok=True)
+        return
+
+    tmp = path.with_name(f".{ANN_INDEX_FILE}.tmp")
+    faiss.write_index(index, str(tmp))
+    tmp.replace(path)
+
+
+def read_serving_index(root: str, mmap: bool = FAISS_MMAP) -> faiss.Index:
+    """
+    The index queries run against: ann.faiss when ingestion built one,
+    else the exact index.
+
+    With `mmap` the file is mapped rather than copied onto the heap, so
+    worker processes on one host share its pages through the page cache.
+    Files are only ever replaced (never rewritten in place), so a mapping
+    stays valid while ingestion publishes a new version.
+    """
+    root = Path(root)
+    path = root / ANN_INDEX_FILE
+    if not path.exists():
+        path = root / EXACT_INDEX_FILE
+
+    return faiss.read_index(str(path), _MMAP_FLAGS if mmap else 0)
+
+
+def search_parameters(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selector: Optional[faiss.IDSelector] = None,
+) -> Optional[faiss.SearchParameters]:
+    """
+    Per-call search knobs for IVF (`nprobe`) and HNSW (`efSearch`), plus an
+    optional ID selector restricting the search to some row ids.
+    Passed to `index.search(..., params=)`, so concurrent queries with
+    different settings never race on shared index state.
+    """
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)  # IDMap forwards params
+
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(
+            nprobe=min(nprobe or FAISS_NPROBE, index.nlist), sel=selector
+        )
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or FAISS_EF_SEARCH, sel=selector)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
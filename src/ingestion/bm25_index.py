@@ -0,0 +1,163 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import BM25_B, BM25_K1
+from ingestion.index_files import load_pair, save_pair
+
+# Clause numbers ("6.1.2", "A.5.23") stay single tokens so they match exactly
+_TOKEN = re.compile(r"(?:[a-z]\.)?\d+(?:\.\d+)+|\w+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that "
+    "the this to was were which with shall should".split()
+)
+
+BM25_ARRAYS_FILE = "bm25.npz"
+BM25_META_FILE = "bm25.json"
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def indexed_text(doc) -> str:
+    """Section heading + content, so clause titles are searchable too."""
+    section = doc.metadata.get("section_title", "")
+    return f"{section}\n{doc.page_content}" if section else doc.page_content
+
+
+class BM25Index:
+    """
+    Compact BM25 inverted index.
+
+    Postings are stored CSR-style in flat numpy arrays:
+    - indptr[t] : postings[indptr[t]:indptr[t+1]] belong to term t
+    - postings  : int32 document positions
+    - weights   : float32 precomputed BM25 impact of the term in that document
+
+    Since impacts are precomputed at build time, a query only gathers the
+    posting slices of its terms and sums them with one bincount.
+    """
+
+    def __init__(
+        self,
+        doc_ids: List[int],
+        vocab: Dict[str, int],
+        indptr: np.ndarray,
+        postings: np.ndarray,
+        weights: np.ndarray,
+    ):
+        self.doc_ids = doc_ids
+        self.vocab = vocab
+        self.indptr = indptr
+        self.postings = postings
+        self.weights = weights
+        self._doc_id_arr: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    # -----------------------------
+    # Build
+    # -----------------------------
+    @classmethod
+    def build(
+        cls,
+        items: Iterable[Tuple[int, str]],
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ) -> "BM25Index":
+        """Build from (doc_id, text) pairs; doc ids are chunk-store row ids."""
+        doc_ids: List[int] = []
+        vocab: Dict[str, int] = {}
+        term_col: List[int] = []
+        doc_col: List[int] = []
+        tf_col: List[int] = []
+        doc_len: List[int] = []
+
+        for pos, (doc_id, text) in enumerate(items):
+            tokens = tokenize(text)
+            doc_ids.append(doc_id)
+            doc_len.append(len(tokens))
+
+            for term, tf in Counter(tokens).items():
+                term_col.append(vocab.setdefault(term, len(vocab)))
+                doc_col.append(pos)
+                tf_col.append(tf)
+
+        terms = np.asarray(term_col, dtype=np.int64)
+        docs = np.asarray(doc_col, dtype=np.int32)
+        tfs = np.asarray(tf_col, dtype=np.float32)
+        lengths = np.asarray(doc_len, dtype=np.float32)
+
+        n_docs = len(doc_ids)
+        avgdl = float(lengths.mean()) if n_docs and lengths.sum() > 0 else 1.0
+        df = np.bincount(terms, minlength=len(vocab)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        norm = k1 * (1.0 - b + b * lengths[docs] / avgdl)
+        impact = (idf[terms] * tfs * (k1 + 1.0) / (tfs + norm)).astype(np.float32)
+
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=indptr[1:])
+
+        return cls(doc_ids, vocab, indptr, docs[order], impact[order])
+
+    # -----------------------------
+    # Search
+    # -----------------------------
+    def search(self, query: str, k: int = 30, selection=None) -> List[Tuple[int, float]]:
+        """
+        Top-k (doc_id, score). `selection` (a metadata RowSelection over
+        integer doc ids) drops the documents a filter excludes.
+        """
+        term_ids = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        if not term_ids or not self.doc_ids:
+            return []
+
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.postings[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+
+        scores = np.bincount(docs, weights=weights, minlength=len(self.doc_ids))
+        hits = np.flatnonzero(scores)
+        if selection is not None:
+            hits = hits[selection.contains(self._doc_id_array()[hits])]
+        if hits.size > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+
+        return [(self.doc_ids[i], float(scores[i])) for i in hits]
+
+    def _doc_id_array(self) -> np.ndarray:
+        if self._doc_id_arr is None:
+            self._doc_id_arr = np.asarray(self.doc_ids, dtype=np.int64)
+        return self._doc_id_arr
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, root: str) -> None:
+        terms = sorted(self.vocab, key=self.vocab.get)
+        save_pair(
+            root,
+            BM25_ARRAYS_FILE,
+            BM25_META_FILE,
+            {"indptr": self.indptr, "postings": self.postings, "weights": self.weights},
+            {"terms": terms, "doc_ids": self.doc_ids},
+        )
+
+    @classmethod
+    def load(cls, root: str) -> Optional["BM25Index"]:
+        loaded = load_pair(root, BM25_ARRAYS_FILE, BM25_META_FILE)
+        if loaded is None:
+            return None
+
+        arrays, meta = loaded
+        indptr, postings, weights = arrays["indptr"], arrays["postings"], arrays["weights"]
+        vocab = {term: i for i, term in enumerate(meta["terms"])}
+        return cls(meta["doc_ids"], vocab, indptr, postings, weights)
@@ -0,0 +1,257 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ingestion.rerank_tokens import PASSAGE_TOKENS_KEY
+
+CHUNK_STORE_FILE = "chunks.sqlite"
+
+# Max host parameters per "IN (...)" query
+_SQL_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    rerank_ids BLOB
+);
+CREATE TABLE IF NOT EXISTS parents (
+    parent_id TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    rerank_ids BLOB
+);
+"""
+
+
+class ChunkStore:
+    """
+    Chunk text + metadata keyed by integer row id (= FAISS vector id).
+
+    Replaces the pickled LangChain docstore: a query reads only the rows of
+    its hits instead of unpickling every chunk at load time. Reranker token
+    IDs live in their own int32 BLOB column rather than in the JSON metadata.
+
+    Row ids come from a counter that never goes backwards, so an id held by
+    an older index version can never resolve to a different chunk.
+
+    With parent-child chunking, chunks are the embedded children and
+    `parents` holds each parent's text once; a child row names its parent
+    in `parent_id`. Parents left without children are dropped on delete.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, path: Path):
+        self.path = path
+        self._conn = conn
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Opening
+    # -----------------------------
+    @classmethod
+    def create(cls, path: str) -> "ChunkStore":
+        """Empty, writable store (replacing any file at `path`)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)
+        return cls._open_writable(path)
+
+    @classmethod
+    def copy_of(cls, source: str, path: str) -> "ChunkStore":
+        """Writable copy of a published store, to be edited and published again."""
+        path = Path(path)
+        path.unlink(missing_ok=True)
+        src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        try:
+            dst = sqlite3.connect(str(path))
+            src.backup(dst)
+            dst.close()
+        finally:
+            src.close()
+        return cls._open_writable(path)
+
+    @classmethod
+    def open_readonly(cls, path: str) -> "ChunkStore":
+        """
+        Query-side handle. Published files are replaced, never edited, so
+        the file behind this handle is immutable and needs no locking.
+        """
+        conn = sqlite3.connect(
+            f"file:{Path(path).resolve()}?mode=ro&immutable=1",
+            uri=True,
+            check_same_thread=False,
+        )
+        return cls(conn, Path(path))
+
+    @classmethod
+    def _open_writable(cls, path: Path) -> "ChunkStore":
+        conn = sqlite3.connect(str(path), check_same_thread=False)
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+        if "parent_id" not in columns:
+            conn.execute("ALTER TABLE chunks ADD COLUMN parent_id TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_parent ON chunks(parent_id)")
+        conn.execute("INSERT OR IGNORE INTO meta VALUES ('next_id', 0)")
+        return cls(conn, path)
+
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def add(self, chunk_ids: Sequence[str], docs: Sequence[Document]) -> np.ndarray:
+        """Insert chunks; returns their new row ids (int64, input order)."""
+        with self._lock:
+            (start,) = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'next_id'"
+            ).fetchone()
+            row_ids = np.arange(start, start + len(docs), dtype=np.int64)
+
+            self._conn.executemany(
+                "INSERT INTO chunks (id, chunk_id, text, metadata, rerank_ids, parent_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (*_encode_row(int(rid), cid, doc), doc.metadata.get("parent_id"))
+                    for rid, cid, doc in zip(row_ids, chunk_ids, docs)
+                ),
+            )
+            self._conn.execute(
+                "UPDATE meta SET value = ? WHERE key = 'next_id'", (start + len(docs),)
+            )
+        return row_ids
+
+    def add_parents(self, parent_ids: Sequence[str], docs: Sequence[Document]) -> None:
+        """Insert parents; ones already stored (same id = same text) are kept."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO parents VALUES (?, ?, ?, ?)",
+                ((pid, *_encode_doc(doc)) for pid, doc in zip(parent_ids, docs)),
+            )
+
+    def delete(self, row_ids: Iterable[int]) -> None:
+        row_ids = [int(i) for i in row_ids]
+        with self._lock:
+            for batch in _batches(row_ids):
+                self._conn.execute(
+                    f"DELETE FROM chunks WHERE id IN ({_placeholders(batch)})", batch
+                )
+            if row_ids:
+                self._conn.execute(
+                    "DELETE FROM parents WHERE NOT EXISTS "
+                    "(SELECT 1 FROM chunks WHERE chunks.parent_id = parents.parent_id)"
+                )
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def row_ids(self, chunk_ids: Iterable[str]) -> List[int]:
+        """Row ids of the given chunk IDs; unknown IDs are skipped."""
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        found: List[int] = []
+        with self._lock:
+            for batch in _batches(chunk_ids):
+                found.extend(
+                    rid for (rid,) in self._conn.execute(
+                        f"SELECT id FROM chunks WHERE chunk_id IN ({_placeholders(batch)})", batch
+                    )
+                )
+        return found
+
+    def get(self, row_ids: Iterable[int]) -> Dict[int, Document]:
+        """Documents of the given row ids; ids no longer stored are absent."""
+        row_ids = [int(i) for i in row_ids]
+        docs: Dict[int, Document] = {}
+        with self._lock:
+            for batch in _batches(row_ids):
+                for row in self._conn.execute(
+                    f"SELECT id, text, metadata, rerank_ids FROM chunks "
+                    f"WHERE id IN ({_placeholders(batch)})",
+                    batch,
+                ):
+                    docs[row[0]] = _decode_row(*row[1:])
+        return docs
+
+    def get_parents(self, parent_ids: Iterable[str]) -> Dict[str, Document]:
+        """Parent documents by parent id; unknown ids are absent."""
+        parent_ids = list(dict.fromkeys(parent_ids))
+        docs: Dict[str, Document] = {}
+        with self._lock:
+            for batch in _batches(parent_ids):
+                for row in self._conn.execute(
+                    f"SELECT parent_id, text, metadata, rerank_ids FROM parents "
+                    f"WHERE parent_id IN ({_placeholders(batch)})",
+                    batch,
+                ):
+                    docs[row[0]] = _decode_row(*row[1:])
+        return docs
+
+    def iter_documents(self) -> Iterator[Tuple[int, Document]]:
+        """(row id, Document) of every chunk, in row id order."""
+        cursor = self._conn.execute("SELECT id, text, metadata FROM chunks ORDER BY id")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for rid, text, metadata in rows:
+                yield rid, Document(page_content=text, metadata=json.loads(metadata))
+
+    def iter_fields(self, fields: Sequence[str]) -> Iterator[tuple]:
+        """(row id, value of each field) of every chunk; metadata is not decoded in Python."""
+        columns = "".join(f", json_extract(metadata, ?)" for _ in fields)
+        cursor = self._conn.execute(
+            f"SELECT id{columns} FROM chunks ORDER BY id",
+            [f'$."{field}"' for field in fields],
+        )
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            yield from rows
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        return count
+
+
+def _encode_row(row_id: int, chunk_id: str, doc: Document) -> tuple:
+    return (row_id, chunk_id, *_encode_doc(doc))
+
+
+def _encode_doc(doc: Document) -> tuple:
+    metadata = dict(doc.metadata)
+    tokens = metadata.pop(PASSAGE_TOKENS_KEY, None)
+    blob = np.asarray(tokens, dtype=np.int32).tobytes() if tokens is not None else None
+    return doc.page_content, json.dumps(metadata, default=str), blob
+
+
+def _decode_row(text: str, metadata: str, blob) -> Document:
+    meta = json.loads(metadata)
+    if blob is not None:
+        meta[PASSAGE_TOKENS_KEY] = np.frombuffer(blob, dtype=np.int32).tolist()
+    return Document(page_content=text, metadata=meta)
+
+
+def _batches(items: list) -> Iterator[list]:
+    for start in range(0, len(items), _SQL_BATCH):
+        yield items[start:start + _SQL_BATCH]
+
+
+def _placeholders(batch: list) -> str:
+    return ",".join("?" * len(batch))
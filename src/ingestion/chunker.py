@@ -1,41 +1,272 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List
-import re
+from bisect import bisect_left
+from collections import ChainMap
+from typing import List, Optional, Sequence, Tuple, Union
+
 from langchain_core.documents import Document
 
+from core.config import (
+    CHILD_MAX_TOKENS,
+    CHILD_OVERLAP_TOKENS,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    EMBEDDING_MODEL,
+    PARENT_CHILD_RETRIEVAL,
+    PARENT_MAX_TOKENS,
+)
+
+# Preferred chunk ends, best first: paragraph, line, sentence, word
+_SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+_tokenizer = None
+
+
+def get_chunk_tokenizer():
+    """Tokenizer of the embedding model only; no model weights are loaded."""
+    global _tokenizer
+
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+        _tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+
+    return _tokenizer
+
+
+class SectionSpan:
+    """
+    One chunk of a section: (section, start, end) character offsets.
+
+    The text is sliced out of the section only when read (`page_content`,
+    i.e. when the chunk is embedded / stored), so the overlapping chunks of
+    a section share its string instead of each holding a copy. Chunk-level
+    keys (offsets, chunk_id, ...) are written on top of the section's
+    metadata, which is shared too.
+
+    A child chunk of parent-child retrieval also points at its `parent`
+    span (stored once, returned in place of its children at query time).
+    """
+
+    __slots__ = ("section", "start", "end", "metadata", "parent")
+
+    def __init__(
+        self,
+        section: Document,
+        start: int,
+        end: int,
+        chunk_metadata: dict,
+        parent: Optional["SectionSpan"] = None,
+    ):
+        self.section = section
+        self.start = start
+        self.end = end
+        self.metadata = ChainMap(chunk_metadata, section.metadata)
+        self.parent = parent
+
+    @property
+    def page_content(self) -> str:
+        return self.section.page_content[self.start:self.end]
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.page_content, metadata=dict(self.metadata))
+
+    def __repr__(self) -> str:
+        return f"SectionSpan({self.start}:{self.end}, {self.page_content[:40]!r}...)"
+
+
+Chunk = Union[Document, SectionSpan]
+
+
+def chunk_documents(docs: List[Document]) -> List[Chunk]:
+    """The ingestion chunking stage, as configured (PARENT_CHILD_RETRIEVAL)."""
+    if PARENT_CHILD_RETRIEVAL:
+        return parent_child_chunks(docs)
+    return chunk_large_sections(docs)
+
+
+def _token_offsets(docs: List[Document], tokenizer) -> List[List[Tuple[int, int]]]:
+    return tokenizer(
+        [doc.page_content for doc in docs],
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+        verbose=False,
+    )["offset_mapping"]
+
+
 # =========================
-# STAGE 4: CHUNK LARGE SECTIONS (Optional)
+# STAGE 4: CHUNK LARGE SECTIONS
 # =========================
-def chunk_large_sections(docs: List[Document], max_size: int = 2000) -> List[Document]:
+def chunk_large_sections(
+    docs: List[Document],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    tokenizer=None,
+) -> List[Chunk]:
     """
-    Only chunk sections that are TOO large.
-    Most ISO sections should fit within reasonable size.
+    Split sections that do not fit the embedding model into token-sized,
+    overlapping spans; sections that fit are kept as-is.
+
+    Sizes are counted with the embedding model's own tokenizer, so no chunk
+    loses its tail to the model's truncation. Chunks end at the best
+    paragraph / line / sentence / word break in the second half of a window.
     """
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1200,  # Larger than your 800
-        chunk_overlap=300,
-        separators=["\n\n", "\n", ". ", " ", ""],
-        length_function=len,
-    )
-    
-    final_docs = []
-    
-    for doc in docs:
-        # If section is reasonably sized, keep as-is
-        if len(doc.page_content) <= max_size:
+    if not docs:
+        return []
+
+    tokenizer = tokenizer or get_chunk_tokenizer()
+    budget = max_tokens - tokenizer.num_special_tokens_to_add()
+
+    offsets = _token_offsets(docs, tokenizer)
+
+    final_docs: List[Chunk] = []
+
+    for section_index, (doc, token_offsets) in enumerate(zip(docs, offsets)):
+        # If the section fits, keep it as-is
+        if len(token_offsets) <= budget:
             final_docs.append(doc)
-        else:
-            # Split large sections
-            chunks = splitter.split_documents([doc])
-            for i, chunk in enumerate(chunks):
-                # Preserve original metadata and add chunk info
-                chunk.metadata.update({
-                    "chunk_type": "split_from_large_section",
-                    "chunk_index": i,
-                    "total_chunks": len(chunks),
-                })
-                final_docs.append(chunk)
-    
+            continue
+
+        windows = token_windows(doc.page_content, token_offsets, budget, overlap_tokens)
+        for i, (start, end) in enumerate(windows):
+            final_docs.append(SectionSpan(doc, start, end, {
+                "chunk_type": "split_from_large_section",
+                "chunk_index": i,
+                "total_chunks": len(windows),
+                "section_index": section_index,
+                "char_start": start,
+                "char_end": end,
+            }))
+
     return final_docs
 
 
+# =========================
+# STAGE 4 (PARENT-CHILD): PARENTS + SMALL CHILDREN
+# =========================
+def parent_child_chunks(
+    docs: List[Document],
+    parent_tokens: int = PARENT_MAX_TOKENS,
+    child_tokens: int = CHILD_MAX_TOKENS,
+    child_overlap: int = CHILD_OVERLAP_TOKENS,
+    tokenizer=None,
+) -> List[SectionSpan]:
+    """
+    Child spans of every section, each linked to its parent span.
+
+    A parent is the whole section, or (for sections longer than
+    `parent_tokens`) one of its non-overlapping windows. Every parent is
+    cut into overlapping children of at most `child_tokens`, which are
+    what gets embedded; the parents are stored once and are what the
+    reranker and the LLM see.
+    """
+    if not docs:
+        return []
+
+    tokenizer = tokenizer or get_chunk_tokenizer()
+    special = tokenizer.num_special_tokens_to_add()
+    offsets = _token_offsets(docs, tokenizer)
+
+    children: List[SectionSpan] = []
+
+    for section_index, (doc, token_offsets) in enumerate(zip(docs, offsets)):
+        text = doc.page_content
+        if not token_offsets:
+            token_offsets = [(0, len(text))]
+
+        for parent_index, (p_first, p_last) in enumerate(
+            token_ranges(text, token_offsets, parent_tokens - special, 0)
+        ):
+            p_offsets = token_offsets[p_first:p_last]
+            parent = SectionSpan(doc, p_offsets[0][0], p_offsets[-1][1], {
+                "section_index": section_index,
+                "parent_index": parent_index,
+                "char_start": p_offsets[0][0],
+                "char_end": p_offsets[-1][1],
+            })
+
+            windows = token_windows(text, p_offsets, child_tokens - special, child_overlap)
+            for i, (start, end) in enumerate(windows):
+                children.append(SectionSpan(doc, start, end, {
+                    "chunk_type": "child",
+                    "chunk_index": i,
+                    "total_chunks": len(windows),
+                    "section_index": section_index,
+                    "parent_index": parent_index,
+                    "char_start": start,
+                    "char_end": end,
+                }, parent=parent))
+
+    return children
+
+
+def parents_of(chunks: Sequence[Chunk]) -> List[SectionSpan]:
+    """Distinct parents of child chunks, in first-seen order."""
+    parents = {}
+    for chunk in chunks:
+        parent = getattr(chunk, "parent", None)
+        if parent is not None:
+            parents.setdefault(id(parent), parent)
+    return list(parents.values())
+
+
+# =========================
+# TOKEN WINDOWS
+# =========================
+def token_windows(
+    text: str,
+    token_offsets: Sequence[Tuple[int, int]],
+    budget: int,
+    overlap: int,
+) -> List[Tuple[int, int]]:
+    """(start, end) character offsets of windows of at most `budget` tokens."""
+    return [
+        (token_offsets[first][0], token_offsets[last - 1][1])
+        for first, last in token_ranges(text, token_offsets, budget, overlap)
+    ]
+
+
+def token_ranges(
+    text: str,
+    token_offsets: Sequence[Tuple[int, int]],
+    budget: int,
+    overlap: int,
+) -> List[Tuple[int, int]]:
+    """[first, last) token index ranges of at most `budget` tokens."""
+    starts = [s for s, _ in token_offsets]
+    n = len(token_offsets)
+    ranges = []
+
+    first = 0
+    while first < n:
+        last = min(first + budget, n)   # exclusive
+        if last < n:
+            last = _break_before(text, starts, first, last) or last
+
+        ranges.append((first, last))
+        if last == n:
+            break
+        # Overlap, but start on a word (not a "##" piece of one), as the end breaks on a separator
+        first = max(last - overlap, first + 1)
+        while first < last and not _starts_word(text, token_offsets, first):
+            first += 1
+
+    return ranges
+
+
+def _starts_word(text: str, token_offsets: Sequence[Tuple[int, int]], i: int) -> bool:
+    start = token_offsets[i][0]
+    if i == 0 or start > token_offsets[i - 1][1]:
+        return True   # whitespace before it
+    return not (text[start - 1].isalnum() and text[start].isalnum())
+
+
+def _break_before(text: str, starts: List[int], first: int, last: int) -> Optional[int]:
+    # Latest separator between the middle of the window and the first token
+    # that does not fit; returns the token index the window should end at
+    lo = starts[first + (last - first) // 2]
+    hi = starts[last]
+    for sep in _SEPARATORS:
+        pos = text.rfind(sep, lo, hi)
+        if pos != -1:
+            return bisect_left(starts, pos + len(sep))
+    return None
@@ -1,66 +1,92 @@
-from typing import List
 import re
+import string
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
 from langchain_core.documents import Document
 
+from core.config import CLEAN_PARALLEL_MIN_CHARS, CLEAN_WORKERS
+
+# Standalone page numbers (1, 2, 3, etc.)
+_PAGE_NUMBER = re.compile(r"\d{1,3}")
+# Hyphenated line breaks: "informa-\ntion" -> "information"
+_HYPHEN_BREAK = re.compile(r"-\n(?=[a-z])")
+_SPACE_RUNS = re.compile(r"[ \t]+")
+_BLANK_LINE_RUNS = re.compile(r"\n{3,}")
+
+# [a-zA-Z0-9] are counted by deleting them from the line's ASCII bytes and
+# comparing lengths (bytes.translate runs in C, no match list is built);
+# non-ASCII characters never match, so dropping them first changes nothing
+_ASCII_ALNUM = (string.ascii_letters + string.digits).encode()
+
+# Documents per task when cleaning across processes
+_CHUNK_SIZE = 256
+
+
+def clean_text(text: str) -> Optional[str]:
+    """Cleaned text of one document, or None when nothing worth keeping is left."""
+    text = (text or "").strip()
+    if not text:
+        return None
+
+    if _PAGE_NUMBER.fullmatch(text):
+        return None
+
+    # GARBAGE FILTER: Remove lines with too many special characters
+    # (Like: --``,,,,,``````,,,,`,,`,`,-,,`,`,`,,`---)
+    clean_lines = []
+    for line in text.split("\n"):
+        line_stripped = line.strip()
+        if not line_stripped:
+            clean_lines.append(line)  # Keep empty lines for structure
+            continue
+
+        total = len(line_stripped)
+        ascii_bytes = line_stripped.encode("ascii", "ignore")
+        alphanumeric = len(ascii_bytes) - len(ascii_bytes.translate(None, _ASCII_ALNUM))
+
+        # Keep lines with at least 30% real content
+        if (alphanumeric / total) >= 0.30:
+            clean_lines.append(line)
+
+    text = "\n".join(clean_lines)
+    text = _HYPHEN_BREAK.sub("", text)
 
-def clean_documents(docs: List[Document]) -> List[Document]:
+    # Normalize whitespace (but preserve paragraph breaks)
+    text = _SPACE_RUNS.sub(" ", text)
+    text = _BLANK_LINE_RUNS.sub("\n\n", text)
+    text = text.strip()
+
+    # Filter very short fragments (but allow meaningful short text)
+    if len(text) < 15:
+        return None
+    return text
+
+
+def _clean_texts(texts: List[str]) -> List[Optional[str]]:
+    return [clean_text(text) for text in texts]
+
+
+def clean_documents(docs: List[Document], workers: int = CLEAN_WORKERS) -> List[Document]:
     """
     Clean documents while preserving meaningful structure.
     Works for any document type (PDFs, Word, etc.)
+
+    With `workers` > 1 and enough text to pay for the process start-up,
+    documents are cleaned in chunks across a process pool; only the texts
+    cross the process boundary and the output order is unchanged.
     """
-    cleaned = []
-    
-    for doc in docs:
-        text = (doc.page_content or "").strip()
-        if not text:
-            continue
-        
-        category = doc.metadata.get("category", "")
-        
-        # Remove standalone page numbers (1, 2, 3, etc.)
-        if re.fullmatch(r"\d{1,3}", text):
-            continue
-        
-        # GARBAGE FILTER: Remove lines with too many special characters
-        # (Like: --``,,,,,``````,,,,`,,`,`,-,,`,`,`,,`---)
-        lines = text.split('\n')
-        clean_lines = []
-        
-        for line in lines:
-            line_stripped = line.strip()
-            if not line_stripped:
-                clean_lines.append(line)  # Keep empty lines for structure
-                continue
-            
-            # Count alphanumeric characters
-            alphanumeric = len(re.findall(r'[a-zA-Z0-9]', line_stripped))
-            total = len(line_stripped)
-            
-            # Keep lines with at least 30% real content
-            if total > 0 and (alphanumeric / total) >= 0.30:
-                clean_lines.append(line)
-        
-        text = '\n'.join(clean_lines)
-        
-        # Fix hyphenated line breaks (from v1 - this is GOOD)
-        # Example: "informa-\ntion" → "information"
-        text = re.sub(r"-\n(?=[a-z])", "", text)
-        
-        # Normalize whitespace (but preserve paragraph breaks)
-        text = re.sub(r"[ \t]+", " ", text)  # Multiple spaces → one space
-        text = re.sub(r"\n{3,}", "\n\n", text)  # Triple+ newlines → double
-        text = text.strip()
-        
-        # Filter very short fragments (but allow meaningful short text)
-        if len(text) < 15:
-            continue
-        
-        if text:
-            cleaned.append(
-                Document(
-                    page_content=text,
-                    metadata=dict(doc.metadata),  # Safe copy (from v1)
-                )
-            )
-    
-    return cleaned
\ No newline at end of file
+    texts = [doc.page_content for doc in docs]
+
+    if workers > 1 and sum(len(t or "") for t in texts) >= CLEAN_PARALLEL_MIN_CHARS:
+        chunks = [texts[i:i + _CHUNK_SIZE] for i in range(0, len(texts), _CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            cleaned_texts = [t for chunk in pool.map(_clean_texts, chunks) for t in chunk]
+    else:
+        cleaned_texts = _clean_texts(texts)
+
+    return [
+        Document(page_content=text, metadata=dict(doc.metadata))  # Safe copy
+        for doc, text in zip(docs, cleaned_texts)
+        if text is not None
+    ]
@@ -0,0 +1,189 @@
+"""
+Near-duplicate chunk elimination (MinHash + LSH).
+
+Boilerplate that survives cleaning (copyright notices, tables of contents,
+repeated headers) yields many near-identical chunks, each costing an
+embedding, an index slot and a reranker slot. Every chunk gets a MinHash
+signature over its word shingles; LSH banding proposes candidates among
+the canonical chunks seen so far, and a candidate whose estimated Jaccard
+similarity reaches the threshold absorbs the new chunk: the duplicate is
+dropped and its source / pages are merged into the canonical's metadata.
+
+Only chunks of one ingestion run are compared: files left unchanged by an
+incremental run are not re-read, so a new file's boilerplate is not
+collapsed into their stored chunks. Files linked by a collapse are
+re-ingested together (see `IngestionManifest.diff`), which keeps merged metadata
+in step with the files it names.
+"""
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from core.config import (
+    DEDUP_BANDS,
+    DEDUP_NUM_PERM,
+    DEDUP_SHINGLE_WORDS,
+    DEDUP_THRESHOLD,
+)
+from core.exception import IndexingError
+from ingestion.chunker import Chunk
+
+# Mersenne prime; shingle hashes are reduced below it so a * h + b fits in uint64
+_PRIME = (1 << 31) - 1
+
+
+@dataclass
+class DedupStats:
+    """How much near-duplicate elimination shrank the chunks to index."""
+
+    chunks_in: int = 0
+    chunks_out: int = 0
+    chars_in: int = 0
+    chars_out: int = 0
+    seconds: float = 0.0
+
+    @property
+    def removed(self) -> int:
+        return self.chunks_in - self.chunks_out
+
+    @property
+    def shrink(self) -> float:
+        """Fraction of chunks (= vectors) that were dropped."""
+        return self.removed / self.chunks_in if self.chunks_in else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "chunks_in": self.chunks_in,
+            "chunks_out": self.chunks_out,
+            "removed": self.removed,
+            "shrink": round(self.shrink, 4),
+            "chars_in": self.chars_in,
+            "chars_out": self.chars_out,
+            "seconds": round(self.seconds, 4),
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"dedup: {self.chunks_in} -> {self.chunks_out} chunks "
+            f"(-{self.shrink:.1%}), {self.chars_in} -> {self.chars_out} chars "
+            f"in {self.seconds:.2f}s"
+        )
+
+
+class NearDuplicateFilter:
+    """
+    Stateful over one ingestion run: chunks passed to `filter` are compared
+    with every canonical chunk kept so far, across calls (files).
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = DEDUP_NUM_PERM,
+        bands: int = DEDUP_BANDS,
+        shingle_words: int = DEDUP_SHINGLE_WORDS,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise IndexingError("DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+        self._signatures: List[np.ndarray] = []
+        self._canonical: List[Tuple[str, Chunk]] = []   # (file key, chunk)
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+
+        # file key -> keys of the files holding canonicals of its dropped chunks
+        self.depends_on: Dict[str, Set[str]] = defaultdict(set)
+        self.stats = DedupStats()
+
+    def signature(self, text: str) -> np.ndarray:
+        words = text.lower().split()
+        k = self.shingle_words
+        shingles = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode()) & _PRIME for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def filter(self, key: str, chunks: List[Chunk]) -> List[Chunk]:
+        """Chunks of file `key` that are not near-duplicates of a kept chunk."""
+        start = time.perf_counter()
+        kept = []
+
+        for chunk in chunks:
+            text = chunk.page_content
+            self.stats.chunks_in += 1
+            self.stats.chars_in += len(text)
+
+            signature = self.signature(text)
+            bands = [
+                (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.num_perm // self.rows)
+            ]
+
+            canonical = self._match(signature, bands)
+            if canonical is not None:
+                canonical_key, canonical_chunk = self._canonical[canonical]
+                _merge_metadata(canonical_chunk, chunk)
+                if canonical_key != key:
+                    self.depends_on[key].add(canonical_key)
+                continue
+
+            index = len(self._canonical)
+            self._signatures.append(signature)
+            self._canonical.append((key, chunk))
+            for band in bands:
+                self._buckets[band].append(index)
+
+            kept.append(chunk)
+            self.stats.chunks_out += 1
+            self.stats.chars_out += len(text)
+
+        self.stats.seconds += time.perf_counter() - start
+        return kept
+
+    def _match(self, signature: np.ndarray, bands) -> Optional[int]:
+        candidates = sorted({i for band in bands for i in self._buckets.get(band, ())})
+        for i in candidates:
+            similarity = np.count_nonzero(self._signatures[i] == signature) / self.num_perm
+            if similarity >= self.threshold:
+                return i
+        return None
+
+
+def dedup_chunks(chunks: List[Chunk]) -> List[Chunk]:
+    """Near-duplicate elimination within one batch of chunks (e.g. one file)."""
+    return NearDuplicateFilter().filter("", chunks)
+
+
+def _merge_metadata(canonical: Chunk, duplicate: Chunk) -> None:
+    meta = canonical.metadata
+    source = meta.get("source")
+    dup_source = duplicate.metadata.get("source")
+
+    sources = list(meta.get("sources") or [source])
+    if dup_source not in sources:
+        sources.append(dup_source)
+    meta["sources"] = sources
+
+    # Page numbers only mean something within the canonical's own file
+    pages = meta.get("pages")
+    dup_pages = duplicate.metadata.get("pages")
+    if dup_source == source and isinstance(pages, list) and isinstance(dup_pages, list):
+        meta["pages"] = sorted(set(pages) | set(dup_pages))
+
+    meta["duplicates"] = meta.get("duplicates", 0) + 1
@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.config import (
+    EMBED_BATCH_SIZE,
+    EMBED_BATCH_TOKENS,
+    EMBED_PROCESSES,
+    EMBEDDING_MODEL,
+)
+from core.exception import IndexingError
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    Ingestion-side encoder built directly on sentence-transformers.
+
+    Compared to handing all chunks to HuggingFaceEmbeddings it:
+    - sorts chunks by *token* length and cuts batches by a padded-token
+      budget, so a 15-char chunk is never padded up to a 2000-char one and
+      short chunks get larger batches
+    - optionally fans batches out over a sentence-transformers
+      multi-process pool (`processes` > 1)
+    - keeps throughput counters (chunks/sec, padding efficiency)
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        batch_size: int = EMBED_BATCH_SIZE,
+        batch_tokens: int = EMBED_BATCH_TOKENS,
+        processes: int = EMBED_PROCESSES,
+        bucket_by_length: bool = True,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.processes = processes
+        self.bucket_by_length = bucket_by_length
+
+        self._model = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+        self.chunks = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    # -----------------------------
+    # Model / pool
+    # -----------------------------
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def _get_pool(self):
+        if self.processes <= 1:
+            return None
+        if self._pool is None:
+            self._pool = self.model.start_multi_process_pool(
+                target_devices=["cpu"] * self.processes
+            )
+        return self._pool
+
+    def close(self) -> None:
+        """Stop the worker pool (if one was started)."""
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    # -----------------------------
+    # Batching
+    # -----------------------------
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Token counts after the model's own truncation."""
+        encoded = self.model.tokenizer(
+            texts,
+            add_special_tokens=True,
+            truncation=True,
+            max_length=self.model.max_seq_length,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def plan_batches(self, lengths: List[int]) -> List[List[int]]:
+        """
+        Group text indices into batches.
+
+        Indices are visited longest-first; a batch is closed when it reaches
+        `batch_size` texts or when padding it to its longest member would
+        exceed `batch_tokens`.
+        """
+        if self.bucket_by_length:
+            order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+        else:
+            order = list(range(len(lengths)))
+
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        longest = 0
+
+        for i in order:
+            longest_if_added = max(longest, lengths[i])
+            if batch and (
+                len(batch) >= self.batch_size
+                or longest_if_added * (len(batch) + 1) > self.batch_tokens
+            ):
+                batches.append(batch)
+                batch, longest_if_added = [], lengths[i]
+            batch.append(i)
+            longest = longest_if_added
+
+        if batch:
+            batches.append(batch)
+        return batches
+
+    # -----------------------------
+    # Embeddings interface
+    # -----------------------------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        try:
+            lengths = self.token_lengths(texts)
+            batches = self.plan_batches(lengths)
+            vectors = self._encode_batches(texts, batches)
+        except Exception as e:
+            raise IndexingError(f"Embedding failed: {e}") from e
+        elapsed = time.perf_counter() - start
+
+        self.chunks += len(texts)
+        self.batches += len(batches)
+        self.seconds += elapsed
+        self.real_tokens += sum(lengths)
+        self.padded_tokens += sum(len(b) * max(lengths[i] for i in b) for b in batches)
+
+        logger.info(
+            "Embedded %d chunks in %d batches, %.2fs (%.1f chunks/s)",
+            len(texts), len(batches), elapsed, len(texts) / elapsed if elapsed else 0.0,
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.encode(
+            [text], normalize_embeddings=True, convert_to_numpy=True
+        )[0].tolist()
+
+    def _encode_batches(self, texts: List[str], batches: List[List[int]]) -> np.ndarray:
+        out: Optional[np.ndarray] = None
+        pool = self._get_pool()
+
+        if pool is not None:
+            # Hand the pool one length-sorted sequence; each worker encodes
+            # a contiguous (hence similar-length) slice of it.
+            order = [i for batch in batches for i in batch]
+            encoded = self.model.encode_multi_process(
+                [texts[i] for i in order],
+                pool,
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+            )
+            out = np.empty_like(encoded)
+            out[order] = encoded
+            return out
+
+        for batch in batches:
+            encoded = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+            if out is None:
+                out = np.empty((len(texts), encoded.shape[1]), dtype=encoded.dtype)
+            out[batch] = encoded
+
+        return out
+
+    # -----------------------------
+    # Reporting
+    # -----------------------------
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "chunks": self.chunks,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 4),
+            "chunks_per_second": round(self.chunks / self.seconds, 2) if self.seconds else 0.0,
+            "padding_efficiency": round(self.real_tokens / self.padded_tokens, 4) if self.padded_tokens else 1.0,
+            "processes": max(1, self.processes),
+        }
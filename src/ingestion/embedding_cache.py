@@ -0,0 +1,254 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.config import (
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_BYTES,
+    EMBEDDING_MODEL,
+)
+from core.exception import IndexingError
+
+_WHITESPACE = re.compile(r"\s+")
+_GROW_ROWS = 4096
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form used for cache keys.
+    Whitespace runs are collapsed since the tokenizer ignores them anyway.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(model_name: str, text: str) -> str:
+    return hashlib.sha1(f"{model_name}\0{normalize_text(text)}".encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache for one embedding model.
+
+    Layout (under `<root>/<model slug>/`):
+    - vectors.f32  : float32 rows, memory-mapped, grown on demand
+    - index.sqlite : key -> (slot, last_used) plus the vector dimension
+
+    Keys are hashes of (model name, normalized chunk text), so vectors are
+    reused across re-ingestion, re-chunking and index-type rebuilds.
+    Once `max_bytes` worth of rows is in use, the least recently used slots
+    are overwritten.
+    """
+
+    def __init__(
+        self,
+        root: str = EMBEDDING_CACHE_DIR,
+        model_name: str = EMBEDDING_MODEL,
+        max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+    ):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.dir = Path(root) / re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.dir / "index.sqlite"), check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                last_used INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+            """
+        )
+
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self._vectors: Optional[np.memmap] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    # -----------------------------
+    # Storage
+    # -----------------------------
+    @property
+    def capacity(self) -> int:
+        """Maximum number of rows allowed by `max_bytes`."""
+        if self.dim is None:
+            return 0
+        return max(1, self.max_bytes // (self.dim * 4))
+
+    def _rows(self) -> int:
+        path = self.dir / "vectors.f32"
+        if self.dim is None or not path.exists():
+            return 0
+        return path.stat().st_size // (self.dim * 4)
+
+    def _open(self, min_rows: int = 0) -> Optional[np.memmap]:
+        path = self.dir / "vectors.f32"
+        rows = self._rows()
+
+        if min_rows > rows:
+            rows = min(self.capacity, max(min_rows, rows + _GROW_ROWS))
+            with open(path, "ab") as f:
+                f.truncate(rows * self.dim * 4)
+            self._vectors = None
+
+        if rows == 0:
+            return None
+        if self._vectors is None or self._vectors.shape[0] != rows:
+            self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        return self._vectors
+
+    # -----------------------------
+    # Lookup / insert
+    # -----------------------------
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if not keys or self.dim is None:
+            self.misses += len(keys)
+            return {}
+
+        with self._lock:
+            slots = self._lookup_slots(keys)
+            vectors = self._open()
+            found = {key: np.array(vectors[slot]) for key, slot in slots.items()} if slots else {}
+
+            now = time.time_ns()
+            self._db.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self._db.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(len(next(iter(items.values()))))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)",
+                    (str(self.dim),),
+                )
+
+            # Never store more than fits; keep the newest
+            keys = list(items)[-self.capacity:]
+            existing = self._lookup_slots(keys)
+            new_keys = [k for k in keys if k not in existing]
+
+            used = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            free = max(0, self.capacity - used)
+
+            slots = dict(existing)
+            next_slot = self._db.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM entries").fetchone()[0]
+
+            fresh = new_keys[:free]
+            for key in fresh:
+                slots[key] = next_slot
+                next_slot += 1
+
+            # Evict least recently used entries for the rest
+            # (never one that is part of this batch)
+            overflow = new_keys[free:]
+            if overflow:
+                candidates = self._db.execute(
+                    "SELECT key, slot FROM entries ORDER BY last_used ASC LIMIT ?",
+                    (len(overflow) + len(existing),),
+                ).fetchall()
+                victims = [(k, slot) for k, slot in candidates if k not in existing]
+                victims = victims[:len(overflow)]
+                self._db.executemany(
+                    "DELETE FROM entries WHERE key = ?", [(k,) for k, _ in victims]
+                )
+                for key, (_, slot) in zip(overflow, victims):
+                    slots[key] = slot
+
+            vectors = self._open(min_rows=max(slots.values()) + 1)
+            if vectors is None or vectors.shape[0] <= max(slots.values()):
+                raise IndexingError("Embedding cache file could not be grown")
+
+            for key, slot in slots.items():
+                vectors[slot] = np.asarray(items[key], dtype=np.float32)
+            vectors.flush()
+
+            now = time.time_ns()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                [(key, slot, now) for key, slot in slots.items()],
+            )
+            self._db.commit()
+
+    def _lookup_slots(self, keys: List[str]) -> Dict[str, int]:
+        slots: Dict[str, int] = {}
+        # stay below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            marks = ",".join("?" * len(part))
+            slots.update(
+                self._db.execute(
+                    f"SELECT key, slot FROM entries WHERE key IN ({marks})", part
+                ).fetchall()
+            )
+        return slots
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document vectors from an `EmbeddingCache`
+    and only runs the underlying model on cache misses.
+    Query embeddings are passed straight through.
+    """
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(self.cache.model_name, t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            computed = self.base.embed_documents(list(missing.values()))
+            new = {
+                key: np.asarray(vec, dtype=np.float32)
+                for key, vec in zip(missing, computed)
+            }
+            self.cache.put_many(new)
+            found.update(new)
+
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
@@ -1,31 +1,281 @@
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from core.config import EMBEDDING_MODEL, VECTOR_DB_PATH
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import faiss
+import numpy as np
+
+from core.config import (
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_MODEL,
+    FAISS_INDEX_FACTORY,
+    METADATA_FILTER_FIELDS,
+    VECTOR_DB_PATH,
+    VECTOR_DB_SHARDS_DIR,
+    VECTOR_DB_VERSION_FILE,
+)
+from core.exception import IndexingError
+from ingestion.ann_index import (
+    EXACT_INDEX_FILE,
+    build_ann_index,
+    exact_vectors,
+    is_flat,
+    new_exact_index,
+    write_ann_index,
+)
+from ingestion.bm25_index import BM25Index, indexed_text
+from ingestion.chunk_store import CHUNK_STORE_FILE, ChunkStore
+from ingestion.chunker import parents_of
+from ingestion.embedder import EmbeddingEngine
+from ingestion.embedding_cache import CachedEmbeddings, EmbeddingCache
+from ingestion.metadata_index import MetadataIndex
+
+# Pickled LangChain docstore written by earlier versions
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+# Chunk store being edited by the current ingestion run; published
+# (renamed over chunks.sqlite) by save_vectorstore
+_WORK_STORE_FILE = f".{CHUNK_STORE_FILE}.work"
+
+# Corpus ids become directory names
+_SHARD_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+_engine = None
+_embeddings = None
+
+
+@dataclass
+class VectorStore:
+    """
+    What one ingestion run edits: the exact vector index and the chunk
+    store, both keyed by the same integer row ids.
+    """
+
+    index: faiss.IndexIDMap2
+    chunks: ChunkStore
+    root: str = VECTOR_DB_PATH
+
+
+def get_embedding_engine() -> EmbeddingEngine:
+    global _engine
+
+    if _engine is None:
+        _engine = EmbeddingEngine(model_name=EMBEDDING_MODEL)
+
+    return _engine
+
+
+def get_embeddings():
+    global _embeddings
 
+    if _embeddings is None:
+        _embeddings = get_embedding_engine()
+        if EMBEDDING_CACHE_ENABLED:
+            _embeddings = CachedEmbeddings(_embeddings, EmbeddingCache())
 
-def create_vectorstore(chunks):
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL,
-        encode_kwargs={"normalize_embeddings": True}
+    return _embeddings
+
+
+# =========================
+# SHARDS
+# =========================
+def shard_path(corpus_id: str, root: str = VECTOR_DB_PATH) -> str:
+    """
+    Directory of one corpus' shard. Every shard is a complete index
+    (vectors, chunk store, BM25, metadata, manifest, VERSION stamp).
+    """
+    if not _SHARD_NAME.match(corpus_id):
+        raise IndexingError(f"Corpus id '{corpus_id}' can't be used as a shard name")
+    return str(Path(root) / VECTOR_DB_SHARDS_DIR / corpus_id)
+
+
+def list_shards(root: str = VECTOR_DB_PATH) -> List[str]:
+    """Corpus ids that have a published shard, sorted."""
+    shards = Path(root) / VECTOR_DB_SHARDS_DIR
+    if not shards.is_dir():
+        return []
+    return sorted(
+        path.name for path in shards.iterdir()
+        if (path / VECTOR_DB_VERSION_FILE).exists()
     )
 
-    vectorstore = FAISS.from_documents(chunks, embeddings)
-    vectorstore.save_local(VECTOR_DB_PATH)
+
+# =========================
+# BUILD / UPDATE
+# =========================
+def create_vectorstore(chunks, ids: List[str], root: str = VECTOR_DB_PATH) -> VectorStore:
+    vectorstore = append_to_vectorstore(None, chunks, ids, root)
+    save_vectorstore(vectorstore)
 
     return vectorstore
 
-import shutil
-from pathlib import Path
 
-VECTORSTORE_DIR = Path("vectorstore")
+def append_to_vectorstore(
+    vectorstore: Optional[VectorStore],
+    chunks,
+    ids: List[str],
+    root: str = VECTOR_DB_PATH,
+) -> VectorStore:
+    """
+    Embed and add one batch of chunks, creating the store (under `root`)
+    on the first batch.
+    The parents of child chunks are stored alongside (text only, not embedded).
+    Nothing is published until `save_vectorstore`.
+    """
+    vectors = np.asarray(
+        get_embeddings().embed_documents([c.page_content for c in chunks]),
+        dtype=np.float32,
+    )
+
+    if vectorstore is None:
+        vectorstore = VectorStore(
+            index=new_exact_index(vectors.shape[1]),
+            chunks=ChunkStore.create(str(Path(root) / _WORK_STORE_FILE)),
+            root=root,
+        )
 
+    row_ids = vectorstore.chunks.add(ids, chunks)
+    parents = parents_of(chunks)
+    if parents:
+        vectorstore.chunks.add_parents([p.metadata["parent_id"] for p in parents], parents)
+    vectorstore.index.add_with_ids(vectors, row_ids)
+    return vectorstore
+
+
+def delete_from_vectorstore(vectorstore: VectorStore, ids: List[str]) -> None:
+    """Drop the given chunk IDs, ignoring ones that are not stored."""
+    row_ids = vectorstore.chunks.row_ids(ids)
+
+    if row_ids:
+        vectorstore.index.remove_ids(np.asarray(row_ids, dtype=np.int64))
+        vectorstore.chunks.delete(row_ids)
+
+
+def save_vectorstore(vectorstore: VectorStore) -> None:
+    """
+    Publish the store and close it.
+
+    Every file is written aside and renamed into place, so query processes
+    (which may have the old files mapped / open) never see a partial file.
+    index.faiss stays exact (it is what incremental updates edit); queries
+    are served from the compressed / approximate index built from it.
+    """
+    path = Path(vectorstore.root)
+    path.mkdir(parents=True, exist_ok=True)
+
+    _write_index(vectorstore.index, path / EXACT_INDEX_FILE)
+
+    ann = None
+    if not is_flat(FAISS_INDEX_FACTORY):
+        vectors, row_ids = exact_vectors(vectorstore.index)
+        ann = build_ann_index(vectors, FAISS_INDEX_FACTORY, ids=row_ids)
+    write_ann_index(ann, vectorstore.root)
+
+    build_lexical_index(vectorstore).save(vectorstore.root)
+    build_metadata_index(vectorstore).save(vectorstore.root)
+
+    vectorstore.chunks.commit()
+    vectorstore.chunks.close()
+    os.replace(vectorstore.chunks.path, path / CHUNK_STORE_FILE)
+    (path / LEGACY_DOCSTORE_FILE).unlink(missing_ok=True)
+
+    write_version_stamp(vectorstore.root)
+
+
+def _write_index(index: faiss.Index, path: Path) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    faiss.write_index(index, str(tmp))
+    os.replace(tmp, path)
+
+
+def build_lexical_index(vectorstore: VectorStore) -> BM25Index:
+    """
+    BM25 postings over everything in the store, keyed by row id.
+    Rebuilt on every save: tokenizing is cheap next to embedding, and it
+    keeps the lexical side exact under incremental deletes.
+    """
+    return BM25Index.build(
+        (row_id, indexed_text(doc))
+        for row_id, doc in vectorstore.chunks.iter_documents()
+    )
+
+
+def build_metadata_index(vectorstore: VectorStore) -> MetadataIndex:
+    """Filterable metadata value -> row ids, rebuilt on every save like BM25."""
+    return MetadataIndex.build(
+        vectorstore.chunks.iter_fields(METADATA_FILTER_FIELDS), METADATA_FILTER_FIELDS
+    )
+
+
+def is_legacy_vectorstore(root: str = VECTOR_DB_PATH) -> bool:
+    """Index written with the pickled docstore layout (needs a rebuild)."""
+    path = Path(root)
+    return (path / LEGACY_DOCSTORE_FILE).exists() and not (path / CHUNK_STORE_FILE).exists()
+
+
+def load_vectorstore(root: str = VECTOR_DB_PATH) -> Optional[VectorStore]:
+    """Editable copy of the published store (None if nothing is published)."""
+    path = Path(root)
+    if not (path / EXACT_INDEX_FILE).exists() or not (path / CHUNK_STORE_FILE).exists():
+        return None
+
+    return VectorStore(
+        index=faiss.read_index(str(path / EXACT_INDEX_FILE)),
+        chunks=ChunkStore.copy_of(
+            str(path / CHUNK_STORE_FILE), str(path / _WORK_STORE_FILE)
+        ),
+        root=root,
+    )
+
+
+def update_vectorstore(
+    chunks,
+    ids: List[str],
+    delete_ids: Optional[List[str]] = None,
+    root: str = VECTOR_DB_PATH,
+) -> Optional[VectorStore]:
+    """
+    Apply an incremental change to the index persisted under `root`:
+    drop `delete_ids`, then append `chunks` under `ids`.
+    """
+    vectorstore = load_vectorstore(root)
+    if vectorstore is None:
+        if not chunks:
+            return None
+        return create_vectorstore(chunks, ids=ids, root=root)
+
+    # Re-adding an ID that is already stored (e.g. after an interrupted run)
+    # would duplicate it, so it is dropped together with the stale ones.
+    delete_from_vectorstore(vectorstore, (delete_ids or []) + ids)
+    if chunks:
+        append_to_vectorstore(vectorstore, chunks, ids)
+
+    save_vectorstore(vectorstore)
+
+    return vectorstore
+
+
+def write_version_stamp(root: str = VECTOR_DB_PATH) -> str:
+    """
+    Publish a new index version.
+    Written last (and atomically) so readers only ever see a complete index.
+    """
+    path = Path(root)
+    version = str(time.time_ns())
+
+    tmp = path / f".{VECTOR_DB_VERSION_FILE}.tmp"
+    tmp.write_text(version)
+    os.replace(tmp, path / VECTOR_DB_VERSION_FILE)
+
+    return version
 
-from pathlib import Path
-import shutil
-from core.config import VECTOR_DB_PATH
 
-def reset_vectorstore():
-    path = Path(VECTOR_DB_PATH)
+def reset_vectorstore(root: str = VECTOR_DB_PATH):
+    path = Path(root)
     if path.exists():
         shutil.rmtree(path)
     path.mkdir(parents=True, exist_ok=True)
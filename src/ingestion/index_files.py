@@ -0,0 +1,66 @@
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from core.exception import RetrievalError
+
+# Stamped into both files of a pair, so a reader can tell they belong together
+_BUILD_KEY = "build"
+
+
+def save_pair(
+    root: str,
+    arrays_file: str,
+    meta_file: str,
+    arrays: Dict[str, np.ndarray],
+    meta: dict,
+) -> None:
+    """
+    Write an (arrays .npz, metadata .json) pair. Each file is written aside
+    and renamed into place, so readers never see a partial file.
+    """
+    root = Path(root)
+    build = uuid.uuid4().hex
+
+    tmp = root / f".{arrays_file}.tmp"
+    with open(tmp, "wb") as f:   # a file object: np.savez won't append ".npz"
+        np.savez(f, **arrays, **{_BUILD_KEY: np.array(build)})
+    os.replace(tmp, root / arrays_file)
+
+    tmp = root / f".{meta_file}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({**meta, _BUILD_KEY: build}, f)
+    os.replace(tmp, root / meta_file)
+
+
+def load_pair(
+    root: str, arrays_file: str, meta_file: str
+) -> Optional[Tuple[Dict[str, np.ndarray], dict]]:
+    """
+    (arrays, metadata) written by `save_pair`, or None when absent.
+
+    Raises RetrievalError when the two files come from different saves
+    (read while ingestion was replacing them); the caller retries after
+    the new version is stamped.
+    """
+    root = Path(root)
+    if not (root / arrays_file).exists():
+        return None
+
+    with np.load(root / arrays_file) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+    with open(root / meta_file) as f:
+        meta = json.load(f)
+
+    # Files written before build stamps carry none
+    build = arrays.pop(_BUILD_KEY, None)
+    if build is not None and str(build) != meta.get(_BUILD_KEY):
+        raise RetrievalError(
+            f"{arrays_file} and {meta_file} under '{root}' are from different "
+            "index builds (being replaced); retry"
+        )
+    return arrays, meta
@@ -1,31 +1,77 @@
-from typing import List
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
 
+from core.config import (
+    DEDUP_ENABLED,
+    LOADER_WORKERS,
+    RERANK_PRETOKENIZE,
+    STREAM_BATCH_SIZE,
+    STREAM_QUEUE_SIZE,
+)
 from core.constants import DocumentType
-from core.exception import PipelineError
+from core.exception import DocumentLoadError, PipelineError
 from core.schema import Document, Chunk
 
-from ingestion.loader.registry import LOADER_REGISTRY
+from ingestion.loader.registry import CORPUS_IDS, LOADER_REGISTRY
+from ingestion.loader.parallel import FileLoader, iter_load_files, load_files
 from ingestion.cleaner import clean_documents
-from ingestion.chunker import chunk_large_sections
+from ingestion.chunker import chunk_documents, parents_of
+from ingestion.dedup import NearDuplicateFilter, dedup_chunks
 from ingestion.index import (
+    append_to_vectorstore,
     create_vectorstore,
+    delete_from_vectorstore,
+    is_legacy_vectorstore,
+    load_vectorstore,
     reset_vectorstore,
+    save_vectorstore,
+    shard_path,
+    update_vectorstore,
+)
+from ingestion.manifest import (
+    IngestionManifest,
+    ManifestDiff,
+    file_sha256,
+    make_chunk_ids,
+    make_parent_ids,
 )
+from ingestion.rerank_tokens import attach_passage_tokens
+from ingestion.streaming import StageStats, bounded, map_stage, source_stage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _IngestionPlan:
+    files: Dict[str, Path]
+    file_hashes: Dict[str, str]
+    manifest: IngestionManifest
+    diff: ManifestDiff
+    reset_index: bool
+    root: str               # shard of the document type's corpus
 
 
 def run_ingestion(
     upload_dir: str,
     document_type: DocumentType,
-    reset_index: bool = True,
+    reset_index: bool = False,
 ) -> List[Chunk]:
     """
     Orchestrates the full ingestion pipeline.
 
     Responsibilities:
-    - Select loader based on explicit document type
-    - Run cleaning, chunking, and indexing
+    - Select loader and index shard based on explicit document type
+    - Diff the upload dir against the shard's ingestion manifest
+    - Run cleaning, chunking, and indexing for added/changed files only
     - Stay completely ignorant of document semantics (ISO/general/etc.)
 
+    Each corpus has its own shard, so ingesting one corpus never touches
+    the vectors of the others.
+
     Parameters
     ----------
     upload_dir : str
@@ -33,64 +79,357 @@ def run_ingestion(
     document_type : DocumentType
         Explicit user-selected document type
     reset_index : bool
-        Whether to reset the vectorstore before ingestion
+        Whether to wipe the corpus' shard and rebuild it from scratch.
+        When False, only files whose content hash changed are re-ingested
+        and vectors of removed/changed files are dropped.
 
     Returns
     -------
     List[Chunk]
-        Final chunks that were indexed
+        Chunks that were (re)indexed in this run
     """
 
     # -----------------------------
     # 1. Resolve loader (NO branching logic here)
     # -----------------------------
-    try:
-        loader_func = LOADER_REGISTRY[document_type]
-    except KeyError:
-        raise PipelineError(f"Unsupported document type: {document_type}")
+    file_loader = _resolve_loader(document_type)
 
     # -----------------------------
-    # 2. Reset vectorstore (optional)
+    # 2. Diff upload dir against the manifest
     # -----------------------------
-    if reset_index:
-        reset_vectorstore()
+    plan = _plan_ingestion(upload_dir, document_type, reset_index)
+    files, file_hashes, manifest, diff = (
+        plan.files, plan.file_hashes, plan.manifest, plan.diff
+    )
+    if diff.is_noop:
+        return []
 
     # -----------------------------
     # 3. Load documents (strategy injected)
     # -----------------------------
+    load_errors: List[DocumentLoadError] = []
     try:
-        documents: List[Document] = loader_func(upload_dir)
+        documents: List[Document] = load_files(
+            file_loader,
+            [str(files[key]) for key in diff.pending],
+            workers=LOADER_WORKERS,
+            errors=load_errors,
+        )
     except Exception as e:
         raise PipelineError(f"Document loading failed: {e}") from e
 
-    if not documents:
-        raise PipelineError("Loader returned zero documents")
+    for error in load_errors:
+        logger.warning("%s", error)
+
+    failed = {error.source for error in load_errors}
+    if diff.pending and len(failed) == len(diff.pending) and not diff.removed:
+        raise PipelineError(
+            "Document loading failed: " + "; ".join(str(e) for e in load_errors)
+        )
+
+    # A file that failed to load keeps its previous vectors (if any)
+    # and stays out of the manifest update, so the next run retries it.
+    loaded = [key for key in diff.pending if str(files[key]) not in failed]
+    stale_ids = manifest.chunk_ids(
+        [key for key in diff.changed if key in loaded] + diff.removed
+    )
+
+    documents_by_source: Dict[str, List[Document]] = defaultdict(list)
+    for doc in documents:
+        documents_by_source[doc.metadata.get("source")].append(doc)
+
+    chunks: List[Chunk] = []
+    chunk_ids: List[str] = []
+    dedup = NearDuplicateFilter() if DEDUP_ENABLED else None
+
+    for key in loaded:
+        # -----------------------------
+        # 4. Clean documents
+        # -----------------------------
+        try:
+            cleaned_documents = clean_documents(documents_by_source[str(files[key])])
+        except Exception as e:
+            raise PipelineError(f"Document cleaning failed for {key}: {e}") from e
+
+        # -----------------------------
+        # 5. Chunk documents
+        # -----------------------------
+        try:
+            file_chunks: List[Chunk] = chunk_documents(cleaned_documents)
+        except Exception as e:
+            raise PipelineError(f"Document chunking failed for {key}: {e}") from e
+
+        # -----------------------------
+        # 5b. Collapse near-duplicates (against every file of this run)
+        # -----------------------------
+        depends_on = ()
+        if dedup is not None:
+            file_chunks = dedup.filter(key, file_chunks)
+            depends_on = dedup.depends_on.get(key, ())
+
+        chunk_ids.extend(_prepare_chunks(plan, key, file_chunks, document_type, depends_on))
+        chunks.extend(file_chunks)
+
+    if dedup is not None:
+        logger.info("%s", dedup.stats)
+
+    if not chunks and not diff.removed:
+        raise PipelineError("Chunker produced zero chunks")
 
     # -----------------------------
-    # 4. Clean documents
+    # 6. Index chunks (reset first if requested)
     # -----------------------------
     try:
-        cleaned_documents = clean_documents(documents)
+        if plan.reset_index:
+            reset_vectorstore(plan.root)
+            create_vectorstore(chunks, ids=chunk_ids, root=plan.root)
+        else:
+            update_vectorstore(chunks, ids=chunk_ids, delete_ids=stale_ids, root=plan.root)
     except Exception as e:
-        raise PipelineError(f"Document cleaning failed: {e}") from e
+        raise PipelineError(f"Vectorstore creation failed: {e}") from e
+
+    for key in diff.removed:
+        manifest.forget(key)
+    manifest.save(plan.root)
+
+    return chunks
+
+
+def run_streaming_ingestion(
+    upload_dir: str,
+    document_type: DocumentType,
+    reset_index: bool = False,
+    batch_size: int = STREAM_BATCH_SIZE,
+    queue_size: int = STREAM_QUEUE_SIZE,
+) -> Dict[str, StageStats]:
+    """
+    Bounded-memory variant of `run_ingestion`.
+
+    Files flow through loader -> clean -> chunk -> dedup -> embed/index one
+    file at a time, with at most `queue_size` batches buffered between stages and at
+    most `batch_size` chunks embedded at once. Only the FAISS index itself
+    grows with the corpus; documents and chunks are released once indexed.
+
+    Parameters
+    ----------
+    upload_dir : str
+        Directory containing uploaded documents
+    document_type : DocumentType
+        Explicit user-selected document type
+    reset_index : bool
+        Rebuild the corpus' shard from scratch instead of applying the manifest diff
+    batch_size : int
+        Chunks per embedding/indexing batch
+    queue_size : int
+        Batches buffered between the loader, chunking and indexing threads
+
+    Returns
+    -------
+    Dict[str, StageStats]
+        Per-stage throughput (load, clean, chunk, dedup, index)
+
+    Near-duplicates are only collapsed within each file here: a canonical
+    chunk of an earlier file may already be indexed when a duplicate shows up.
+    """
+    file_loader = _resolve_loader(document_type)
+
+    plan = _plan_ingestion(upload_dir, document_type, reset_index)
+    files, manifest, diff = plan.files, plan.manifest, plan.diff
+    if diff.is_noop:
+        return {}
+
+    stats = {name: StageStats(name) for name in ("load", "clean", "chunk", "dedup", "index")}
+    load_errors: List[DocumentLoadError] = []
+
+    # -----------------------------
+    # Stage graph (lazy generators)
+    # -----------------------------
+    keys_by_path = {files[key]: key for key in diff.pending}
+    loaded = source_stage(
+        _successful_loads(
+            iter_load_files(
+                file_loader,
+                [files[key] for key in diff.pending],
+                workers=LOADER_WORKERS,
+            ),
+            keys_by_path,
+            load_errors,
+        ),
+        stats["load"],
+    )
+    cleaned = map_stage(clean_documents, bounded(loaded, queue_size), stats["clean"])
+    chunked = map_stage(chunk_documents, cleaned, stats["chunk"])
+    if DEDUP_ENABLED:
+        chunked = map_stage(dedup_chunks, chunked, stats["dedup"])
 
     # -----------------------------
-    # 5. Chunk documents
+    # Sink: embed + index in batches
     # -----------------------------
+    vectorstore = None if plan.reset_index else load_vectorstore(plan.root)
+    if vectorstore is not None:
+        delete_from_vectorstore(vectorstore, manifest.chunk_ids(diff.removed))
+
+    batch: List[Chunk] = []
+    batch_ids: List[str] = []
+    pending_deletes: List[str] = []
+
+    def flush():
+        nonlocal vectorstore, batch, batch_ids, pending_deletes
+        start = time.perf_counter()
+        if vectorstore is not None and pending_deletes:
+            delete_from_vectorstore(vectorstore, pending_deletes)
+        if batch:
+            vectorstore = append_to_vectorstore(vectorstore, batch, batch_ids, plan.root)
+        stats["index"].seconds += time.perf_counter() - start
+        stats["index"].batches += 1
+        stats["index"].items_in += len(batch)
+        stats["index"].items_out += len(batch)
+        batch, batch_ids, pending_deletes = [], [], []
+
     try:
-        chunks: List[Chunk] = chunk_large_sections(cleaned_documents)
+        for key, file_chunks in bounded(chunked, queue_size):
+            # Old vectors of a changed file (and any leftovers under the new
+            # IDs) go right before its new chunks are added
+            if key in diff.changed:
+                pending_deletes.extend(manifest.chunk_ids([key]))
+            ids = _prepare_chunks(plan, key, file_chunks, document_type)
+            pending_deletes.extend(ids)
+
+            batch.extend(file_chunks)
+            batch_ids.extend(ids)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    except PipelineError:
+        raise
     except Exception as e:
-        raise PipelineError(f"Document chunking failed: {e}") from e
+        raise PipelineError(f"Streaming ingestion failed: {e}") from e
 
-    if not chunks:
+    for error in load_errors:
+        logger.warning("%s", error)
+
+    if vectorstore is None:
+        if load_errors:
+            raise PipelineError(
+                "Document loading failed: " + "; ".join(str(e) for e in load_errors)
+            )
         raise PipelineError("Chunker produced zero chunks")
 
-    # -----------------------------
-    # 6. Index chunks
-    # -----------------------------
     try:
-        create_vectorstore(chunks)
+        # Publishing replaces every index file, so a reset needs no wipe here
+        save_vectorstore(vectorstore)
     except Exception as e:
         raise PipelineError(f"Vectorstore creation failed: {e}") from e
 
-    return chunks
+    for key in diff.removed:
+        manifest.forget(key)
+    manifest.save(plan.root)
+
+    for stage in stats.values():
+        logger.info("%s", stage)
+
+    return stats
+
+
+# =========================
+# HELPERS
+# =========================
+def _resolve_loader(document_type: DocumentType) -> FileLoader:
+    try:
+        return LOADER_REGISTRY[document_type]
+    except KeyError:
+        raise PipelineError(f"Unsupported document type: {document_type}")
+
+
+def _resolve_shard(document_type: DocumentType) -> str:
+    try:
+        return shard_path(CORPUS_IDS[document_type])
+    except KeyError:
+        raise PipelineError(f"Unsupported document type: {document_type}")
+
+
+def _plan_ingestion(
+    upload_dir: str,
+    document_type: DocumentType,
+    reset_index: bool,
+) -> _IngestionPlan:
+    root = _resolve_shard(document_type)
+
+    files = _list_files(upload_dir)
+    if not files:
+        raise PipelineError(f"No files found in {upload_dir}")
+
+    file_hashes = {key: file_sha256(path) for key, path in files.items()}
+
+    manifest = IngestionManifest() if reset_index else IngestionManifest.load(root)
+    if not manifest.is_compatible() or is_legacy_vectorstore(root):
+        # Embedding model changed / pickled docstore layout -> rebuild
+        reset_index = True
+        manifest = IngestionManifest()
+
+    diff = manifest.diff(file_hashes, document_type.value)
+    return _IngestionPlan(files, file_hashes, manifest, diff, reset_index, root)
+
+
+def _prepare_chunks(
+    plan: _IngestionPlan,
+    key: str,
+    file_chunks: List[Chunk],
+    document_type: DocumentType,
+    depends_on: Sequence[str] = (),
+) -> List[str]:
+    """
+    Stamp chunk IDs (and reranker token IDs) on one file's chunks
+    and record them in the manifest.
+
+    Child chunks are never reranked (their parents are), so with
+    parent-child chunking only the parents get parent IDs and token IDs.
+    """
+    ids = make_chunk_ids(key, plan.file_hashes[key], len(file_chunks))
+    for chunk, chunk_id in zip(file_chunks, ids):
+        chunk.metadata["chunk_id"] = chunk_id
+
+    parents = parents_of(file_chunks)
+    parent_ids = make_parent_ids(
+        key,
+        plan.file_hashes[key],
+        [(p.metadata["section_index"], p.metadata["parent_index"]) for p in parents],
+    )
+    for parent, parent_id in zip(parents, parent_ids):
+        parent.metadata["parent_id"] = parent_id
+    for chunk in file_chunks:
+        if getattr(chunk, "parent", None) is not None:
+            chunk.metadata["parent_id"] = chunk.parent.metadata["parent_id"]
+
+    if RERANK_PRETOKENIZE:
+        attach_passage_tokens(parents or file_chunks)
+
+    plan.manifest.record(key, plan.file_hashes[key], document_type.value, ids, depends_on)
+    return ids
+
+
+def _successful_loads(
+    results,
+    keys_by_path: Dict[Path, str],
+    errors: List[DocumentLoadError],
+) -> Iterator[Tuple[str, List[Document]]]:
+    for file, result in results:
+        if isinstance(result, DocumentLoadError):
+            errors.append(result)
+            continue
+        yield keys_by_path[file], result
+
+
+def _list_files(upload_dir: str) -> Dict[str, Path]:
+    """
+    Files the loaders will see, keyed by their path relative to upload_dir.
+    """
+    path = Path(upload_dir)
+    if path.is_file():
+        return {path.name: path}
+
+    return {
+        file.relative_to(path).as_posix(): file
+        for file in sorted(path.glob("*"))
+        if file.is_file()
+    }
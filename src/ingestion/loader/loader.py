@@ -1,80 +1,104 @@
+from functools import partial
 from pathlib import Path
 from typing import List, Optional
 import re
 from langchain_core.documents import Document
-from unstructured.partition.auto import partition
+from core.exception import DocumentLoadError
+from ingestion.loader.parallel import PathInput, load_files
 
 DEFAULT_MIN_CHARS = 400
 DEFAULT_MAX_CHARS = 1200
 
 def load_generic_unstructured(
-    file_path: str,
+    file_path: PathInput,
     *,
     corpus_id: str,
     min_chars: int = DEFAULT_MIN_CHARS,
     max_chars: int = DEFAULT_MAX_CHARS,
+    workers: int = 1,
+    errors: Optional[List[DocumentLoadError]] = None,
 ) -> List[Document]:
     """
     Generic loader for arbitrary unstructured documents.
     Suitable for PDFs, DOCX, TXT, stories, articles, notes.
+
+    `file_path` may be a file, a directory or a list of files.
+    With workers > 1 files are partitioned in a process pool; output order
+    stays the input order. Files that fail are reported through `errors`
+    (or a warning) instead of aborting the batch.
     """
+    load_file = partial(
+        load_generic_file,
+        corpus_id=corpus_id,
+        min_chars=min_chars,
+        max_chars=max_chars,
+    )
+    return load_files(load_file, file_path, workers=workers, errors=errors)
 
-    path = Path(file_path)
-    files = [path] if path.is_file() else list(path.glob("*"))
 
+def load_generic_file(
+    file: Path,
+    *,
+    corpus_id: str,
+    min_chars: int,
+    max_chars: int,
+) -> List[Document]:
+    """
+    Partition a single file into size-bounded documents.
+    Top-level (picklable) so it can run inside a loader process pool.
+    """
     docs: List[Document] = []
 
-    for file in files:
-        if not file.is_file():
-            continue
+    # Heavy import: paid by the first file loaded, not by importing the loader
+    from unstructured.partition.auto import partition
 
-        elements = partition(filename=str(file))
+    elements = partition(filename=str(file))
 
-        buffer = []
-        current_pages = set()
+    buffer = []
+    current_pages = set()
 
-        for el in elements:
-            text = el.text.strip() if el.text else ""
-            if not text:
-                continue
+    for el in elements:
+        text = el.text.strip() if el.text else ""
+        if not text:
+            continue
 
-            category = getattr(el, "category", "")
-            if category in {"Header", "Footer"}:
-                continue
+        category = getattr(el, "category", "")
+        if category in {"Header", "Footer"}:
+            continue
 
-            # Skip standalone page numbers
-            if re.fullmatch(r"\d{1,4}", text):
-                continue
+        # Skip standalone page numbers
+        if re.fullmatch(r"\d{1,4}", text):
+            continue
 
-            page = getattr(el.metadata, "page_number", None)
-            if page is not None:
-                current_pages.add(page)
-            buffer.append(text)
-            current_len = sum(len(x) for x in buffer)
+        page = getattr(el.metadata, "page_number", None)
+        if page is not None:
+            current_pages.add(page)
+        buffer.append(text)
+        current_len = sum(len(x) for x in buffer)
 
-            # Flush when max size reached
-            if current_len >= max_chars:
-                docs.append(
-                    _emit_chunk(
-                        buffer,
-                        file=file,
-                        corpus_id=corpus_id,
-                        pages=current_pages,
-                    )
-                )
-                buffer = []
-                current_pages = set()
-
-        # Final flush (even if small — NO SILENT DROP)
-        if buffer:
+        # Flush when max size reached
+        if current_len >= max_chars:
             docs.append(
-                _emit_chunk(    
+                _emit_chunk(
                     buffer,
                     file=file,
                     corpus_id=corpus_id,
                     pages=current_pages,
                 )
             )
+            buffer = []
+            current_pages = set()
+
+    # Final flush (even if small — NO SILENT DROP)
+    if buffer:
+        docs.append(
+            _emit_chunk(    
+                buffer,
+                file=file,
+                corpus_id=corpus_id,
+                pages=current_pages,
+            )
+        )
     return docs
 
 def _emit_chunk(buffer, *, file: Path, corpus_id: str, pages: set) -> Document:
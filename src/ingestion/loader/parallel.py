@@ -0,0 +1,105 @@
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.documents import Document
+from core.exception import DocumentLoadError
+
+PathInput = Union[str, Path, Sequence[Union[str, Path]]]
+FileLoader = Callable[[Path], List[Document]]
+
+
+def list_input_files(file_path: PathInput) -> List[Path]:
+    """
+    Resolve a file, a directory (non-recursive) or an explicit list of files
+    into the ordered list of files to partition.
+    """
+    if isinstance(file_path, (str, Path)):
+        path = Path(file_path)
+        files = [path] if path.is_file() else sorted(path.glob("*"))
+    else:
+        files = [Path(p) for p in file_path]
+
+    return [f for f in files if f.is_file()]
+
+
+def _load_one(load_file: FileLoader, file: Path) -> Tuple[Optional[List[Document]], Optional[str]]:
+    # Runs inside the worker: exceptions from unstructured are not always
+    # picklable, so only the message crosses the process boundary.
+    try:
+        return load_file(file), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _load_error(file: Path, error: str) -> DocumentLoadError:
+    return DocumentLoadError(f"Failed to load {file}: {error}", source=str(file))
+
+
+def iter_load_files(
+    load_file: FileLoader,
+    files: List[Path],
+    *,
+    workers: int = 1,
+) -> Iterator[Tuple[Path, Union[List[Document], DocumentLoadError]]]:
+    """
+    Apply `load_file` to every file, optionally across a process pool.
+
+    Yields (file, documents) in input order regardless of completion order.
+    A failing file yields (file, DocumentLoadError) instead of aborting
+    the remaining files.
+    """
+    workers = max(1, min(workers, len(files)))
+
+    if workers == 1:
+        for file in files:
+            docs, error = _load_one(load_file, file)
+            yield file, docs if error is None else _load_error(file, error)
+        return
+
+    # Keep only a small window of files in flight so finished results never
+    # pile up in memory faster than the consumer drains them.
+    window = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        remaining = iter(files)
+
+        for file in islice(remaining, window):
+            pending.append((file, pool.submit(_load_one, load_file, file)))
+
+        while pending:
+            file, future = pending.popleft()
+            docs, error = future.result()
+
+            for nxt in islice(remaining, 1):
+                pending.append((nxt, pool.submit(_load_one, load_file, nxt)))
+
+            yield file, docs if error is None else _load_error(file, error)
+
+
+def load_files(
+    load_file: FileLoader,
+    file_path: PathInput,
+    *,
+    workers: int = 1,
+    errors: Optional[List[DocumentLoadError]] = None,
+) -> List[Document]:
+    """
+    Load and flatten documents of all files.
+    Failures are appended to `errors` when given, otherwise emitted as warnings.
+    """
+    docs: List[Document] = []
+
+    for file, result in iter_load_files(load_file, list_input_files(file_path), workers=workers):
+        if isinstance(result, DocumentLoadError):
+            if errors is not None:
+                errors.append(result)
+            else:
+                warnings.warn(str(result))
+            continue
+        docs.extend(result)
+
+    return docs
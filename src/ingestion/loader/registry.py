@@ -1,10 +1,26 @@
 # ingestion/loader/registry.py
+from functools import partial
+
 from core.constants import DocumentType
-from ingestion.loader.loader import load_generic_unstructured
-from ingestion.loader.ISO_loader import load_iso_standard
+from ingestion.loader.loader import (
+    DEFAULT_MAX_CHARS,
+    DEFAULT_MIN_CHARS,
+    load_generic_file,
+)
+from ingestion.loader.ISO_loader import load_iso_file
+
+# Corpus each document type is ingested into; one index shard per corpus
+CORPUS_IDS = {
+    DocumentType.UNSTRUCTURED: "unstructured",
+    DocumentType.GENERAL_STRUCTURED: "general",
+    DocumentType.ISO_STRUCTURED: "ISO27001-2022",
+}
 
+# Per-file loaders: Path -> List[Document].
+# partials (not lambdas) so they can be shipped to a loader process pool;
+# fan-out over files is done by ingestion.loader.parallel.
 LOADER_REGISTRY = {
-    DocumentType.UNSTRUCTURED: lambda path: load_generic_unstructured(path, corpus_id="unstructured"),
-    DocumentType.GENERAL_STRUCTURED: lambda path: load_generic_unstructured(path, corpus_id="general"),
-    DocumentType.ISO_STRUCTURED: lambda path: load_iso_standard(path, standard_id="ISO27001", year="2022", corpus_id="ISO27001-2022"),
+    DocumentType.UNSTRUCTURED: partial(load_generic_file, corpus_id=CORPUS_IDS[DocumentType.UNSTRUCTURED], min_chars=DEFAULT_MIN_CHARS, max_chars=DEFAULT_MAX_CHARS),
+    DocumentType.GENERAL_STRUCTURED: partial(load_generic_file, corpus_id=CORPUS_IDS[DocumentType.GENERAL_STRUCTURED], min_chars=DEFAULT_MIN_CHARS, max_chars=DEFAULT_MAX_CHARS),
+    DocumentType.ISO_STRUCTURED: partial(load_iso_file, doc_uid="ISO27001-2022", corpus_id=CORPUS_IDS[DocumentType.ISO_STRUCTURED]),
 }
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.config import (
+    CHILD_MAX_TOKENS,
+    CHILD_OVERLAP_TOKENS,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    EMBEDDING_MODEL,
+    PARENT_CHILD_RETRIEVAL,
+    PARENT_MAX_TOKENS,
+    VECTOR_DB_PATH,
+    VECTOR_DB_MANIFEST_FILE,
+)
+
+MANIFEST_SCHEMA_VERSION = 1
+_HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def make_chunk_ids(file_key: str, file_hash: str, count: int) -> List[str]:
+    """
+    Deterministic docstore IDs for the chunks of one file version.
+    The file key is mixed in so identical files under two names don't collide.
+    """
+    prefix = _id_prefix(file_key, file_hash)
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+def make_parent_ids(file_key: str, file_hash: str, keys: Sequence[Tuple[int, int]]) -> List[str]:
+    """IDs of the parents of one file version, one per (section, window) key."""
+    prefix = _id_prefix(file_key, file_hash)
+    return [f"{prefix}-p{section}.{window}" for section, window in keys]
+
+
+def _id_prefix(file_key: str, file_hash: str) -> str:
+    return hashlib.sha1(f"{file_key}\0{file_hash}".encode()).hexdigest()[:16]
+
+
+def chunk_layout() -> str:
+    """How chunks are cut under the current config; stored chunks cut differently need a rebuild."""
+    if PARENT_CHILD_RETRIEVAL:
+        return f"parent-child/{PARENT_MAX_TOKENS}/{CHILD_MAX_TOKENS}/{CHILD_OVERLAP_TOKENS}"
+    return f"sections/{CHUNK_MAX_TOKENS}/{CHUNK_OVERLAP_TOKENS}"
+
+
+@dataclass
+class ManifestDiff:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def pending(self) -> List[str]:
+        """Files that must be (re)loaded, chunked and embedded."""
+        return self.added + self.changed
+
+    @property
+    def is_noop(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+class IngestionManifest:
+    """
+    Persisted record of what the vectorstore currently contains.
+
+    Maps each ingested file (keyed by its path relative to the upload dir)
+    to its content hash, document type and the docstore IDs of its chunks.
+    """
+
+    def __init__(
+        self,
+        files: Optional[Dict[str, dict]] = None,
+        embedding_model: str = EMBEDDING_MODEL,
+        layout: Optional[str] = None,
+    ):
+        self.files: Dict[str, dict] = files or {}
+        self.embedding_model = embedding_model
+        self.layout = layout or chunk_layout()
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    @staticmethod
+    def path(root: str = VECTOR_DB_PATH) -> Path:
+        return Path(root) / VECTOR_DB_MANIFEST_FILE
+
+    @classmethod
+    def load(cls, root: str = VECTOR_DB_PATH) -> "IngestionManifest":
+        path = cls.path(root)
+        if not path.exists():
+            return cls()
+
+        with open(path) as f:
+            data = json.load(f)
+
+        if data.get("schema_version") != MANIFEST_SCHEMA_VERSION:
+            return cls()
+
+        return cls(
+            files=data.get("files", {}),
+            embedding_model=data.get("embedding_model"),
+            layout=data.get("chunk_layout", "legacy"),
+        )
+
+    def save(self, root: str = VECTOR_DB_PATH) -> None:
+        path = self.path(root)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "schema_version": MANIFEST_SCHEMA_VERSION,
+                    "embedding_model": self.embedding_model,
+                    "chunk_layout": self.layout,
+                    "files": self.files,
+                },
+                f,
+                indent=2,
+            )
+        os.replace(tmp, path)
+
+    # -----------------------------
+    # Diffing
+    # -----------------------------
+    def is_compatible(self) -> bool:
+        """
+        Vectors embedded with another model, or chunks cut another way,
+        can't be mixed with new ones.
+        """
+        return not self.files or (
+            self.embedding_model == EMBEDDING_MODEL and self.layout == chunk_layout()
+        )
+
+    def diff(self, current: Dict[str, str], document_type: str) -> ManifestDiff:
+        """
+        Compare {file_key: sha256} of the upload dir against the manifest.
+        """
+        result = ManifestDiff()
+
+        for key in sorted(current):
+            entry = self.files.get(key)
+            if entry is None:
+                result.added.append(key)
+            elif (
+                entry.get("sha256") != current[key]
+                or entry.get("document_type") != document_type
+            ):
+                result.changed.append(key)
+            else:
+                result.unchanged.append(key)
+
+        result.removed = sorted(set(self.files) - set(current))
+
+        # Files linked by collapsed near-duplicates are re-ingested together:
+        # - a file whose duplicates were collapsed into chunks of a changed /
+        #   removed file loses them with it
+        # - a file holding canonicals of a changed / removed file's duplicates
+        #   still lists that file in their merged sources / pages
+        invalid = set(result.changed) | set(result.removed)
+        while True:
+            canonical_files = {
+                dep for key in invalid for dep in self.files[key].get("depends_on", ())
+            }
+            dependent = [
+                key for key in result.unchanged
+                if key in canonical_files
+                or invalid.intersection(self.files[key].get("depends_on", ()))
+            ]
+            if not dependent:
+                break
+            for key in dependent:
+                result.unchanged.remove(key)
+                result.changed.append(key)
+                invalid.add(key)
+        result.changed.sort()
+
+        return result
+
+    def chunk_ids(self, keys: List[str]) -> List[str]:
+        ids = []
+        for key in keys:
+            ids.extend(self.files.get(key, {}).get("chunk_ids", []))
+        return ids
+
+    def record(
+        self,
+        key: str,
+        sha256: str,
+        document_type: str,
+        chunk_ids: List[str],
+        depends_on: Sequence[str] = (),
+    ) -> None:
+        """`depends_on`: files holding the canonical chunks of this file's dropped duplicates."""
+        self.files[key] = {
+            "sha256": sha256,
+            "document_type": document_type,
+            "chunk_ids": chunk_ids,
+        }
+        if depends_on:
+            self.files[key]["depends_on"] = sorted(depends_on)
+
+    def forget(self, key: str) -> None:
+        self.files.pop(key, None)
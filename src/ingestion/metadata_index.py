@@ -0,0 +1,208 @@
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import faiss
+import numpy as np
+
+from core.config import METADATA_FILTER_FIELDS
+from core.exception import RetrievalError
+from ingestion.index_files import load_pair, save_pair
+
+METADATA_ARRAYS_FILE = "metadata.npz"
+METADATA_KEYS_FILE = "metadata.json"
+
+# {"corpus_id": "ISO27001-2022"} or {"file_name": ["a.pdf", "b.pdf"]}
+Filters = Mapping[str, Union[str, Sequence[str]]]
+
+# Set bits per byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+class RowSelection:
+    """
+    The row ids a filter admits, as a packed bitmap (bit i of byte i >> 3,
+    little-endian; the layout of faiss.IDSelectorBitmap).
+    """
+
+    def __init__(self, bitmap: np.ndarray):
+        self.bitmap = bitmap
+        self.count = int(_POPCOUNT[bitmap].sum())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def selector(self) -> faiss.IDSelectorBitmap:
+        """
+        FAISS selector over this bitmap. It points into `self.bitmap`, so
+        keep this selection alive for as long as the selector is used.
+        """
+        return faiss.IDSelectorBitmap(len(self.bitmap), faiss.swig_ptr(self.bitmap))
+
+    def contains(self, row_ids: np.ndarray) -> np.ndarray:
+        """Boolean mask: which of `row_ids` the filter admits."""
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        inside = (row_ids >= 0) & (row_ids < len(self.bitmap) * 8)
+        mask = np.zeros(row_ids.shape, dtype=bool)
+        ids = row_ids[inside]
+        mask[inside] = (self.bitmap[ids >> 3] >> (ids & 7)) & 1 == 1
+        return mask
+
+
+class MetadataIndex:
+    """
+    Metadata value -> row ids, for pre-filtered search.
+
+    Postings are stored CSR-style like the BM25 index:
+    - keys[j]   : (field, value) of posting list j
+    - indptr[j] : row_ids[indptr[j]:indptr[j+1]] carry that value
+
+    A filter is turned into a row-id bitmap (one per value, memoized; OR
+    within a field, AND across fields) that FAISS and BM25 apply while
+    searching, so a query scoped to one document never scores the rest
+    of the corpus.
+    """
+
+    def __init__(
+        self,
+        keys: List[Tuple[str, str]],
+        indptr: np.ndarray,
+        row_ids: np.ndarray,
+        id_bound: int,
+    ):
+        self.keys = {key: j for j, key in enumerate(keys)}
+        self.indptr = indptr
+        self.row_ids = row_ids
+        self.id_bound = id_bound
+
+        self._bitmaps: Dict[Tuple[str, str], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Build
+    # -----------------------------
+    @classmethod
+    def build(
+        cls,
+        rows: Iterable[Sequence],
+        fields: Sequence[str] = METADATA_FILTER_FIELDS,
+    ) -> "MetadataIndex":
+        """Build from (row_id, value of fields[0], value of fields[1], ...) rows."""
+        postings: Dict[Tuple[str, str], List[int]] = {}
+        id_bound = 0
+
+        for row_id, *values in rows:
+            id_bound = max(id_bound, row_id + 1)
+            for field, value in zip(fields, values):
+                if value is not None:
+                    postings.setdefault((field, str(value)), []).append(row_id)
+
+        keys = sorted(postings)
+        indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum([len(postings[key]) for key in keys], out=indptr[1:])
+        row_ids = (
+            np.concatenate([np.asarray(postings[key], dtype=np.int64) for key in keys])
+            if keys else np.zeros(0, dtype=np.int64)
+        )
+        return cls(keys, indptr, row_ids, id_bound)
+
+    # -----------------------------
+    # Filtering
+    # -----------------------------
+    def values(self, field: str) -> List[str]:
+        """Distinct stored values of a field (e.g. every corpus_id)."""
+        return sorted(value for f, value in self.keys if f == field)
+
+    def select(self, filters: Filters) -> RowSelection:
+        """
+        Row ids matching every field of `filters` (any of the listed values
+        per field). Values that are not stored simply match nothing.
+        """
+        selected = None
+        for field, values in normalize_filters(filters).items():
+            if field not in METADATA_FILTER_FIELDS:
+                raise RetrievalError(
+                    f"Cannot filter on '{field}'; filterable fields: "
+                    f"{', '.join(METADATA_FILTER_FIELDS)}"
+                )
+            field_bitmap = self._empty_bitmap()
+            for value in values:
+                np.bitwise_or(field_bitmap, self._bitmap(field, value), out=field_bitmap)
+
+            if selected is None:
+                selected = field_bitmap
+            else:
+                np.bitwise_and(selected, field_bitmap, out=selected)
+
+        return RowSelection(selected if selected is not None else ~self._empty_bitmap())
+
+    def _bitmap(self, field: str, value: str) -> np.ndarray:
+        key = (field, value)
+        bitmap = self._bitmaps.get(key)
+        if bitmap is not None:
+            return bitmap
+
+        bitmap = self._empty_bitmap()
+        j = self.keys.get(key)
+        if j is not None:
+            ids = self.row_ids[self.indptr[j]:self.indptr[j + 1]]
+            np.bitwise_or.at(bitmap, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+
+        with self._lock:
+            return self._bitmaps.setdefault(key, bitmap)
+
+    def _empty_bitmap(self) -> np.ndarray:
+        return np.zeros((self.id_bound + 7) // 8, dtype=np.uint8)
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, root: str) -> None:
+        keys = sorted(self.keys, key=self.keys.get)
+        save_pair(
+            root,
+            METADATA_ARRAYS_FILE,
+            METADATA_KEYS_FILE,
+            {"indptr": self.indptr, "row_ids": self.row_ids, "id_bound": np.int64(self.id_bound)},
+            {"keys": keys},
+        )
+
+    @staticmethod
+    def stored_values(root: str, field: str) -> List[str]:
+        """`values(field)` of the index saved under `root`, read without loading it."""
+        path = Path(root) / METADATA_KEYS_FILE
+        if not path.exists():
+            return []
+        with open(path) as f:
+            return sorted(value for key_field, value in json.load(f)["keys"] if key_field == field)
+
+    @classmethod
+    def load(cls, root: str) -> Optional["MetadataIndex"]:
+        loaded = load_pair(root, METADATA_ARRAYS_FILE, METADATA_KEYS_FILE)
+        if loaded is None:
+            return None
+
+        arrays, meta = loaded
+        keys = [tuple(key) for key in meta["keys"]]
+        return cls(keys, arrays["indptr"], arrays["row_ids"], int(arrays["id_bound"]))
+
+
+def normalize_filters(filters: Optional[Filters]) -> Dict[str, Tuple[str, ...]]:
+    """{field: (values, ...)}, sorted, without empty fields."""
+    normalized = {}
+    for field, values in (filters or {}).items():
+        if values is None:
+            continue
+        if isinstance(values, str):
+            values = (values,)
+        values = tuple(sorted({str(v) for v in values}))
+        if values:
+            normalized[field] = values
+    return dict(sorted(normalized.items()))
+
+
+def filter_scope(filters: Optional[Filters]) -> str:
+    """Canonical string of a filter ("" when unfiltered), e.g. for cache keys."""
+    normalized = normalize_filters(filters)
+    return json.dumps(normalized, sort_keys=True) if normalized else ""
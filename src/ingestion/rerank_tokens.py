@@ -0,0 +1,57 @@
+from typing import List
+
+from langchain_core.documents import Document
+from core.config import RERANK_MODEL
+
+# Metadata key holding the cross-encoder token IDs of a chunk's passage
+PASSAGE_TOKENS_KEY = "rerank_input_ids"
+
+# Passages longer than this never fit next to a query anyway
+MAX_PASSAGE_TOKENS = 512
+
+_tokenizer = None
+
+
+def get_rerank_tokenizer():
+    """Tokenizer of the reranker only; no model weights are loaded."""
+    global _tokenizer
+
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+        _tokenizer = AutoTokenizer.from_pretrained(RERANK_MODEL)
+
+    return _tokenizer
+
+
+def passage_text(doc: Document) -> str:
+    """Exactly what the cross-encoder scores against the query."""
+    section = doc.metadata.get("semantic_section", "Unknown")
+    return f"[{section}]\n{doc.page_content}"
+
+
+def tokenize_passages(texts: List[str], tokenizer=None) -> List[List[int]]:
+    tokenizer = tokenizer or get_rerank_tokenizer()
+    encoded = tokenizer(
+        texts,
+        add_special_tokens=False,
+        truncation=True,
+        max_length=MAX_PASSAGE_TOKENS,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )
+    return encoded["input_ids"]
+
+
+def attach_passage_tokens(chunks: List[Document]) -> List[Document]:
+    """
+    Pre-tokenize rerank passages at ingestion so queries only tokenize
+    the question itself.
+    """
+    if not chunks:
+        return chunks
+
+    token_ids = tokenize_passages([passage_text(c) for c in chunks])
+    for chunk, ids in zip(chunks, token_ids):
+        chunk.metadata[PASSAGE_TOKENS_KEY] = list(ids)
+
+    return chunks
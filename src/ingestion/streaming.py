@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Tuple, TypeVar
+
+K = TypeVar("K")
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+@dataclass
+class StageStats:
+    """Throughput counters for one streaming stage."""
+
+    name: str
+    batches: int = 0
+    items_in: int = 0
+    items_out: int = 0
+    seconds: float = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items_out / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "batches": self.batches,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "seconds": round(self.seconds, 4),
+            "items_per_second": round(self.items_per_second, 2),
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.items_in} in -> {self.items_out} out "
+            f"in {self.seconds:.2f}s ({self.items_per_second:.1f}/s)"
+        )
+
+
+def source_stage(
+    batches: Iterable[Tuple[K, List[T]]],
+    stats: StageStats,
+) -> Iterator[Tuple[K, List[T]]]:
+    """
+    Meter a producer stage (e.g. the loader pool): time spent waiting for
+    each (tag, batch) is charged to the stage.
+    """
+    it = iter(batches)
+    while True:
+        start = time.perf_counter()
+        try:
+            tag, batch = next(it)
+        except StopIteration:
+            stats.seconds += time.perf_counter() - start
+            return
+        stats.seconds += time.perf_counter() - start
+
+        stats.batches += 1
+        stats.items_in += 1
+        stats.items_out += len(batch)
+        yield tag, batch
+
+
+def map_stage(
+    fn: Callable[[List[T]], List[R]],
+    batches: Iterable[Tuple[K, List[T]]],
+    stats: StageStats,
+) -> Iterator[Tuple[K, List[R]]]:
+    """
+    Apply a list -> list stage to each (tag, batch), keeping the tag.
+    Only time spent inside `fn` is charged to the stage.
+    """
+    for tag, batch in batches:
+        start = time.perf_counter()
+        out = fn(batch)
+        stats.seconds += time.perf_counter() - start
+
+        stats.batches += 1
+        stats.items_in += len(batch)
+        stats.items_out += len(out)
+        yield tag, out
+
+
+def bounded(items: Iterable[T], maxsize: int) -> Iterator[T]:
+    """
+    Run the producer side of `items` in a background thread, handing items
+    over through a queue of at most `maxsize` entries.
+
+    The producer blocks when the consumer falls behind, so at most
+    `maxsize` items are buffered between the two sides (backpressure),
+    while both sides still overlap in time.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in items:
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            q.put(_DONE)
+        except BaseException as e:  # re-raised on the consumer side
+            q.put(_Failure(e))
+
+    worker = threading.Thread(target=produce, name="ingestion-producer", daemon=True)
+    worker.start()
+
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        worker.join(timeout=1.0)
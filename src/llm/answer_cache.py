@@ -0,0 +1,196 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from core.config import (
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+)
+
+# "Clause 4.1" and "Clause 4.2" embed almost identically; numbers must match
+_NUMBERS = re.compile(r"\d+(?:\.\d+)*")
+
+
+def _numbers(query: str) -> frozenset:
+    return frozenset(_NUMBERS.findall(query))
+
+
+@dataclass
+class _Entry:
+    query: str
+    answer: str
+    chunks: List[Document]
+    index_version: Optional[str]
+    scope: str
+    numbers: frozenset
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """
+    In-memory answer cache looked up by query-embedding similarity.
+
+    Query vectors (L2-normalized) live in one preallocated matrix, so a
+    lookup is a single matrix-vector product over the cached queries.
+    A hit requires:
+    - cosine similarity >= `threshold`
+    - the same index version the answer was produced from
+    - the same scope (metadata filter) the answer was retrieved under
+    - the same numbers (clause IDs) in both queries
+    - an entry younger than `ttl_seconds`
+    Without an index version (unversioned / legacy index) nothing is
+    cached: there is no way to tell when such an answer goes stale.
+    Entries are evicted least-recently-used once `max_entries` is reached.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl_seconds: float = ANSWER_CACHE_TTL,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._active = np.zeros(max_entries, dtype=bool)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # -----------------------------
+    # Lookup
+    # -----------------------------
+    def lookup(
+        self,
+        query: str,
+        query_vector,
+        index_version: Optional[str],
+        scope: str = "",
+    ) -> Optional[dict]:
+        vector = np.asarray(query_vector, dtype=np.float32)
+
+        with self._lock:
+            if index_version is None or self._vectors is None or not self._entries:
+                self.misses += 1
+                return None
+
+            self._expire(index_version)
+
+            slots = np.flatnonzero(self._active)
+            if slots.size == 0:
+                self.misses += 1
+                return None
+
+            sims = self._vectors[slots] @ vector
+            numbers = _numbers(query)
+
+            for pos in np.argsort(-sims):
+                if sims[pos] < self.threshold:
+                    break
+                slot = int(slots[pos])
+                entry = self._entries[slot]
+                if entry.numbers != numbers or entry.scope != scope:
+                    continue
+
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return {
+                    "answer": entry.answer,
+                    "chunks": [
+                        Document(page_content=d.page_content, metadata=dict(d.metadata))
+                        for d in entry.chunks
+                    ],
+                    "cached": True,
+                    "cache_similarity": float(sims[pos]),
+                    "cached_query": entry.query,
+                }
+
+            self.misses += 1
+            return None
+
+    # -----------------------------
+    # Insert
+    # -----------------------------
+    def store(
+        self,
+        query: str,
+        query_vector,
+        index_version: Optional[str],
+        answer: str,
+        chunks: List[Document],
+        scope: str = "",
+    ) -> None:
+        if index_version is None:
+            return
+        vector = np.asarray(query_vector, dtype=np.float32)
+
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            free = np.flatnonzero(~self._active)
+            if free.size:
+                slot = int(free[0])
+            else:
+                slot, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+
+            self._vectors[slot] = vector
+            self._active[slot] = True
+            self._entries[slot] = _Entry(
+                query=query,
+                answer=answer,
+                chunks=[
+                    Document(page_content=d.page_content, metadata=dict(d.metadata))
+                    for d in chunks
+                ],
+                index_version=index_version,
+                scope=scope,
+                numbers=_numbers(query),
+                expires_at=time.monotonic() + self.ttl_seconds,
+            )
+            self._entries.move_to_end(slot)
+
+    def _expire(self, index_version: Optional[str]) -> None:
+        # Caller holds the lock
+        now = time.monotonic()
+        stale = [
+            slot for slot, entry in self._entries.items()
+            if entry.expires_at <= now or entry.index_version != index_version
+        ]
+        for slot in stale:
+            del self._entries[slot]
+            self._active[slot] = False
+        self.expirations += len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._active[:] = False
+
+    # -----------------------------
+    # Introspection
+    # -----------------------------
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
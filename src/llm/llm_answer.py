@@ -1,5 +1,36 @@
-from llm.openai import generate_phi3, load_llm
-from query.retriever import run_query
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Iterator, List, Optional, Sequence
+
+from core.config import ANSWER_CACHE_ENABLED
+from ingestion.metadata_index import Filters, filter_scope
+from llm.answer_cache import SemanticAnswerCache
+from llm.openai import (
+    agenerate_phi3,
+    generate_phi3,
+    generate_phi3_batch,
+    load_llm,
+    stream_phi3,
+)
+from query.retriever import (
+    embed_query,
+    get_embeddings,
+    get_vectorstore_manager,
+    run_query,
+    run_query_batch,
+)
+from utils.telemetry import (
+    cache_result,
+    count,
+    detach_trace,
+    finish_trace,
+    span,
+    start_trace,
+    traced,
+)
+
+# Past answers, looked up by query-embedding similarity
+answer_cache = SemanticAnswerCache()
 
 # =========================
 # CONTEXT BUILDER
@@ -62,22 +93,279 @@ Answer:
 # =========================
 # MAIN ANSWER FUNCTION
 # =========================
-def answer_query(query: str):
+@dataclass
+class PreparedAnswer:
+    """
+    Everything before the LLM call: either a cached answer, or the
+    retrieved chunks and the prompt to send.
+    """
+
+    query: str
+    query_vector: List[float]
+    index_version: Optional[str]
+    scope: Any
+    use_cache: bool
+    cached: Optional[dict] = None
+    docs: Optional[list] = None
+    prompt: Optional[str] = None
+
+    def finish(self, answer: str) -> dict:
+        """Cache (if enabled) and return the generated answer."""
+        if self.use_cache:
+            answer_cache.store(
+                self.query, self.query_vector, self.index_version, answer, self.docs, self.scope
+            )
+        return {
+            "answer": answer,
+            "chunks": self.docs
+        }
+
+
+def prepare_answer(
+    query: str,
+    use_cache: bool = ANSWER_CACHE_ENABLED,
+    filters: Optional[Filters] = None,
+) -> PreparedAnswer:
+    """
+    Embedding, cache lookup, retrieval, rerank and prompt building: the
+    CPU-bound part of `answer_query`. Runs in the caller's trace.
+    """
+    # 0. Embed once: used for the cache lookup and the vector search
+    with span("embed_query"):
+        query_vector = embed_query(query)
+    with span("load_index"):
+        index = get_vectorstore_manager().get(filters)
+
+    prepared = PreparedAnswer(
+        query, query_vector, index.version, filter_scope(filters), use_cache
+    )
+
+    if use_cache:
+        with span("answer_cache"):
+            prepared.cached = answer_cache.lookup(
+                query, query_vector, index.version, prepared.scope
+            )
+        cache_result("answer", prepared.cached is not None)
+        if prepared.cached is not None:
+            return prepared
+
     # 1. Retrieve + rerank
-    docs = run_query(query)
+    prepared.docs = run_query(query, query_vector=query_vector, index=index, filters=filters)
 
     # 2. Build grounded context
-    context = build_context(docs)
+    with span("build_context"):
+        context = build_context(prepared.docs)
+
+        # 3. Build prompt (llama.cpp safe)
+        prepared.prompt = build_prompt(query, context)
+
+    return prepared
+
+
+def answer_query(
+    query: str,
+    use_cache: bool = ANSWER_CACHE_ENABLED,
+    filters: Optional[Filters] = None,
+):
+    """
+    `filters` scopes retrieval to matching chunks, e.g.
+    {"corpus_id": "ISO27001-2022"} or {"file_name": ["a.pdf", "b.pdf"]}.
+    """
+    with traced("answer_query", filtered=bool(filters)):
+        prepared = prepare_answer(query, use_cache, filters)
+        if prepared.cached is not None:
+            return prepared.cached
+
+        # 4. Generate answer
+        with span("llm"):
+            answer = generate_phi3(prepared.prompt)
+
+        return prepared.finish(answer)
+
+
+async def aanswer_query(
+    query: str,
+    use_cache: bool = ANSWER_CACHE_ENABLED,
+    filters: Optional[Filters] = None,
+    run_cpu=None,
+):
+    """
+    `answer_query` for asyncio servers: the CPU-bound part runs through
+    `run_cpu(fn, *args)` (e.g. a bounded executor) and the LLM call is
+    awaited, so many answers can wait on the LLM at once.
+    """
+    with traced("answer_query", filtered=bool(filters)):
+        if run_cpu is None:
+            prepared = prepare_answer(query, use_cache, filters)
+        else:
+            prepared = await run_cpu(prepare_answer, query, use_cache, filters)
+        if prepared.cached is not None:
+            return prepared.cached
+
+        with span("llm"):
+            answer = await agenerate_phi3(prepared.prompt)
+
+        return prepared.finish(answer)
+
+
+# =========================
+# BATCHED ANSWERS
+# =========================
+def answer_query_batch(
+    queries: Sequence[str],
+    use_cache: bool = ANSWER_CACHE_ENABLED,
+    filters: Optional[Filters] = None,
+) -> List[dict]:
+    """
+    `answer_query` for many questions (evaluation, bulk QA).
+
+    Retrieval runs once for all cache misses (`run_query_batch`), and the
+    LLM calls are issued concurrently. Results are in input order.
+    """
+    queries = list(queries)
+    if not queries:
+        return []
+
+    with traced("answer_query_batch", queries=len(queries), filtered=bool(filters)):
+        with span("embed_query"):
+            # One encode call; same vectors as embed_query
+            query_vectors = get_embeddings().embed_documents(queries)
+        with span("load_index"):
+            index = get_vectorstore_manager().get(filters)
+        scope = filter_scope(filters)
+
+        results: List[Optional[dict]] = [None] * len(queries)
+        if use_cache:
+            with span("answer_cache"):
+                for i, (query, vector) in enumerate(zip(queries, query_vectors)):
+                    results[i] = answer_cache.lookup(query, vector, index.version, scope)
+            count("answer_cache_hits", sum(r is not None for r in results))
+
+        todo = [i for i, result in enumerate(results) if result is None]
+        if todo:
+            docs_per_query = run_query_batch(
+                [queries[i] for i in todo],
+                query_vectors=[query_vectors[i] for i in todo],
+                index=index,
+                filters=filters,
+            )
+
+            with span("build_context"):
+                prompts = [
+                    build_prompt(queries[i], build_context(docs))
+                    for i, docs in zip(todo, docs_per_query)
+                ]
+            with span("llm"):
+                answers = generate_phi3_batch(prompts)
+
+            for i, docs, answer in zip(todo, docs_per_query, answers):
+                if use_cache:
+                    answer_cache.store(queries[i], query_vectors[i], index.version, answer, docs, scope)
+                results[i] = {"answer": answer, "chunks": docs}
+
+    return results
+
+
+# =========================
+# STREAMING ANSWER
+# =========================
+@dataclass
+class AnswerTimings:
+    """Seconds since the query arrived, filled in while the answer streams."""
+
+    retrieval_seconds: Optional[float] = None
+    first_token_seconds: Optional[float] = None
+    total_seconds: Optional[float] = None
+    tokens: int = 0
+    cached: bool = False
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def answer_query_stream(
+    query: str,
+    use_cache: bool = ANSWER_CACHE_ENABLED,
+    filters: Optional[Filters] = None,
+):
+    """
+    Like `answer_query`, but the answer is an iterator of text pieces.
+
+    Retrieval and rerank run before returning, so "chunks" is final; the
+    LLM call starts when "tokens" is first iterated. "timings" separates
+    time-to-first-token from total latency and is complete once "tokens"
+    is exhausted.
+    """
+    start = time.perf_counter()
+    timings = AnswerTimings()
+    trace = start_trace("answer_query_stream", filtered=bool(filters))
+
+    try:
+        with span("embed_query"):
+            query_vector = embed_query(query)
+        with span("load_index"):
+            index = get_vectorstore_manager().get(filters)
+        scope = filter_scope(filters)
+
+        cached = None
+        if use_cache:
+            with span("answer_cache"):
+                cached = answer_cache.lookup(query, query_vector, index.version, scope)
+            cache_result("answer", cached is not None)
+
+        if cached is not None:
+            timings.cached = True
+            docs = cached["chunks"]
+            pieces = iter([cached["answer"]])
+        else:
+            docs = run_query(query, query_vector=query_vector, index=index, filters=filters)
+            with span("build_context"):
+                prompt = build_prompt(query, build_context(docs))
+            pieces = stream_phi3(prompt)
+    except BaseException as e:
+        finish_trace(trace, e)
+        raise
+
+    timings.retrieval_seconds = time.perf_counter() - start
+    # The answer streams after this call returns; the trace is finished by tokens()
+    detach_trace(trace)
 
-    # 3. Build prompt (llama.cpp safe)
-    prompt = build_prompt(query, context)
+    def tokens() -> Iterator[str]:
+        answer = []
+        llm_start = time.perf_counter()
+        try:
+            for piece in pieces:
+                if timings.first_token_seconds is None:
+                    timings.first_token_seconds = time.perf_counter() - start
+                    if trace is not None:
+                        trace.record_span("llm_first_token", llm_start, time.perf_counter())
+                timings.tokens += 1
+                answer.append(piece)
+                yield piece
+        except GeneratorExit:
+            # Reader stopped early (e.g. the UI session went away)
+            if trace is not None:
+                trace.attrs["cancelled"] = True
+            finish_trace(trace)
+            raise
+        except BaseException as e:
+            finish_trace(trace, e)
+            raise
+        timings.total_seconds = time.perf_counter() - start
+        if trace is not None:
+            trace.record_span("llm", llm_start, time.perf_counter())
+            trace.attrs["tokens"] = timings.tokens
+            trace.caches.setdefault("answer", timings.cached)
+        finish_trace(trace)
 
-    # 4. Generate answer
-    answer = generate_phi3(prompt)
+        # Only a fully streamed answer is cached
+        if use_cache and not timings.cached:
+            answer_cache.store(query, query_vector, index.version, "".join(answer), docs, scope)
 
     return {
-        "answer": answer,
-        "chunks": docs
+        "tokens": tokens(),
+        "chunks": docs,
+        "timings": timings,
     }
 
 
@@ -1,6 +1,13 @@
-from langchain_openai import ChatOpenAI
+from typing import Iterator, List
+
 from langchain_core.messages import HumanMessage
-from core.config import LLM_MODEL, OPENAI_API_KEY, TEMPERATURE
+from core.config import (
+    LLM_BATCH_CONCURRENCY,
+    LLM_MODEL,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    TEMPERATURE,
+)
 
 _llm = None
 
@@ -8,23 +15,89 @@ def load_llm():
     global _llm
 
     if _llm is None:
+        from langchain_openai import ChatOpenAI
+
         _llm = ChatOpenAI(
             model=LLM_MODEL,
             openai_api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
             temperature=TEMPERATURE,
         )
 
     return _llm
 
+def _trim(text: str) -> str:
+    text = text.strip()
+
+    # Optional safety trim
+    if "\n\n" in text:
+        text = text.split("\n\n")[0]
+
+    return text
+
 def generate_phi3(prompt: str, max_new_tokens: int = 256) -> str:
     llm = load_llm()
 
     messages = [HumanMessage(content=prompt)]
     response = llm.invoke(messages)
-    text = response.content.strip()
+    return _trim(response.content)
 
-    # Optional safety trim
-    if "\n\n" in text:
-        text = text.split("\n\n")[0]
+async def agenerate_phi3(prompt: str, max_new_tokens: int = 256) -> str:
+    """`generate_phi3` without blocking the event loop."""
+    llm = load_llm()
 
-    return text
+    messages = [HumanMessage(content=prompt)]
+    response = await llm.ainvoke(messages)
+    return _trim(response.content)
+
+def generate_phi3_batch(
+    prompts: List[str],
+    max_concurrency: int = LLM_BATCH_CONCURRENCY,
+) -> List[str]:
+    """`generate_phi3` for many prompts, with up to `max_concurrency` requests in flight."""
+    llm = load_llm()
+
+    responses = llm.batch(
+        [[HumanMessage(content=prompt)] for prompt in prompts],
+        config={"max_concurrency": max_concurrency},
+    )
+    return [_trim(response.content) for response in responses]
+
+def stream_phi3(prompt: str, max_new_tokens: int = 256) -> Iterator[str]:
+    """
+    Streaming variant of `generate_phi3`: yields text as it arrives.
+
+    The joined output equals what `generate_phi3` returns. Trailing
+    whitespace is held back until more text follows, so the stream can
+    stop at the first blank line (the same safety trim) without emitting
+    anything past it.
+    """
+    llm = load_llm()
+
+    messages = [HumanMessage(content=prompt)]
+    stream = llm.stream(messages)
+    pending = ""
+    started = False
+
+    try:
+        for chunk in stream:
+            pending += chunk.content
+            if not started:
+                # Leading whitespace is stripped, like generate_phi3
+                pending = pending.lstrip()
+                if not pending:
+                    continue
+                started = True
+
+            cut = pending.find("\n\n")
+            if cut != -1:
+                if cut:
+                    yield pending[:cut]
+                return
+
+            head = pending.rstrip()
+            if head:
+                yield head
+            pending = pending[len(head):]
+    finally:
+        stream.close()
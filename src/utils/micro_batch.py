@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Generic, List, Sequence, Tuple, TypeVar
+
+from utils.telemetry import count
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Coalesces concurrent single-item calls into one call of `fn(items)`.
+
+    Callers block in `submit(item)`. One worker thread takes the first
+    waiting item, adds whatever arrives within `max_wait` seconds (up to
+    `max_batch` items), runs `fn` once and hands every caller its own
+    result (or the exception `fn` raised).
+
+    The wait is only spent when there is concurrency to exploit: if the
+    previous batch held a single item and nothing else is queued, the
+    item runs at once, so a lone request pays no extra latency. Under
+    load, items pile up while a batch runs and the next one starts full.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[T]], Sequence[R]],
+        max_batch: int,
+        max_wait: float,
+        name: str,
+    ):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self._queue: "queue.SimpleQueue[Tuple[T, Future]]" = queue.SimpleQueue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._last_size = 1
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item: T) -> R:
+        """Result of `fn` for `item`, computed in a shared batch."""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((item, future))
+        result, size = future.result()
+        count(f"{self.name}_batch", size)
+        return result
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._run, name=f"micro-batch-{self.name}", daemon=True
+                    )
+                    self._worker.start()
+
+    def _collect(self) -> List[Tuple[T, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (len(batch) == 1 and self._last_size == 1):
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            self._last_size = len(batch)
+            self.batches += 1
+            self.items += len(batch)
+
+            try:
+                results = self.fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name}: {len(results)} results for {len(batch)} items"
+                    )
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result((result, len(batch)))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
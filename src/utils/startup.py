@@ -0,0 +1,195 @@
+"""
+Startup cost of the query stack.
+
+Importing the query modules is cheap; models are built on first use by
+their lazy accessors. `warmup()` front-loads that cost explicitly (e.g. at
+service start), and `import_report()` / `startup_report()` show where the
+time goes:
+
+    cd src
+    python -m utils.startup            # import cost per module
+    python -m utils.startup --warmup   # + model / index load cost
+"""
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from core.exception import RetrievalError
+
+logger = logging.getLogger(__name__)
+
+# Modules a query-serving process imports
+STARTUP_MODULES = (
+    "core.config",
+    "query.vectorstore_manager",
+    "query.rerankers",
+    "query.retriever",
+    "llm.openai",
+    "llm.llm_answer",
+)
+
+WARMUP_COMPONENTS = ("embeddings", "vectorstore", "reranker", "llm")
+
+# "import time:  self [us] | cumulative | imported package"
+_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+# =========================
+# MEMORY
+# =========================
+def memory_usage() -> Optional[Dict[str, int]]:
+    """
+    Resident memory of this process in bytes (Linux /proc; None elsewhere).
+    rss_anon is private to the process; rss_file includes memory-mapped
+    index pages, which are shared with every process mapping the same file.
+    """
+    fields = {"VmRSS": "rss", "RssAnon": "rss_anon", "RssFile": "rss_file"}
+    usage = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    usage[fields[key]] = int(value.split()[0]) * 1024
+    except OSError:
+        return None
+    return usage
+
+
+# =========================
+# WARMUP
+# =========================
+def _warm_embeddings():
+    from query.retriever import get_embeddings
+    get_embeddings().embed_query("warmup")
+
+
+def _warm_vectorstore():
+    from query.retriever import get_vectorstore_manager
+    try:
+        get_vectorstore_manager().get()
+    except RetrievalError:
+        pass  # nothing ingested yet
+
+
+def _warm_reranker():
+    from langchain_core.documents import Document
+    from query.rerankers import score_pairs
+    score_pairs("warmup", [Document(page_content="warmup", metadata={})], cache=None)
+
+
+def _warm_llm():
+    from openai import OpenAIError
+
+    from llm.openai import load_llm
+    try:
+        load_llm()  # client only, no request is sent
+    except OpenAIError as e:
+        # e.g. no OPENAI_API_KEY: retrieval still works, /answer fails on use
+        logger.warning("Skipping LLM warmup: %s", e)
+
+
+_WARMERS = {
+    "embeddings": _warm_embeddings,
+    "vectorstore": _warm_vectorstore,
+    "reranker": _warm_reranker,
+    "llm": _warm_llm,
+}
+
+
+def warmup(components: Iterable[str] = WARMUP_COMPONENTS) -> Dict[str, float]:
+    """
+    Load models / index now instead of on the first query.
+    Returns seconds spent per component.
+    """
+    timings = {}
+    for name in components:
+        if name not in _WARMERS:
+            raise ValueError(f"Unknown warmup component: {name}")
+        start = time.perf_counter()
+        _WARMERS[name]()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+# =========================
+# IMPORT COST
+# =========================
+def _importtime(module: str) -> List[tuple]:
+    """(self_us, cumulative_us, depth, name) for every import in a fresh interpreter."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            self_us, cum_us, indent, name = match.groups()
+            rows.append((int(self_us), int(cum_us), len(indent) // 2, name))
+    return rows
+
+
+def import_report(modules: Iterable[str] = STARTUP_MODULES, top: int = 5) -> List[dict]:
+    """
+    Import cost of each module, measured in its own fresh interpreter,
+    with the heaviest packages it pulls in.
+    """
+    report = []
+    for module in modules:
+        rows = _importtime(module)
+
+        total_us = next((cum for _, cum, _, name in reversed(rows) if name == module), 0)
+        by_package: Dict[str, int] = defaultdict(int)
+        for self_us, _, _, name in rows:
+            by_package[name.split(".")[0]] += self_us
+
+        heaviest = sorted(by_package.items(), key=lambda kv: -kv[1])[:top]
+        report.append({
+            "module": module,
+            "import_seconds": total_us / 1e6,
+            "heaviest": [(pkg, us / 1e6) for pkg, us in heaviest],
+        })
+    return report
+
+
+def startup_report(warm: bool = False) -> dict:
+    report = {"imports": import_report()}
+    if warm:
+        from query.retriever import get_vectorstore_manager
+
+        report["warmup"] = warmup()
+        report["index"] = get_vectorstore_manager().stats()
+        report["memory"] = memory_usage()
+    return report
+
+
+if __name__ == "__main__":
+    report = startup_report(warm="--warmup" in sys.argv)
+
+    print(f"{'module':<28}{'import (s)':>12}  heaviest packages")
+    for row in report["imports"]:
+        heaviest = ", ".join(f"{pkg} {sec:.2f}s" for pkg, sec in row["heaviest"])
+        print(f"{row['module']:<28}{row['import_seconds']:>12.3f}  {heaviest}")
+
+    if "warmup" in report:
+        print(f"\n{'component':<28}{'load (s)':>12}")
+        for name, seconds in report["warmup"].items():
+            print(f"{name:<28}{seconds:>12.3f}")
+
+        print("\nindex:", json.dumps(report["index"], indent=2))
+        print("memory:", json.dumps(report["memory"], indent=2))
@@ -0,0 +1,355 @@
+"""
+Per-request traces and aggregate metrics for the query path.
+
+Every answer_query / run_query call opens one trace. Code on the path
+marks its stages with `span()` and reports candidate counts / cache hits
+with `count()` / `cache_result()`; all of them act on the trace of the
+current request (a context variable, so nested calls and
+`copy_context()`-submitted thread-pool work join the same trace).
+
+When the trace finishes it is:
+- logged as one JSON line on the "rag.trace" logger
+- kept in a small ring buffer (`recent_traces()`)
+- folded into histograms / counters rendered in the Prometheus text
+  format by `render_metrics()` and served by `start_metrics_server()`
+
+With TELEMETRY_ENABLED=0 no trace is ever opened and every helper
+returns immediately after one context-variable lookup.
+
+    cd src
+    python -m utils.telemetry --port 9108     # serve /metrics
+"""
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.config import TELEMETRY_ENABLED, TELEMETRY_RECENT_TRACES
+
+logger = logging.getLogger("rag.trace")
+
+# Seconds; spans range from ~50us (context build) to tens of seconds (LLM)
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+COUNT_BUCKETS = (0, 1, 3, 5, 10, 20, 30, 50, 100, 300, 1000)
+
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "rag_trace", default=None
+)
+
+
+# =========================
+# METRICS
+# =========================
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set (Prometheus semantics)."""
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}   # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for j in range(i, len(self.buckets)):
+                series[j] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, values in series:
+            for bound, cumulative in zip(self.buckets, values):
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_labels(labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(labels, le)} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(labels)} {values[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(labels)} {value:g}" for labels, value in values)
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "rag_request_seconds", "End-to-end latency per request kind", LATENCY_BUCKETS
+)
+SPAN_SECONDS = Histogram(
+    "rag_span_seconds", "Latency per query-path stage", LATENCY_BUCKETS
+)
+CANDIDATES = Histogram(
+    "rag_candidates", "Candidates per request at each retrieval step", COUNT_BUCKETS
+)
+REQUESTS = Counter("rag_requests_total", "Requests by kind and outcome")
+CACHE_LOOKUPS = Counter("rag_cache_lookups_total", "Cache lookups by cache and result")
+
+_METRICS = (REQUEST_SECONDS, SPAN_SECONDS, CANDIDATES, REQUESTS, CACHE_LOOKUPS)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =========================
+# TRACES
+# =========================
+class Trace:
+    """Span timings, counts and cache results of one request."""
+
+    def __init__(self, kind: str, **attrs):
+        self.kind = kind
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[dict] = []
+        self.counts: Dict[str, int] = {}
+        self.caches: Dict[str, bool] = {}
+        self.status = "ok"
+        self.duration: Optional[float] = None
+        self.token: Optional[contextvars.Token] = None
+        # Shard / search threads of one request count into the same trace
+        self._counts_lock = threading.Lock()
+
+    def add_count(self, name: str, value: int) -> None:
+        with self._counts_lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def record_span(self, name: str, start: float, end: float) -> None:
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.start) * 1000, 3),
+            "ms": round((end - start) * 1000, 3),
+        })
+
+    def as_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            **self.attrs,
+            "spans": self.spans,
+            "counts": self.counts,
+            "caches": self.caches,
+        }
+
+
+_recent: deque = deque(maxlen=TELEMETRY_RECENT_TRACES)
+
+
+def start_trace(kind: str, **attrs) -> Optional[Trace]:
+    """
+    Open a trace and make it current. Returns None (and opens nothing)
+    when telemetry is disabled or a trace is already open, in which case
+    the caller's stages join that trace.
+    """
+    if not TELEMETRY_ENABLED or _current.get() is not None:
+        return None
+    trace = Trace(kind, **attrs)
+    trace.token = _current.set(trace)
+    return trace
+
+
+def finish_trace(trace: Optional[Trace], error: Optional[BaseException] = None) -> None:
+    """Close a trace opened by `start_trace` (None is ignored)."""
+    if trace is None:
+        return
+
+    trace.duration = time.perf_counter() - trace.start
+    if error is not None:
+        trace.status = "error"
+        trace.attrs["error"] = type(error).__name__
+    detach_trace(trace)
+
+    REQUEST_SECONDS.observe(trace.duration, request=trace.kind)
+    REQUESTS.inc(request=trace.kind, status=trace.status)
+    for span_ in trace.spans:
+        SPAN_SECONDS.observe(span_["ms"] / 1000, span=span_["name"])
+    for name, value in trace.counts.items():
+        CANDIDATES.observe(value, step=name)
+    for name, hit in trace.caches.items():
+        CACHE_LOOKUPS.inc(cache=name, result="hit" if hit else "miss")
+
+    _recent.append(trace.as_dict())
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(trace.as_dict(), default=str))
+
+
+def detach_trace(trace: Optional[Trace]) -> None:
+    """
+    Stop `trace` being the current one without finishing it, e.g. when a
+    streamed answer outlives the call that opened the trace.
+    """
+    if trace is None or trace.token is None:
+        return
+    try:
+        _current.reset(trace.token)
+    except ValueError:
+        pass  # opened in another context, which still owns it
+    trace.token = None
+
+
+@contextmanager
+def traced(kind: str, **attrs):
+    """`with traced("run_query"):` -- a request trace (joins an open one)."""
+    trace = start_trace(kind, **attrs)
+    try:
+        yield trace
+    except BaseException as e:
+        finish_trace(trace, e)
+        raise
+    else:
+        finish_trace(trace)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "begin")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.record_span(self.name, self.begin, time.perf_counter())
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """`with span("faiss_search"):` -- time a stage of the current request."""
+    trace = _current.get()
+    return _Span(trace, name) if trace is not None else _NOOP_SPAN
+
+
+def count(name: str, value: int) -> None:
+    """
+    Record how many candidates a step produced (e.g. "vector_hits").
+    Steps that run several times in one request (once per shard) add up.
+    """
+    trace = _current.get()
+    if trace is not None:
+        trace.add_count(name, value)
+
+
+def cache_result(name: str, hit: bool) -> None:
+    """Record whether a cache ("answer", "rerank", ...) served the request."""
+    trace = _current.get()
+    if trace is not None:
+        trace.caches[name] = hit
+
+
+def annotate(**attrs) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def recent_traces() -> List[dict]:
+    return list(_recent)
+
+
+# =========================
+# METRICS ENDPOINT
+# =========================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/metrics":
+            body = render_metrics().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.rstrip("/") == "/traces":
+            body = json.dumps(recent_traces(), default=str).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus) and /traces (recent JSON traces) in a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve query-path metrics")
+    parser.add_argument("--port", type=int, default=9108)
+    args = parser.parse_args()
+
+    start_metrics_server(args.port)
+    print(f"Metrics on http://127.0.0.1:{args.port}/metrics")
+    threading.Event().wait()
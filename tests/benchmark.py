@@ -0,0 +1,403 @@
+"""
+Per-stage latency benchmark of the ingestion and query paths.
+
+Generates a synthetic standards-like corpus of configurable size and times
+every stage on its own, with the LLM replaced by the local stub server:
+
+    ingestion : partition, clean_documents, chunk_large_sections,
+                pretokenize, embedding, faiss_build
+    query     : embed_query, faiss_search, cross_encoder_rerank,
+                build_context, llm_stub (first token + full answer)
+
+Each stage reports p50/p95/p99 per item (file, batch or query) and
+throughput; results are written as JSON so two releases can be diffed:
+
+    python tests/benchmark.py --docs 50 --queries 200 --json bench.json
+    python tests/benchmark.py --json new.json --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Synthetic text is drawn from this vocabulary so BM25 / embeddings see
+# realistic overlap between sections and queries
+_WORDS = (
+    "information security management system organization shall establish "
+    "implement maintain continually improve risk assessment treatment "
+    "control objective policy asset access cryptography supplier incident "
+    "continuity compliance audit review leadership commitment competence "
+    "awareness communication documented operational planning monitoring "
+    "measurement analysis evaluation nonconformity corrective action "
+    "interested parties scope context requirements objectives resources"
+).split()
+
+_TITLES = (
+    "Context of the organization", "Leadership", "Planning", "Support",
+    "Operation", "Performance evaluation", "Improvement", "Risk assessment",
+    "Risk treatment", "Access control", "Cryptography", "Supplier relationships",
+)
+
+
+@dataclass
+class StageResult:
+    stage: str
+    unit: str                 # what one sample is: file, batch, query, ...
+    samples: int
+    items: int                # files / chunks / queries processed in total
+    total_seconds: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    throughput_per_s: float   # items per second
+
+
+@dataclass
+class BenchmarkReport:
+    meta: Dict[str, object]
+    stages: List[StageResult] = field(default_factory=list)
+
+
+# =========================
+# TIMING
+# =========================
+class StageTimer:
+    """Collects one latency sample per call of `measure`."""
+
+    def __init__(self, stage: str, unit: str):
+        self.stage = stage
+        self.unit = unit
+        self.seconds: List[float] = []
+        self.items = 0
+
+    def measure(self, fn: Callable, *args, items: int = 1, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.seconds.append(time.perf_counter() - start)
+        self.items += items
+        return result
+
+    def record(self, seconds: float, items: int = 1) -> None:
+        self.seconds.append(seconds)
+        self.items += items
+
+    def result(self) -> StageResult:
+        ms = np.asarray(self.seconds) * 1000.0
+        total = float(np.sum(self.seconds))
+        if ms.size == 0:
+            ms = np.zeros(1)
+        return StageResult(
+            stage=self.stage,
+            unit=self.unit,
+            samples=len(self.seconds),
+            items=self.items,
+            total_seconds=total,
+            mean_ms=float(ms.mean()),
+            p50_ms=float(np.percentile(ms, 50)),
+            p95_ms=float(np.percentile(ms, 95)),
+            p99_ms=float(np.percentile(ms, 99)),
+            throughput_per_s=self.items / total if total > 0 else 0.0,
+        )
+
+
+# =========================
+# SYNTHETIC CORPUS
+# =========================
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def generate_corpus(
+    root: Path,
+    docs: int,
+    sections: int,
+    section_words: int,
+    seed: int = 0,
+) -> List[Path]:
+    """
+    Write `docs` text files of numbered clauses ("6.1.2" heading line,
+    title line, paragraphs), shaped like the ISO standards we ingest.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    files = []
+
+    for d in range(docs):
+        lines = []
+        for s in range(sections):
+            lines.append(f"{s // 4 + 4}.{s % 4 + 1}.{d % 3 + 1}")
+            lines.append(rng.choice(_TITLES))
+            remaining = section_words
+            while remaining > 0:
+                n = min(remaining, rng.randint(40, 120))
+                lines.append(" ".join(_sentence(rng, 12) for _ in range(max(1, n // 12))))
+                remaining -= n
+            lines.append("")
+
+        path = root / f"standard_{d:04d}.txt"
+        path.write_text("\n".join(lines), encoding="utf-8")
+        files.append(path)
+
+    return files
+
+
+def generate_queries(n: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    templates = (
+        "What does the standard require for {}?",
+        "How shall the organization handle {}?",
+        "Explain clause {} on {}.",
+    )
+    queries = []
+    for i in range(n):
+        topic = " ".join(rng.sample(_WORDS, 3))
+        template = templates[i % len(templates)]
+        if "{}." in template:
+            queries.append(template.format(f"{rng.randint(4, 10)}.{rng.randint(1, 4)}", topic))
+        else:
+            queries.append(template.format(topic))
+    return queries
+
+
+# =========================
+# INGESTION PATH
+# =========================
+def bench_ingestion(files: List[Path], embed_batch: int):
+    from ingestion.chunker import chunk_large_sections
+    from ingestion.cleaner import clean_documents
+    from ingestion.index import get_embedding_engine
+    from ingestion.loader.ISO_loader import load_iso_file
+    from ingestion.rerank_tokens import attach_passage_tokens
+
+    partition = StageTimer("partition", "file")
+    clean = StageTimer("clean_documents", "file")
+    chunk = StageTimer("chunk_large_sections", "file")
+    pretokenize = StageTimer("pretokenize", "file")
+    embed = StageTimer("embedding", "batch")
+
+    chunks = []
+    for file in files:
+        sections = partition.measure(
+            load_iso_file, file, doc_uid=file.stem, corpus_id="benchmark"
+        )
+        cleaned = clean.measure(clean_documents, sections)
+        file_chunks = chunk.measure(chunk_large_sections, cleaned)
+        pretokenize.measure(attach_passage_tokens, file_chunks)
+        for i, c in enumerate(file_chunks):
+            c.metadata["chunk_id"] = f"{file.stem}:{i}"
+        chunks.extend(file_chunks)
+
+    # The raw encoder: the ingestion embedding cache would turn reruns into lookups
+    engine = get_embedding_engine()
+    engine.embed_documents(["warmup"])
+    vectors = []
+    for start in range(0, len(chunks), embed_batch):
+        batch = [c.page_content for c in chunks[start:start + embed_batch]]
+        vectors.extend(embed.measure(engine.embed_documents, batch, items=len(batch)))
+
+    timers = [partition, clean, chunk, pretokenize, embed]
+    return chunks, np.asarray(vectors, dtype=np.float32), timers
+
+
+def bench_faiss_build(vectors: np.ndarray, factory: str, repeat: int):
+    from ingestion.ann_index import build_ann_index, new_exact_index
+
+    build = StageTimer("faiss_build", "index")
+    row_ids = np.arange(len(vectors), dtype=np.int64)
+
+    def build_once():
+        exact = new_exact_index(vectors.shape[1])
+        exact.add_with_ids(vectors, row_ids)
+        return build_ann_index(vectors, factory, ids=row_ids) or exact
+
+    index = None
+    for _ in range(repeat):
+        index = build.measure(build_once, items=len(vectors))
+    return index, build
+
+
+# =========================
+# QUERY PATH
+# =========================
+def bench_queries(index, chunks, queries: List[str], k: int, top_n: int):
+    from ingestion.ann_index import search_parameters
+    from llm.llm_answer import build_context, build_prompt
+    from llm.openai import stream_phi3
+    from query.rerankers import cross_encoder_rerank, score_cache
+    from query.retriever import get_embeddings
+    from langchain_core.documents import Document
+
+    embed = StageTimer("embed_query", "query")
+    search = StageTimer("faiss_search", "query")
+    rerank = StageTimer("cross_encoder_rerank", "query")
+    context = StageTimer("build_context", "query")
+    first_token = StageTimer("llm_stub_first_token", "query")
+    answer = StageTimer("llm_stub", "query")
+
+    embeddings = get_embeddings()
+    embeddings.embed_query("warmup")
+    "".join(stream_phi3("warmup"))  # builds the LLM client
+    params = search_parameters(index)
+
+    for query in queries:
+        vector = embed.measure(embeddings.embed_query, query)
+        _, ids = search.measure(
+            index.search, np.asarray([vector], dtype=np.float32), k, params=params
+        )
+
+        hits = [
+            Document(page_content=chunks[i].page_content, metadata=dict(chunks[i].metadata))
+            for i in ids[0] if i != -1
+        ]
+        score_cache.clear()  # every query is scored, as on a cold cache
+        docs = rerank.measure(cross_encoder_rerank, query, hits, top_n=top_n)
+        text = context.measure(build_context, docs)
+
+        start = time.perf_counter()
+        pieces = stream_phi3(build_prompt(query, text))
+        next(pieces, None)
+        first_token.record(time.perf_counter() - start)
+        for _ in pieces:
+            pass
+        answer.record(time.perf_counter() - start)
+
+    return [embed, search, rerank, context, first_token, answer]
+
+
+# =========================
+# REPORTING
+# =========================
+def print_report(report: BenchmarkReport) -> None:
+    meta = report.meta
+    print(
+        f"{meta['docs']} docs, {meta['chunks']} chunks, {meta['queries']} queries, "
+        f"index {meta['factory']}\n"
+    )
+    print(f"{'stage':<24}{'unit':<8}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'items/s':>11}")
+    for r in report.stages:
+        print(
+            f"{r.stage:<24}{r.unit:<8}{r.samples:>6}{r.p50_ms:>10.2f}{r.p95_ms:>10.2f}"
+            f"{r.p99_ms:>10.2f}{r.throughput_per_s:>11.1f}"
+        )
+
+
+def compare(report: BenchmarkReport, baseline_path: str) -> Dict[str, dict]:
+    """p50 / p95 change per stage against an earlier JSON report."""
+    with open(baseline_path) as f:
+        baseline = {s["stage"]: s for s in json.load(f)["stages"]}
+
+    deltas = {}
+    print(f"\nvs {baseline_path}")
+    print(f"{'stage':<24}{'p50 ms':>18}{'p95 ms':>18}")
+    for r in report.stages:
+        old = baseline.get(r.stage)
+        if old is None:
+            continue
+        deltas[r.stage] = {
+            "p50_change": r.p50_ms / old["p50_ms"] - 1 if old["p50_ms"] else None,
+            "p95_change": r.p95_ms / old["p95_ms"] - 1 if old["p95_ms"] else None,
+        }
+        print(
+            f"{r.stage:<24}{old['p50_ms']:>8.2f} ->{r.p50_ms:>7.2f}"
+            f"{old['p95_ms']:>9.2f} ->{r.p95_ms:>7.2f}"
+        )
+    return deltas
+
+
+# =========================
+# MAIN
+# =========================
+def main(argv: Optional[List[str]] = None) -> BenchmarkReport:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int, default=20, help="synthetic documents")
+    parser.add_argument("--sections", type=int, default=30, help="clauses per document")
+    parser.add_argument("--section-words", type=int, default=250, help="words per clause")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=30, help="FAISS hits passed to the reranker")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--embed-batch", type=int, default=64)
+    parser.add_argument("--build-repeat", type=int, default=3)
+    parser.add_argument("--factory", help="FAISS factory string (default: FAISS_INDEX_FACTORY)")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="stub seconds per token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    args = parser.parse_args(argv)
+
+    server = _stub_server()
+    server.delay = args.llm_delay
+    # Must be set before core.config is imported
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+    from core.config import EMBEDDING_MODEL, FAISS_INDEX_FACTORY, RERANK_BACKEND, RERANK_MODEL
+    factory = args.factory or FAISS_INDEX_FACTORY
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = generate_corpus(
+            Path(tmp), args.docs, args.sections, args.section_words, args.seed
+        )
+        chunks, vectors, ingest_timers = bench_ingestion(files, args.embed_batch)
+
+    index, build_timer = bench_faiss_build(vectors, factory, args.build_repeat)
+    query_timers = bench_queries(
+        index, chunks, generate_queries(args.queries, args.seed + 1), args.k, args.top_n
+    )
+
+    report = BenchmarkReport(meta={
+        "docs": args.docs,
+        "sections": args.sections,
+        "section_words": args.section_words,
+        "chunks": len(chunks),
+        "queries": args.queries,
+        "k": args.k,
+        "factory": factory,
+        "embedding_model": EMBEDDING_MODEL,
+        "rerank_model": RERANK_MODEL,
+        "rerank_backend": RERANK_BACKEND,
+        "llm_delay": args.llm_delay,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    report.stages = [t.result() for t in ingest_timers + [build_timer] + query_timers]
+
+    print_report(report)
+    if args.baseline:
+        compare(report, args.baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(asdict(report), f, indent=2)
+
+    return report
+
+
+_server = None
+
+
+def _stub_server():
+    # One per process: the LLM client keeps the base URL it was built with
+    global _server
+
+    if _server is None:
+        from stub_llm_server import StubChatServer
+        _server = StubChatServer().start()
+
+    return _server
+
+
+if __name__ == "__main__":
+    main()
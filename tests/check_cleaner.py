@@ -0,0 +1,51 @@
+"""
+Golden test of ingestion.cleaner.clean_documents.
+
+test/cleaner_golden.json holds OCR-like inputs (garbage lines, page
+numbers, hyphenated breaks, unicode digits / spaces, CRLF) and the output
+of the original regex-per-line cleaner. Any rewrite must reproduce it
+byte for byte, serially and across processes:
+
+    python tests/check_cleaner.py
+"""
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from langchain_core.documents import Document
+
+import ingestion.cleaner as cleaner
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "..", "test", "cleaner_golden.json")
+
+
+def check(workers: int) -> bool:
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = json.load(f)
+
+    docs = [Document(page_content=d["text"], metadata=d["metadata"]) for d in golden["inputs"]]
+    cleaned = cleaner.clean_documents(docs, workers=workers)
+    actual = [{"text": d.page_content, "metadata": d.metadata} for d in cleaned]
+
+    expected = golden["expected"]
+    if actual == expected:
+        print(f"workers={workers}: OK ({len(actual)}/{len(docs)} documents kept)")
+        return True
+
+    print(f"workers={workers}: {len(actual)} documents, expected {len(expected)}")
+    for a, e in zip(actual, expected):
+        if a != e:
+            print(f"  first mismatch (input {e['metadata'].get('i')}):")
+            print(f"    expected {e['text']!r}")
+            print(f"    actual   {a['text']!r}")
+            break
+    return False
+
+
+if __name__ == "__main__":
+    # Force the process pool even for this small input
+    cleaner.CLEAN_PARALLEL_MIN_CHARS = 0
+    ok = check(workers=1) and check(workers=4)
+    sys.exit(0 if ok else 1)
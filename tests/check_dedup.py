@@ -0,0 +1,83 @@
+"""
+End-to-end check of near-duplicate provenance.
+
+Two files share one long boilerplate section. Ingestion keeps a single
+copy of it; `run_query` for that boilerplate must still name both files
+in the hit's `sources` (dedup merges them into a child chunk, retrieval
+returns its parent):
+
+    python tests/check_dedup.py
+"""
+import os
+import random
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+_WORDS = (
+    "information security management system organization shall establish "
+    "implement maintain continually improve risk assessment treatment "
+    "control objective policy asset access cryptography supplier incident "
+    "continuity compliance audit review leadership commitment competence"
+).split()
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)) + "."
+
+
+def write_corpus(upload_dir: str) -> str:
+    """Two files with distinct sections around a shared 400-word one; returns it."""
+    rng = random.Random(7)
+    boilerplate = _paragraph(rng, 400)
+
+    for name in ("a", "b"):
+        with open(os.path.join(upload_dir, f"{name}.txt"), "w") as f:
+            f.write(f"Scope of document {name}\n\n{_paragraph(rng, 120)}\n\n")
+            f.write(f"Copyright and licensing notice\n\n{boilerplate}\n\n")
+            f.write(f"Controls of document {name}\n\n{_paragraph(rng, 120)}\n")
+    return boilerplate
+
+
+def check() -> bool:
+    from core.constants import DocumentType
+    from ingestion.ingestion_pipeline import run_ingestion
+    from query.retriever import run_query
+
+    boilerplate = write_corpus("uploads")
+    run_ingestion("uploads", DocumentType.GENERAL_STRUCTURED, reset_index=True)
+
+    expected = {os.path.join("uploads", "a.txt"), os.path.join("uploads", "b.txt")}
+    hits = [
+        doc for doc in run_query(" ".join(boilerplate.split()[:40]), top_n=30)
+        if boilerplate[:200] in doc.page_content
+    ]
+    if not hits:
+        print("FAIL: the boilerplate section was not retrieved")
+        return False
+
+    # Parents of the other file may hold the boilerplate too (around their
+    # own chunks); the one retrieved through the kept copy names both files
+    merged = [
+        doc for doc in hits
+        if {os.path.relpath(s) for s in doc.metadata.get("sources") or ()} == expected
+    ]
+    if not merged:
+        for doc in hits:
+            print(f"  {doc.metadata.get('source')}: sources={doc.metadata.get('sources')}")
+        print(f"FAIL: no boilerplate hit names both {sorted(expected)}")
+        return False
+
+    print(f"OK: boilerplate hit names {sorted(expected)}, "
+          f"duplicates={merged[0].metadata.get('duplicates')}")
+    return True
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as workdir:
+        # Index, caches and uploads all live under relative paths
+        os.chdir(workdir)
+        os.makedirs("uploads")
+        ok = check()
+    sys.exit(0 if ok else 1)
@@ -3,11 +3,12 @@ import re
 from typing import Dict, List
 import sys
 import os
+import time
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from llm.llm_answer import answer_query
+from llm.llm_answer import answer_query_batch
 
 # -------------------------
 # Normalization utilities
@@ -54,6 +55,14 @@ def evaluate_retrieval(predictions: List[Dict], ground_truth: List[Dict]) -> Dic
         "total": total
     }
 
+def to_prediction(question: Dict, result: Dict) -> Dict:
+    """answer_query output in the shape of test/evaluation_results.json."""
+    return {
+        "qid": question['qid'],
+        "answer": {"value": result['answer'], "type": question.get('answer_type', 'string')},
+        "citations": [{"text": doc.page_content} for doc in result['chunks']],
+    }
+
 # -------------------------
 # Main evaluation
 # -------------------------
@@ -64,15 +73,14 @@ def main():
     with open(dataset_path) as f:
         questions = json.load(f)["questions"]
     
-    predictions = []
+    print(f"Starting evaluation of {len(questions)} questions...")
     
-    print("Starting evaluation...")
+    # One batched retrieval + rerank pass; fresh answers, not cached ones
+    start = time.perf_counter()
+    results = answer_query_batch([q['question'] for q in questions], use_cache=False)
+    print(f"Answered in {time.perf_counter() - start:.2f}s")
     
-    for i, q in enumerate(questions):
-        print(f"Evaluating question {i+1}/{len(questions)}: {q['question']}")
-        
-        result = answer_query(q['question'], q['qid'])
-        predictions.append(result)
+    predictions = [to_prediction(q, result) for q, result in zip(questions, results)]
     
     # Evaluate
     answer_metrics = evaluate_answers(predictions, questions)
@@ -0,0 +1,159 @@
+"""
+Local stand-in for an OpenAI-compatible chat-completions endpoint.
+
+Replies with a fixed text, either in one response or as server-sent
+events with a delay per piece, so streaming can be exercised offline:
+
+    python tests/stub_llm_server.py           # streaming vs blocking check
+    python tests/stub_llm_server.py --serve   # just run the server
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "  The primary objective of ISO/IEC 27001:2022 is to specify requirements "
+    "for establishing, implementing, maintaining and continually improving an "
+    "information security management system (Clauses 4–10).\n\n"
+    "This trailing paragraph is cut by the safety trim."
+)
+
+
+def _pieces(text: str):
+    # Word-ish pieces with their whitespace, like a tokenizer would emit
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+class StubChatServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, reply: str = DEFAULT_REPLY, delay: float = 0.02, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.reply = reply
+        self.delay = delay
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubChatServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        server.requests += 1
+        model = body.get("model", "stub")
+
+        if not body.get("stream"):
+            payload = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": server.reply},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(delta, finish_reason=None):
+            event = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+
+        try:
+            send({"role": "assistant", "content": ""})
+            for piece in _pieces(server.reply):
+                time.sleep(server.delay)
+                send({"content": piece})
+            send({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client stopped reading (e.g. safety trim)
+
+
+# -------------------------
+# Streaming check
+# -------------------------
+
+def check_streaming(server: StubChatServer) -> dict:
+    from llm.openai import generate_phi3, stream_phi3
+
+    blocking_start = time.perf_counter()
+    blocking = generate_phi3("ping")
+    blocking_seconds = time.perf_counter() - blocking_start
+
+    start = time.perf_counter()
+    first_token = None
+    pieces = []
+    for piece in stream_phi3("ping"):
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        pieces.append(piece)
+    total = time.perf_counter() - start
+
+    streamed = "".join(pieces)
+    assert streamed == blocking, f"stream/blocking mismatch:\n{streamed!r}\n{blocking!r}"
+    assert len(pieces) > 1, "answer arrived in a single piece"
+    assert first_token < total / 2, "first token did not arrive early"
+
+    return {
+        "pieces": len(pieces),
+        "blocking_seconds": round(blocking_seconds, 3),
+        "first_token_seconds": round(first_token, 3),
+        "total_seconds": round(total, 3),
+    }
+
+
+if __name__ == "__main__":
+    server = StubChatServer().start()
+
+    if "--serve" in sys.argv:
+        print(f"Stub chat-completions server on {server.base_url}")
+        threading.Event().wait()
+
+    # Must be set before core.config is imported
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+    print(json.dumps(check_streaming(server), indent=2))
@@ -1,5 +1,4 @@
 import streamlit as st
-import tempfile
 import os
 import sys
 
@@ -12,9 +11,13 @@ sys.path.insert(0, "src")
 # PROJECT IMPORTS
 # -------------------------------------------------
 from ingestion.ingestion_pipeline import run_ingestion
-from llm.llm_answer import answer_query
+from llm.llm_answer import answer_query_stream
+from query.retriever import get_vectorstore_manager
+from core.config import METRICS_PORT, UPLOAD_DIRECTORY
 from core.constants import DocumentType
 from core.exception import RAGError
+from ingestion.loader.registry import CORPUS_IDS
+from utils.telemetry import start_metrics_server
 from utils.small_talk import is_small_talk, small_talk_response
 
 # -------------------------------------------------
@@ -27,6 +30,16 @@ st.set_page_config(
 
 st.title("📄 Retrieval-Augmented Generation Chatbot")
 
+
+@st.cache_resource
+def _metrics_server():
+    # One per Streamlit process (reruns reuse it)
+    return start_metrics_server(METRICS_PORT)
+
+
+if METRICS_PORT:
+    _metrics_server()
+
 # -------------------------------------------------
 # SESSION STATE
 # -------------------------------------------------
@@ -58,16 +71,19 @@ doc_type = st.selectbox(
 if uploaded_files and st.button("Run Ingestion"):
     with st.spinner("Ingesting documents..."):
         try:
-            tmp_dir = tempfile.mkdtemp()
+            # One persistent dir per corpus: ingestion diffs the whole dir
+            # against the manifest, so earlier uploads must still be there
+            upload_dir = os.path.join(UPLOAD_DIRECTORY, CORPUS_IDS[doc_type])
+            os.makedirs(upload_dir, exist_ok=True)
 
             for file in uploaded_files:
-                with open(os.path.join(tmp_dir, file.name), "wb") as f:
+                with open(os.path.join(upload_dir, file.name), "wb") as f:
                     f.write(file.getbuffer())
 
-            run_ingestion(upload_dir=tmp_dir, document_type=doc_type)
+            run_ingestion(upload_dir=upload_dir, document_type=doc_type)
 
             st.session_state.ingested = True
-            st.session_state.upload_dir = tmp_dir
+            st.session_state.upload_dir = upload_dir
             st.session_state.messages = []  # reset chat on new ingestion
 
             st.success("Ingestion completed successfully.")
@@ -82,6 +98,16 @@ if st.session_state.ingested:
     st.divider()
     st.header("2. Chat with Documents")
 
+    # ---- Optional scope: search only some corpora / files ----
+    # Listed from the shards' metadata files: no shard is loaded on a rerun
+    manager = get_vectorstore_manager()
+    selected_corpora = st.multiselect("Limit answers to corpora", manager.available())
+    selected_files = st.multiselect(
+        "Limit answers to files", manager.values("file_name", selected_corpora or None)
+    )
+    filters = {"corpus_id": selected_corpora, "file_name": selected_files}
+    filters = {field: values for field, values in filters.items() if values} or None
+
     # ---- Render chat history ----
     for msg in st.session_state.messages:
         with st.chat_message(msg["role"]):
@@ -117,29 +143,38 @@ if st.session_state.ingested:
 
 
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # 🔹 INTENT ROUTING
-                    if is_small_talk(user_query):
-                        answer = small_talk_response(user_query)
-                        chunks = None
-                    else:
-                        result = answer_query(user_query)
-                        answer = result.get("answer", "")
-                        chunks = result.get("chunks", [])
-
+            try:
+                # 🔹 INTENT ROUTING
+                if is_small_talk(user_query):
+                    answer = small_talk_response(user_query)
+                    chunks = None
                     st.markdown(answer)
+                else:
+                    with st.spinner("Thinking..."):
+                        result = answer_query_stream(user_query, filters=filters)
+
+                    # Tokens render as they arrive
+                    answer = st.write_stream(result["tokens"])
+                    chunks = result.get("chunks", [])
+
+                    timings = result["timings"]
+                    if timings.first_token_seconds is not None:
+                        st.caption(
+                            f"⏱️ First token {timings.first_token_seconds:.2f}s | "
+                            f"Total {timings.total_seconds:.2f}s"
+                            + (" | cached" if timings.cached else "")
+                        )
 
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": answer,
-                        "chunks": chunks
-                    })
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": answer,
+                    "chunks": chunks
+                })
 
-                except RAGError as e:
-                    st.error(f"Query failed: {e}")
-                except Exception as e:
-                    st.error(f"Unexpected error: {e}")
+            except RAGError as e:
+                st.error(f"Query failed: {e}")
+            except Exception as e:
+                st.error(f"Unexpected error: {e}")
 
 
 